@@ -0,0 +1,296 @@
+"""Local archive of daily weather history, for "this day last year" and climatology views.
+
+History is stored per grid cell as Parquet files partitioned by year:
+
+    <root>/<cell>/year=2024/2024-01-01_2024-12-31.parquet
+
+`Archive.backfill` looks at the dates a cell already holds and asks its `fetch` callable only
+for the missing ranges, so the first view of a place downloads its history once and later
+views only top up the days since. Queries read just the needed columns and year partitions
+through pyarrow.dataset; normals and percentiles are computed in one vectorised numpy pass
+over a (years x day-of-year) matrix rather than per day.
+
+    python archive.py info ~/.cache/zainweather/archive
+    python archive.py normals ~/.cache/zainweather/archive 0.1:249:670 2025-07-01 --days 7
+
+Needs pyarrow, imported when the first `Archive` is opened; without it `Archive()` raises
+ImportError.
+"""
+import argparse
+import datetime as dt
+import os
+import sys
+import threading
+import warnings
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "zainweather", "archive")
+# Daily columns kept in the archive (names as in weather_core.DAILY_COLUMNS)
+COLUMNS = ("t_max", "t_min", "t_mean", "precip_sum", "wind_max")
+# Longest date range asked of `fetch` in one call
+MAX_FETCH_DAYS = 10 * 366
+# A year partition with more files than this is rewritten as one file
+COMPACT_FILES = 8
+# Normals pool this many calendar days around each date (odd), across all stored years
+DEFAULT_WINDOW_DAYS = 7
+DEFAULT_QUANTILES = (0.1, 0.5, 0.9)
+# Day-of-year slots: a leap year, so 29 February has its own slot
+_DOY_SLOTS = 366
+_LEAP_MONTH_START = np.cumsum([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30])
+
+
+def day_of_year(dates: pd.DatetimeIndex) -> np.ndarray:
+    """0-based slot of each date's month/day in a leap year (1 March is always slot 60)."""
+    return _LEAP_MONTH_START[dates.month.to_numpy() - 1] + dates.day.to_numpy() - 1
+
+
+def missing_ranges(
+    have: np.ndarray, start: dt.date, end: dt.date, max_days: int = MAX_FETCH_DAYS
+) -> List[Tuple[dt.date, dt.date]]:
+    """Inclusive (first, last) ranges of days in [start, end] not in `have`, at most `max_days` long."""
+    wanted = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+    gaps = wanted[~np.isin(wanted, have)]
+    if not len(gaps):
+        return []
+    # Split wherever consecutive missing days are more than one day apart, or a run gets too long
+    breaks = np.flatnonzero(np.diff(gaps).astype(np.int64) != 1) + 1
+    ranges = []
+    for run in np.split(gaps, breaks):
+        for i in range(0, len(run), max_days):
+            part = run[i:i + max_days]
+            ranges.append((part[0].item(), part[-1].item()))
+    return ranges
+
+
+class Archive:
+    """Daily history per grid cell in partitioned Parquet files under `root`."""
+
+    def __init__(self, root: str = DEFAULT_DIR):
+        try:
+            import pyarrow as pa
+            import pyarrow.dataset as ds
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("archive mode needs pyarrow: pip install pyarrow")
+        self._pa, self._ds, self._pq = pa, ds, pq
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._cell_locks: Dict[str, threading.Lock] = {}
+        # cell -> sorted datetime64[D] dates on disk; dropped whenever the cell is written
+        self._dates: Dict[str, np.ndarray] = {}
+
+    def _cell_dir(self, cell: str) -> str:
+        return os.path.join(self.root, cell.replace(":", "_"))
+
+    def _cell_lock(self, cell: str) -> threading.Lock:
+        with self._lock:
+            return self._cell_locks.setdefault(cell, threading.Lock())
+
+    def _dataset(self, cell: str):
+        path = self._cell_dir(cell)
+        if not os.path.isdir(path):
+            return None
+        return self._ds.dataset(path, format="parquet", partitioning="hive")
+
+    def dates(self, cell: str) -> np.ndarray:
+        """Sorted days (datetime64[D]) the archive holds for `cell`."""
+        with self._lock:
+            cached = self._dates.get(cell)
+        if cached is not None:
+            return cached
+        dataset = self._dataset(cell)
+        if dataset is None:
+            days = np.array([], dtype="datetime64[D]")
+        else:
+            column = dataset.to_table(columns=["date"]).column("date").to_numpy()
+            days = np.unique(column.astype("datetime64[D]"))
+        with self._lock:
+            self._dates[cell] = days
+        return days
+
+    def backfill(
+        self,
+        cell: str,
+        start: dt.date,
+        end: dt.date,
+        fetch: Callable[[dt.date, dt.date], pd.DataFrame],
+    ) -> int:
+        """Make sure [start, end] is on disk, calling `fetch(first, last)` only for missing days.
+
+        `fetch` returns a frame indexed by date with (a subset of) COLUMNS. Returns the number
+        of days written. Concurrent backfills of one cell wait for each other instead of
+        downloading the same range twice.
+        """
+        written = 0
+        with self._cell_lock(cell):
+            for first, last in missing_ranges(self.dates(cell), start, end):
+                frame = fetch(first, last)
+                if frame.empty:
+                    continue
+                self.write(cell, frame)
+                written += len(frame)
+        return written
+
+    def write(self, cell: str, frame: pd.DataFrame) -> None:
+        """Store daily rows (indexed by date), one file per year touched."""
+        frame = frame.reindex(columns=list(COLUMNS)).astype(np.float32)
+        dates = pd.DatetimeIndex(frame.index).normalize()
+        for year in np.unique(dates.year):
+            mask = dates.year == year
+            part = frame[mask]
+            days = dates[mask]
+            table = self._pa.table(
+                {"date": self._pa.array(days.to_numpy().astype("datetime64[D]")),
+                 **{col: self._pa.array(part[col].to_numpy()) for col in COLUMNS}}
+            )
+            year_dir = os.path.join(self._cell_dir(cell), f"year={year}")
+            os.makedirs(year_dir, exist_ok=True)
+            name = f"{days[0]:%Y-%m-%d}_{days[-1]:%Y-%m-%d}.parquet"
+            path = os.path.join(year_dir, name)
+            # Dot-files are ignored by pyarrow.dataset, so readers never see a half-written part
+            tmp = os.path.join(year_dir, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            self._pq.write_table(table, tmp)
+            os.replace(tmp, path)
+            if sum(f.endswith(".parquet") for f in os.listdir(year_dir)) > COMPACT_FILES:
+                self._compact(year_dir)
+        with self._lock:
+            self._dates.pop(cell, None)
+
+    def _compact(self, year_dir: str) -> None:
+        """Rewrite a year partition as a single file; later files win for duplicate dates."""
+        files = sorted(
+            (os.path.join(year_dir, f) for f in os.listdir(year_dir) if f.endswith(".parquet") and f[0] != "."),
+            key=os.path.getmtime,
+        )
+        table = self._pa.concat_tables(self._pq.read_table(f, partitioning=None) for f in files)
+        frame = table.to_pandas().drop_duplicates("date", keep="last").sort_values("date")
+        first, last = frame["date"].iloc[0], frame["date"].iloc[-1]
+        name = f"{first:%Y-%m-%d}_{last:%Y-%m-%d}.parquet"
+        path = os.path.join(year_dir, name)
+        tmp = os.path.join(year_dir, f".{name}.compact.tmp")
+        self._pq.write_table(self._pa.Table.from_pandas(frame, preserve_index=False), tmp)
+        for f in files:
+            if f != path:
+                os.remove(f)
+        os.replace(tmp, path)
+
+    def history(
+        self,
+        cell: str,
+        start: Optional[dt.date] = None,
+        end: Optional[dt.date] = None,
+        columns: Sequence[str] = COLUMNS,
+    ) -> pd.DataFrame:
+        """Stored days in [start, end] (both optional) as a float32 frame indexed by date."""
+        dataset = self._dataset(cell)
+        if dataset is None:
+            return pd.DataFrame(columns=list(columns), index=pd.DatetimeIndex([], name="date"))
+        date, year = self._ds.field("date"), self._ds.field("year")
+        filters = []
+        # The year filter prunes whole partitions; the date filter is pushed into the row groups
+        if start is not None:
+            filters += [year >= start.year, date >= self._pa.scalar(start, self._pa.date32())]
+        if end is not None:
+            filters += [year <= end.year, date <= self._pa.scalar(end, self._pa.date32())]
+        expr = None
+        for f in filters:
+            expr = f if expr is None else expr & f
+        table = dataset.to_table(columns=["date", *columns], filter=expr)
+        frame = table.to_pandas()
+        frame["date"] = pd.to_datetime(frame["date"])
+        frame = frame.drop_duplicates("date", keep="last").set_index("date").sort_index()
+        return frame.astype(np.float32)
+
+    def normals(
+        self,
+        cell: str,
+        dates: Iterable,
+        columns: Sequence[str] = ("t_max", "t_min"),
+        window: int = DEFAULT_WINDOW_DAYS,
+        quantiles: Sequence[float] = DEFAULT_QUANTILES,
+    ) -> pd.DataFrame:
+        """Climatology of `columns` for the calendar days of `dates`, over every stored year.
+
+        Each date pools the `window` calendar days centred on it across all years, and gets
+        `<col>_mean` plus `<col>_p<q>` per quantile (e.g. t_max_p90). `years` is the number
+        of years that contributed.
+        """
+        dates = pd.DatetimeIndex(pd.to_datetime(list(dates))).normalize()
+        hist = self.history(cell, columns=columns)
+        out = pd.DataFrame(index=pd.DatetimeIndex(dates, name="date"))
+        if hist.empty or not len(dates):
+            out["years"] = 0
+            return out
+        years, year_idx = np.unique(hist.index.year, return_inverse=True)
+        doy = day_of_year(hist.index)
+        half = window // 2
+        # (n dates, window) slots around each requested day, wrapping at the year end
+        slots = (day_of_year(dates)[:, None] + np.arange(-half, half + 1)[None, :]) % _DOY_SLOTS
+        labels = [f"p{round(q * 100)}" for q in quantiles]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN slots give NaN, not noise
+            for col in columns:
+                matrix = np.full((len(years), _DOY_SLOTS), np.nan, dtype=np.float32)
+                matrix[year_idx, doy] = hist[col].to_numpy()
+                # (years, n dates, window) -> (n dates, years * window) samples per date
+                samples = matrix[:, slots].transpose(1, 0, 2).reshape(len(dates), -1)
+                out[f"{col}_mean"] = np.nanmean(samples, axis=1)
+                for label, value in zip(labels, np.nanquantile(samples, quantiles, axis=1)):
+                    out[f"{col}_{label}"] = value
+        out["years"] = len(years)
+        return out
+
+    def same_day(self, cell: str, dates: Iterable, years_ago: int = 1) -> pd.DataFrame:
+        """Stored values for each of `dates` shifted back `years_ago` years (29 Feb -> 28 Feb).
+
+        Indexed by the requested dates; NaN where the archive has no such day.
+        """
+        dates = pd.DatetimeIndex(pd.to_datetime(list(dates))).normalize()
+        past = dates - pd.DateOffset(years=years_ago)
+        if not len(past):
+            return pd.DataFrame(columns=list(COLUMNS), index=pd.DatetimeIndex([], name="date"))
+        hist = self.history(cell, past.min().date(), past.max().date())
+        out = hist.reindex(past)
+        out.index = pd.DatetimeIndex(dates, name="date")
+        return out
+
+    def cells(self) -> List[str]:
+        """Cell ids with stored history."""
+        return sorted(
+            name.replace("_", ":") for name in os.listdir(self.root)
+            if os.path.isdir(os.path.join(self.root, name))
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect the local weather history archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_info = sub.add_parser("info", help="list stored cells and their date coverage")
+    p_info.add_argument("root", nargs="?", default=DEFAULT_DIR)
+    p_norm = sub.add_parser("normals", help="print climatology for a cell")
+    p_norm.add_argument("root")
+    p_norm.add_argument("cell", help="grid cell id, e.g. 0.1:249:670")
+    p_norm.add_argument("start", help="first date (YYYY-MM-DD)")
+    p_norm.add_argument("--days", type=int, default=7)
+    p_norm.add_argument("--window", type=int, default=DEFAULT_WINDOW_DAYS)
+    args = parser.parse_args(argv)
+
+    archive = Archive(args.root)
+    if args.command == "info":
+        for cell in archive.cells():
+            days = archive.dates(cell)
+            span = f"{days[0]} .. {days[-1]}" if len(days) else "empty"
+            print(f"{cell}\t{len(days)} days\t{span}")
+        return 0
+    dates = pd.date_range(args.start, periods=args.days, freq="D")
+    with pd.option_context("display.width", 200, "display.max_columns", 20):
+        print(archive.normals(args.cell, dates, window=args.window).round(1))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""Static markup for the dashboard: one minified stylesheet and class-based HTML templates.
+
+The stylesheet is minified once at import and injected with a single st.markdown call per
+full run (fragment reruns don't resend it). Cards, tiles and banners are short templates that
+only fill in values; all presentation lives in the stylesheet, so each rerun ships the data
+and class names instead of kilobytes of inline styles.
+"""
+import html
+import re
+from typing import Iterable, Sequence, Tuple
+
+STYLESHEET = """
+/* Metric cards: subtle square corners, label left and value right */
+div[data-testid="stMetric"] {
+  border-radius: 4px !important;
+  padding: 0.45rem 0.6rem !important;
+  background: #ffffff !important;
+  border: 1px solid #e6e7eb !important;
+  box-shadow: none !important;
+  display: flex !important;
+  align-items: center !important;
+  justify-content: space-between !important;
+  gap: 0.6rem !important;
+  color: #0f172a !important;
+}
+div[data-testid="stMetricLabel"] {
+  font-size: 0.95rem !important;
+  color: #6b7280 !important;
+  text-align: left !important;
+  flex: 1 1 auto !important;
+  margin-right: 0.6rem !important;
+}
+div[data-testid="stMetricValue"] {
+  font-size: 1.3rem !important;
+  font-weight: 700 !important;
+  color: #0f172a !important;
+  text-align: right !important;
+  min-width: 4.5ch !important;
+}
+
+/* Sidebar branding and divider */
+.brand { display: flex; align-items: center; gap: 0.6rem; }
+.brand strong { font-size: 1.1rem; }
+.rule { margin: 1rem 0 0.5rem 0; border: 0; border-top: 1px solid #e5e7eb; }
+
+/* Headings */
+.title { font-size: 1.35rem; font-weight: 700; margin: 0.2em 0; }
+.section-title { font-size: 1.25rem; font-weight: 700; margin: 0.5em 0 0.2em 0; }
+
+/* Current conditions card */
+.now { max-width: 90rem; margin: 1.5rem auto 1.2rem auto; }
+.panel {
+  background: #ffffff;
+  border: 1px solid #e6e7eb;
+  padding: 0.8rem;
+  border-radius: 6px;
+  box-shadow: 0 1px 2px rgba(16,24,40,0.03);
+}
+.now .panel { margin-bottom: 1.2rem; }
+.now-row { display: flex; align-items: center; gap: 1rem; margin-bottom: 0.75rem; }
+.now-icon { font-size: 3.8rem; }
+.temp-large { font-size: 3rem; font-weight: 800; color: #0f172a; }
+.weather-badge { display: inline-block; background: #eef2ff; color: #3730a3; padding: 0.28rem 0.6rem; border-radius: 6px; font-weight: 600; margin-top: 0.5rem; }
+
+/* 7-day outlook tiles; tN colours a temperature band */
+.week { display: grid; grid-template-columns: repeat(7, minmax(0, 1fr)); gap: 0.5rem; text-align: center; margin-bottom: 1rem; }
+.muted { color: #666; }
+.day-icon { font-size: 2rem; }
+.day-tips { font-size: 0.9rem; }
+.t0 { color: #A4CAFE; }
+.t1 { color: #60A5FA; }
+.t2 { color: #34D399; }
+.t3 { color: #FBBF24; }
+.t4 { color: #F87171; }
+
+/* Advice chips */
+.chips { display: flex; flex-wrap: wrap; gap: 0.5em 1em; margin-bottom: 1em; }
+.chip { background: #f1f5f9; border-radius: 1em; padding: 0.3em 0.9em; font-size: 1.05rem; font-weight: 500; }
+.all-clear { color: #22c55e; font-size: 1.1rem; font-weight: 600; }
+
+/* Rain / clear banners */
+.banner { display: flex; align-items: center; border-radius: 4px; padding: 1rem 1.2rem; margin-bottom: 0.5rem; gap: 1rem; }
+.banner-icon { font-size: 2.2rem; line-height: 1; }
+.banner-title { font-size: 1.1rem; font-weight: 700; }
+.banner-text { font-size: 1rem; }
+.banner.rain { background: #FEF9C3; border: 1px solid #FBBF24; color: #92400e; }
+.banner.clear { background: #F0FDF4; border: 1px solid #22C55E; color: #334155; }
+.banner.clear .banner-title { color: #166534; }
+
+.footer-note { font-size: 0.95rem; }
+
+/* Dark mode */
+[data-theme="dark"] .panel { background: #071122 !important; border-color: #203040 !important; }
+[data-theme="dark"] div[data-testid="stMetric"] {
+  background: #08131b !important;
+  border-color: #1f2a34 !important;
+  color: #e6eef8 !important;
+}
+[data-theme="dark"] div[data-testid="stMetricValue"] { color: #e6eef8 !important; }
+[data-theme="dark"] div[data-testid="stMetricLabel"] { color: #93a0b8 !important; }
+[data-theme="dark"] .weather-badge { background: #0f1724 !important; color: #bfdbfe !important; }
+[data-theme="dark"] .temp-large { color: #e6eef8 !important; }
+[data-theme="dark"] .chip { background: #1e293b; }
+
+@media (max-width: 640px) {
+  div[data-testid="stMetric"] { flex-direction: column !important; align-items: flex-start !important; }
+  div[data-testid="stMetricValue"] { text-align: left !important; }
+  .temp-large { font-size: 2.2rem; }
+  .week { grid-template-columns: repeat(4, minmax(0, 1fr)); }
+}
+"""
+
+
+def minify_css(css: str) -> str:
+    """Drop comments and insignificant whitespace."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};:,>])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+STYLE_TAG = f"<style>{minify_css(STYLESHEET)}</style>"
+
+# -----------------------------
+# Templates
+# -----------------------------
+BRAND = "<div class='brand'>🌦️ <strong>ZainWeather</strong></div>"
+RULE = "<hr class='rule'>"
+FOOTER = (
+    "<div class='footer'><b>ZainWeather</b> &mdash; Powered by Open‑Meteo Forecast, Geocoding & Air Quality APIs."
+    "<br><span class='footer-note'>App is for informational purposes only. &copy; 2025</span></div>"
+)
+ALL_CLEAR = "<span class='all-clear'>You're good to go! ✨</span>"
+
+_TITLE = "<div class='{cls}'>{text}</div>"
+_NOW = (
+    "<div class='now'><div class='panel'><div class='now-row'><div class='now-icon'>{icon}</div>"
+    "<div><div class='temp-large'>{temp}</div><div class='weather-badge'>{description}</div></div></div></div></div>"
+)
+_DAY = (
+    "<div><div class='muted'>{day}</div><div class='day-icon'>{icon}</div><div class='t{band}'>{tmax:.1f}°</div>"
+    "<div class='muted'>{tmin:.1f}°</div><div class='day-tips' title='{tips}'>{icons}</div></div>"
+)
+_CHIP = "<span class='chip'>{}</span>"
+_BANNER = (
+    "<div class='banner {kind}'><div class='banner-icon'>{icon}</div>"
+    "<div><div class='banner-title'>{title}</div><div class='banner-text'>{text}</div></div></div>"
+)
+
+# Lower bounds (°C) of the temperature colour bands t1..t4; below the first is t0
+TEMP_BANDS = (0, 10, 20, 30)
+
+
+def temp_band(temp: float) -> int:
+    """Colour band 0 (very cold) .. 4 (hot) for a temperature in °C."""
+    return sum(temp >= edge for edge in TEMP_BANDS)
+
+
+def title(text: str, cls: str = "title") -> str:
+    return _TITLE.format(cls=cls, text=html.escape(text))
+
+
+def current_card(icon: str, temp: str, description: str) -> str:
+    return _NOW.format(icon=icon, temp=temp, description=html.escape(description))
+
+
+def day_tiles(days: Iterable[Tuple[str, str, float, float, Sequence[str]]]) -> str:
+    """One grid of outlook tiles from (day, icon, t_max °C, t_min °C, advice) tuples."""
+    tiles = "".join(
+        _DAY.format(
+            day=day, icon=icon, band=temp_band(tmax), tmax=tmax, tmin=tmin,
+            tips=html.escape(" · ".join(tips), quote=True), icons="".join(tip.split(" ")[0] for tip in tips),
+        )
+        for day, icon, tmax, tmin, tips in days
+    )
+    return f"<div class='week'>{tiles}</div>"
+
+
+def chips(bits: Iterable[str]) -> str:
+    return "<div class='chips'>" + "".join(_CHIP.format(html.escape(bit)) for bit in bits) + "</div>"
+
+
+def rain_banner(when: str) -> str:
+    return _BANNER.format(kind="rain", icon="🌧️", title="Rain Expected", text=f"Rain likely starting at {when}.")
+
+
+def clear_banner(label: str) -> str:
+    return _BANNER.format(
+        kind="clear", icon="☀️", title="Clear Weather", text=f"No significant rain expected in the next {label}."
+    )
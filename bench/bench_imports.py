@@ -0,0 +1,152 @@
+"""Cold-start benchmark: import-time breakdown of the dashboard's startup imports.
+
+Runs `python -X importtime` in fresh interpreters on the modules weather_app.py imports at
+the top level (read from its source, in order) and reports each one's cumulative import time,
+i.e. everything it pulls in first, as the median of N runs. Modules the app defers until a
+panel needs them are timed on top of the startup set, as their incremental cost. Interpreter
+startup (site, encodings, ...) is measured separately and left out.
+
+    python bench/bench_imports.py                     # compare against bench/import_baseline.json
+    python bench/bench_imports.py --save-baseline     # record a new baseline
+    python bench/bench_imports.py --runs 9 --tolerance 0.5
+
+Exits 1 when the startup total or a module regresses by more than the tolerance, or when a
+deferred module is imported at startup again.
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "weather_app.py")
+BASELINE_PATH = os.path.join(ROOT, "bench", "import_baseline.json")
+# Imported lazily by the app (chart panels); must not appear in the startup set
+DEFERRED = ("charts",)
+DEFAULT_RUNS = 5
+# Allowed relative slowdown before an import counts as a regression
+DEFAULT_TOLERANCE = 0.35
+# Slowdowns smaller than this (seconds) are noise, whatever the ratio
+MIN_REGRESSION_S = 0.02
+
+
+def startup_imports(path: str = APP_PATH) -> List[str]:
+    """Top-level modules a script imports at module level, in first-import order."""
+    with open(path, encoding="utf-8") as fh:
+        tree = ast.parse(fh.read(), path)
+    names: List[str] = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            found = [alias.name.split(".")[0] for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            found = [node.module.split(".")[0]]
+        else:
+            continue
+        names.extend(name for name in found if name not in names)
+    return names
+
+
+def import_times(code: str) -> Dict[str, float]:
+    """Cumulative seconds of each root-level import while running `code` in a fresh interpreter."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    times: Dict[str, float] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented by two spaces per level below the root
+        if cumulative.strip().isdigit() and not name[1:].startswith(" "):
+            times[name.strip()] = times.get(name.strip(), 0.0) + int(cumulative) / 1e6
+    return times
+
+
+def median_times(code: str, runs: int) -> Dict[str, float]:
+    samples = [import_times(code) for _ in range(runs)]
+    names = {name for sample in samples for name in sample}
+    return {name: statistics.median(sample.get(name, 0.0) for sample in samples) for name in names}
+
+
+def benchmark(runs: int) -> Dict[str, Any]:
+    modules = startup_imports()
+    interpreter = set(median_times("pass", 1))
+    startup_code = "import " + ", ".join(modules)
+    startup = {
+        name: seconds for name, seconds in median_times(startup_code, runs).items() if name not in interpreter
+    }
+    deferred = {}
+    for name in DEFERRED:
+        after = median_times(f"{startup_code}; import {name}", runs)
+        deferred[name] = after.get(name, 0.0)
+    return {
+        "runs": runs,
+        "startup_modules": modules,
+        "startup": startup,
+        "startup_total": sum(startup.values()),
+        "deferred": deferred,
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    problems = [
+        f"{name} is imported at startup; it should load with its panel"
+        for name in DEFERRED if name in result["startup_modules"]
+    ]
+    pairs: List[Tuple[str, float, Any]] = [("startup total", result["startup_total"], baseline.get("startup_total"))]
+    pairs += [(name, seconds, baseline.get("startup", {}).get(name)) for name, seconds in result["startup"].items()]
+    pairs += [(f"{name} (deferred)", seconds, baseline.get("deferred", {}).get(name))
+              for name, seconds in result["deferred"].items()]
+    for label, seconds, ref in pairs:
+        if ref and seconds > ref * (1 + tolerance) and seconds - ref > MIN_REGRESSION_S:
+            problems.append(f"{label}: {seconds * 1000:.0f} ms vs {ref * 1000:.0f} ms baseline")
+    return problems
+
+
+def report(result: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    ref = baseline.get("startup", {})
+    print(f"startup imports: {result['startup_total'] * 1000:.0f} ms (median of {result['runs']} runs)")
+    for name, seconds in sorted(result["startup"].items(), key=lambda kv: -kv[1]):
+        base = f"  (baseline {ref[name] * 1000:.0f})" if name in ref else ""
+        print(f"  {name:<22} {seconds * 1000:8.1f} ms{base}")
+    print("deferred until a panel needs them:")
+    for name, seconds in result["deferred"].items():
+        print(f"  {name:<22} {seconds * 1000:8.1f} ms")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="fresh interpreters per measurement")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON to compare against / save to")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed relative slowdown")
+    args = parser.parse_args(argv)
+
+    result = benchmark(args.runs)
+    try:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    except FileNotFoundError:
+        baseline = {}
+    report(result, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(result, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+    problems = compare(result, baseline, args.tolerance) if baseline else []
+    for problem in problems:
+        print(f"REGRESSION {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
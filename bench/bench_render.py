@@ -0,0 +1,180 @@
+"""Render-path benchmark: drives weather_app.py headlessly with AppTest against fixtures.
+
+Measures a cold run (all caches cleared) and N warm reruns: wall time, per-section time
+(the app's perf.SectionTimer spans), peak traced memory, upstream call counts and the size of
+the chart specs and HTML/CSS markup sent to the browser, then compares the medians against a
+stored baseline.
+
+    python bench/bench_render.py                     # compare against bench/baseline.json
+    python bench/bench_render.py --save-baseline     # record a new baseline
+    python bench/bench_render.py --runs 20 --tolerance 0.5
+
+Exits 1 when a timing regresses by more than the tolerance or a warm rerun calls upstream.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Must be set before weather_core is imported (by us or by the app)
+os.environ.setdefault("WEATHER_REPLAY_DIR", os.path.join(ROOT, "fixtures", "openmeteo"))
+os.environ.setdefault("WEATHER_CACHE_BACKEND", "memory")
+# Cold runs clear every cache; a background warm-up would race them (bench_imports covers startup)
+os.environ.setdefault("WEATHER_WARMUP", "0")
+
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import perf  # noqa: E402
+import weather_core  # noqa: E402
+
+APP_PATH = os.path.join(ROOT, "weather_app.py")
+BASELINE_PATH = os.path.join(ROOT, "bench", "baseline.json")
+DEFAULT_RUNS = 10
+# Allowed relative slowdown before a timing counts as a regression
+DEFAULT_TOLERANCE = 0.35
+# Slowdowns smaller than this (seconds) are noise, whatever the ratio
+MIN_REGRESSION_S = 0.003
+
+
+def clear_caches() -> None:
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    weather_core.response_cache().clear()
+
+
+def upstream_calls(snapshot: Dict[str, Any]) -> int:
+    return sum(t["count"] for name, t in snapshot["timings"].items() if name.startswith("upstream."))
+
+
+def run_once(at: AppTest, trace_memory: bool = False) -> Dict[str, Any]:
+    """One script run: wall time, per-section seconds, upstream calls and (optionally) peak memory.
+
+    tracemalloc slows allocation-heavy code several-fold, so memory is measured on separate runs.
+    """
+    perf.RECORDER.reset()
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    at.run()
+    wall = time.perf_counter() - started
+    peak = 0
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    if at.exception:
+        raise RuntimeError(f"app raised: {at.exception[0].value}")
+    snap = perf.RECORDER.snapshot()
+    sections = {
+        name.split(".", 1)[1]: t["total"]
+        for name, t in snap["timings"].items() if name.startswith("render.")
+    }
+    chart_kb = sum(len(chart.proto.spec) for chart in at.get("plotly_chart")) / 1024
+    markup_kb = sum(len(m.proto.body.encode()) for m in at.markdown) / 1024
+    return {
+        "wall": wall, "sections": sections, "peak_mb": peak / 2**20,
+        "upstream_calls": upstream_calls(snap), "chart_kb": chart_kb, "markup_kb": markup_kb,
+    }
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    walls = sorted(r["wall"] for r in runs)
+    names = sorted({n for r in runs for n in r["sections"]})
+    return {
+        "wall_median": statistics.median(walls),
+        "wall_p95": walls[min(len(walls) - 1, int(round(0.95 * (len(walls) - 1))))],
+        "sections": {n: statistics.median(r["sections"].get(n, 0.0) for r in runs) for n in names},
+        "peak_mb": max(r["peak_mb"] for r in runs),
+        "upstream_calls": sum(r["upstream_calls"] for r in runs),
+        "chart_kb": max(r["chart_kb"] for r in runs),
+        "markup_kb": max(r["markup_kb"] for r in runs),
+    }
+
+
+def benchmark(runs: int) -> Dict[str, Any]:
+    clear_caches()
+    cold_peak = run_once(AppTest.from_file(APP_PATH, default_timeout=120), trace_memory=True)["peak_mb"]
+    clear_caches()
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    cold = summarize([run_once(at)])
+    warm = summarize([run_once(at) for _ in range(runs)])
+    cold["peak_mb"] = cold_peak
+    warm["peak_mb"] = run_once(at, trace_memory=True)["peak_mb"]
+    return {"cold": cold, "warm": warm, "runs": runs}
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Human-readable regressions of `result` against `baseline`."""
+    problems = []
+    for phase in ("cold", "warm"):
+        now, then = result[phase], baseline.get(phase, {})
+        pairs = [("wall_median", now["wall_median"], then.get("wall_median"))]
+        pairs += [(f"section {n}", v, then.get("sections", {}).get(n)) for n, v in now["sections"].items()]
+        for label, value, ref in pairs:
+            if ref is None or value - ref < MIN_REGRESSION_S:
+                continue
+            if value > ref * (1 + tolerance):
+                problems.append(f"{phase} {label}: {value * 1000:.1f} ms vs {ref * 1000:.1f} ms baseline")
+        ref_mb = then.get("peak_mb")
+        if ref_mb and now["peak_mb"] > ref_mb * (1 + tolerance):
+            problems.append(f"{phase} peak memory: {now['peak_mb']:.1f} MB vs {ref_mb:.1f} MB baseline")
+        for key, label in (("chart_kb", "chart payload"), ("markup_kb", "markup payload")):
+            ref_kb = then.get(key)
+            if ref_kb and now[key] > ref_kb * (1 + tolerance):
+                problems.append(f"{phase} {label}: {now[key]:.1f} KB vs {ref_kb:.1f} KB baseline")
+    if result["warm"]["upstream_calls"]:
+        problems.append(f"warm reruns made {result['warm']['upstream_calls']} upstream call(s)")
+    return problems
+
+
+def report(result: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    for phase in ("cold", "warm"):
+        s, ref = result[phase], baseline.get(phase, {}).get("sections", {})
+        print(
+            f"{phase}: median {s['wall_median'] * 1000:.1f} ms, p95 {s['wall_p95'] * 1000:.1f} ms, "
+            f"peak {s['peak_mb']:.1f} MB, upstream calls {s['upstream_calls']}, charts {s['chart_kb']:.0f} KB, "
+            f"markup {s['markup_kb']:.1f} KB"
+        )
+        for name, seconds in sorted(s["sections"].items(), key=lambda kv: -kv[1]):
+            base = f"  (baseline {ref[name] * 1000:.1f})" if name in ref else ""
+            print(f"  {name:<12} {seconds * 1000:8.1f} ms{base}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="warm reruns after the cold run")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON to compare against / save to")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed relative slowdown")
+    args = parser.parse_args(argv)
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    result = benchmark(args.runs)
+    try:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    except FileNotFoundError:
+        baseline = {}
+    report(result, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(result, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+    problems = compare(result, baseline, args.tolerance) if baseline else []
+    for problem in problems:
+        print(f"REGRESSION {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
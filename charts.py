@@ -0,0 +1,223 @@
+"""Plotly figures for the dashboard, with server-side downsampling for long horizons.
+
+Hourly series longer than the point budget are thinned before they are sent to the browser:
+Largest-Triangle-Three-Buckets (LTTB) for smooth series such as temperature, min/max per
+bucket for spiky ones such as gusts and precipitation chance, so peaks survive. Figures are
+built with plotly.graph_objects (no DataFrame copies) and the three hourly charts share one
+x-axis in a single make_subplots figure; watchlist small multiples are one figure as well.
+"""
+import math
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from weather_core import TEMP_COLUMNS, display_units, unit_labels
+
+# Default points per series sent to the browser
+MAX_POINTS = 300
+
+
+# -----------------------------
+# Downsampling
+# -----------------------------
+def lttb_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the points Largest-Triangle-Three-Buckets keeps, for evenly spaced samples.
+
+    The first and last points are always kept; each bucket in between keeps the point that
+    forms the largest triangle with the previously kept point and the next bucket's mean.
+    NaNs must be removed by the caller.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[hi:nxt_hi].mean(), y[hi:nxt_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of each bucket's minimum and maximum (n_out // 2 buckets), in order.
+
+    NaNs must be removed by the caller.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    buckets = n_out // 2
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    lo = edges[:-1]
+    # Pad every bucket to the widest one so argmin/argmax run as one vectorised call
+    width = int(np.max(np.diff(edges)))
+    grid = lo[:, None] + np.arange(width)[None, :]
+    valid = grid < edges[1:, None]
+    values = y[np.minimum(grid, n - 1)]
+    mins = np.where(valid, values, np.inf).argmin(axis=1) + lo
+    maxs = np.where(valid, values, -np.inf).argmax(axis=1) + lo
+    return np.unique(np.concatenate([mins, maxs]))
+
+
+def downsample_indices(y: np.ndarray, n_out: int, method: str = "lttb") -> np.ndarray:
+    """Indices to keep so a series has about `n_out` points; NaN gaps stay visible as gaps."""
+    y = np.asarray(y, dtype=np.float64)
+    if len(y) <= n_out:
+        return np.arange(len(y))
+    missing = np.isnan(y)
+    finite = np.flatnonzero(~missing)
+    pick = lttb_indices if method == "lttb" else minmax_indices
+    keep = finite[pick(y[finite], n_out)]
+    # Keep the first NaN of every gap so Plotly breaks the line there
+    gap_starts = np.flatnonzero(missing & ~np.r_[False, missing[:-1]])
+    return np.union1d(keep, gap_starts)
+
+
+def _series(frame: pd.DataFrame, column: str, max_points: Optional[int], method: str):
+    """(x, y) for one trace, downsampled to `max_points`.
+
+    x is epoch milliseconds and y float32, which Plotly ships as compact base64 typed arrays
+    instead of one ISO string per timestamp; the axes are set to type "date" to match.
+    """
+    y = frame[column].to_numpy(dtype=np.float32)
+    x = frame.index.to_numpy().astype("datetime64[ms]").astype(np.int64).astype(np.float64)
+    if max_points and len(y) > max_points:
+        idx = downsample_indices(y, max_points, method)
+        x, y = x[idx], y[idx]
+    return x, y
+
+
+# -----------------------------
+# Figures
+# -----------------------------
+def window(frame: pd.DataFrame, start: pd.Timestamp, hours: int) -> pd.DataFrame:
+    """Rows of a time-indexed frame in [start, start + hours), whatever its time step."""
+    end = start + pd.Timedelta(hours=hours)
+    return frame[(frame.index >= start) & (frame.index < end)]
+
+
+def hourly_figure(
+    hdf: pd.DataFrame,
+    imperial: bool,
+    hours: int = 48,
+    max_points: Optional[int] = MAX_POINTS,
+    detail: Optional[pd.DataFrame] = None,
+) -> go.Figure:
+    """Temperature, precipitation chance and wind for the next `hours`, on one shared x-axis.
+
+    With a 15-minute `detail` frame the line traces use it where it has data; precipitation
+    chance is hourly-only and always comes from `hdf`.
+    """
+    temp_unit, wind_unit = unit_labels(imperial)
+    start = hdf.index[0]
+    frame = display_units(window(hdf, start, hours), imperial)
+    fine = display_units(window(detail, start, hours), imperial) if detail is not None and not detail.empty else None
+    fig = make_subplots(
+        rows=3, cols=1, shared_xaxes=True, vertical_spacing=0.07,
+        subplot_titles=(
+            f"Temperature vs Feels-like ({temp_unit})",
+            "Precipitation Probability (%)",
+            f"Wind & Gusts ({wind_unit})",
+        ),
+    )
+    traces = [
+        ("temp", "Temperature", "#F87171", 1, "lttb"),
+        ("apparent", "Feels like", "#60A5FA", 1, "lttb"),
+        ("wind", "Wind Speed", "#34D399", 3, "lttb"),
+        ("gust", "Wind Gusts", "#F87171", 3, "minmax"),
+    ]
+    for column, name, color, row, method in traces:
+        source = fine if fine is not None and column in fine and fine[column].notna().any() else frame
+        x, y = _series(source, column, max_points, method)
+        fig.add_trace(go.Scatter(x=x, y=y, name=name, mode="lines", line=dict(color=color, width=2)), row=row, col=1)
+    x, y = _series(frame, "pop", max_points, "minmax")
+    fig.add_trace(go.Bar(x=x, y=y, name="Precipitation chance", marker_color="#60A5FA"), row=2, col=1)
+    fig.update_layout(
+        height=720, hovermode="x unified", margin=dict(t=40, b=20, l=10, r=10),
+        legend=dict(orientation="h", y=-0.06), uirevision="hourly",
+    )
+    fig.update_xaxes(type="date")
+    return fig
+
+
+def daily_figure(ddf: pd.DataFrame, imperial: bool) -> go.Figure:
+    """Grouped daily high/low bars."""
+    temp_unit, _ = unit_labels(imperial)
+    frame = display_units(ddf[["t_max", "t_min"]], imperial)
+    fig = go.Figure([
+        go.Bar(x=frame.index, y=frame["t_max"].to_numpy(), name="High", marker_color="#F87171"),
+        go.Bar(x=frame.index, y=frame["t_min"].to_numpy(), name="Low", marker_color="#60A5FA"),
+    ])
+    fig.update_layout(
+        title=f"Daily Temperature Range ({temp_unit})", barmode="group",
+        margin=dict(t=50, b=20, l=10, r=10), uirevision="daily",
+    )
+    return fig
+
+
+def small_multiples(
+    frames: Sequence[Tuple[str, pd.DataFrame]],
+    column: str,
+    imperial: bool,
+    hours: int = 48,
+    cols: int = 4,
+    max_points: Optional[int] = MAX_POINTS,
+) -> go.Figure:
+    """One small chart of `column` per place for the next `hours`, with a shared y-axis.
+
+    Each place starts at its own first forecast hour (local time), so the panels line up by
+    time of day rather than by instant.
+    """
+    rows = max(1, math.ceil(len(frames) / cols))
+    fig = make_subplots(
+        rows=rows, cols=cols, shared_xaxes="all", shared_yaxes="all",
+        subplot_titles=[name for name, _ in frames],
+        vertical_spacing=min(0.12, 0.5 / rows), horizontal_spacing=0.03,
+    )
+    method = "lttb" if column in TEMP_COLUMNS else "minmax"
+    for i, (_, hdf) in enumerate(frames):
+        if hdf.empty or column not in hdf:
+            continue
+        frame = display_units(window(hdf[[column]], hdf.index[0], hours), imperial)
+        x, y = _series(frame, column, max_points, method)
+        fig.add_trace(
+            go.Scatter(x=x, y=y, mode="lines", line=dict(color="#60A5FA", width=1.5), showlegend=False, name=""),
+            row=i // cols + 1, col=i % cols + 1,
+        )
+    fig.update_layout(height=150 * rows + 40, hovermode="x", margin=dict(t=30, b=10, l=10, r=10))
+    fig.update_annotations(font_size=11)
+    fig.update_xaxes(type="date", tickformat="%a %H:%M", nticks=3)
+    return fig
+
+
+def air_quality_figure(aqdf: pd.DataFrame, max_points: Optional[int] = MAX_POINTS) -> go.Figure:
+    """PM2.5/PM10 for the next 72 h above reported vs computed US AQI, sharing the x-axis."""
+    fig = make_subplots(
+        rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.1,
+        subplot_titles=("PM2.5 & PM10 (next 72h, µg/m³)", "US AQI over the forecast horizon"),
+    )
+    pm = aqdf.iloc[:72]
+    for column, name, color in (("pm2_5", "PM2.5", "#8B5CF6"), ("pm10", "PM10", "#14B8A6")):
+        x, y = _series(pm, column, max_points, "minmax")
+        fig.add_trace(go.Scatter(x=x, y=y, name=name, mode="lines", line=dict(color=color)), row=1, col=1)
+    for column, name, color in (("us_aqi", "Reported", "#6366F1"), ("aqi_calc", "Computed", "#F59E0B")):
+        x, y = _series(aqdf, column, max_points, "minmax")
+        fig.add_trace(go.Scatter(x=x, y=y, name=name, mode="lines", line=dict(color=color)), row=2, col=1)
+    fig.update_layout(
+        height=560, hovermode="x unified", margin=dict(t=40, b=20, l=10, r=10),
+        legend=dict(orientation="h", y=-0.08), uirevision="air_quality",
+    )
+    fig.update_xaxes(type="date")
+    return fig
@@ -0,0 +1,265 @@
+"""Offline place search over a GeoNames dump, used before the remote geocoding API.
+
+`build` turns a GeoNames table (cities500.txt, cities15000.txt, allCountries.txt, ...) into
+a directory of flat .npy arrays: normalised name keys sorted for binary search, and per-place
+columns (coordinates, population, timezone, names). `Gazetteer(dir)` memory-maps them, so
+opening is instant and only the pages a query touches are read.
+
+A query is a prefix search (two `searchsorted` calls) ranked by population, exact names
+first. If nothing matches, every edit-distance-1 variant of the query is searched in one
+vectorised call, which catches most typos.
+
+    python gazetteer.py build cities15000.txt --admin1 admin1CodesASCII.txt --countries countryInfo.txt
+    WEATHER_GAZETTEER_DIR=~/.cache/zainweather/gazetteer streamlit run weather_app.py
+"""
+import argparse
+import json
+import os
+import string
+import sys
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "zainweather", "gazetteer")
+FORMAT_VERSION = 1
+# Keys are stored fixed-width; longer names are matched on their first KEY_BYTES bytes
+KEY_BYTES = 32
+# Fuzzy matching only kicks in for queries at least this long
+MIN_FUZZY_LEN = 3
+
+# Columns of the GeoNames "geoname" table (tab-separated, no header)
+GEONAMES_COLUMNS = [
+    "geonameid", "name", "asciiname", "alternatenames", "latitude", "longitude",
+    "feature_class", "feature_code", "country_code", "cc2", "admin1_code", "admin2_code",
+    "admin3_code", "admin4_code", "population", "elevation", "dem", "timezone", "modification_date",
+]
+_ALPHABET = string.ascii_lowercase + string.digits + " "
+
+
+def normalize(text: str) -> str:
+    """Search key for a name: accents stripped, case-folded, punctuation to spaces."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+    return " ".join("".join(ch if ch.isalnum() else " " for ch in stripped).split())
+
+
+def _fit_key(key: str) -> bytes:
+    """UTF-8 `key` cut to at most KEY_BYTES bytes, on a character boundary."""
+    return key.encode("utf-8")[:KEY_BYTES].decode("utf-8", "ignore").encode("utf-8")
+
+
+def _encode_key(text: str) -> bytes:
+    return _fit_key(normalize(text))
+
+
+def _edits1(word: str) -> List[str]:
+    """Every string one delete, transpose, replace or insert away from `word`."""
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    deletes = [a + b[1:] for a, b in splits if b]
+    transposes = [a + b[1] + b[0] + b[2:] for a, b in splits if len(b) > 1]
+    replaces = [a + c + b[1:] for a, b in splits if b for c in _ALPHABET if c != b[0]]
+    inserts = [a + c + b for a, b in splits for c in _ALPHABET]
+    return list(set(deletes + transposes + replaces + inserts))
+
+
+def _write_strings(path: str, values: List[str]) -> None:
+    """Store strings as one UTF-8 blob (<path>.blob.npy) plus offsets (<path>.offsets.npy)."""
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(f"{path}.blob.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    np.save(f"{path}.offsets.npy", offsets)
+
+
+def _read_code_names(path: Optional[str], key_col: int, name_col: int) -> Dict[str, str]:
+    if not path:
+        return {}
+    table = pd.read_csv(
+        path, sep="\t", header=None, comment="#", dtype=str, quoting=3, keep_default_na=False,
+    )
+    return dict(zip(table[key_col], table[name_col]))
+
+
+def build(
+    dump_path: str,
+    out_dir: str = DEFAULT_DIR,
+    admin1_path: Optional[str] = None,
+    countries_path: Optional[str] = None,
+    min_population: int = 0,
+) -> int:
+    """Build an index directory from a GeoNames dump. Returns the number of places indexed.
+
+    `admin1_path` (admin1CodesASCII.txt) and `countries_path` (countryInfo.txt) are optional
+    and turn region/country codes into names.
+    """
+    places = pd.read_csv(
+        dump_path, sep="\t", header=None, names=GEONAMES_COLUMNS, quoting=3,
+        dtype={"name": str, "asciiname": str, "country_code": str, "admin1_code": str, "timezone": str},
+        usecols=["name", "asciiname", "latitude", "longitude", "feature_class", "country_code",
+                 "admin1_code", "population", "elevation", "dem", "timezone"],
+        keep_default_na=False, na_values={"population": [""], "elevation": [""], "dem": [""]},
+    )
+    places = places[(places["feature_class"] == "P") & (places["population"].fillna(0) >= min_population)]
+    places = places.reset_index(drop=True)
+
+    admin1_names = _read_code_names(admin1_path, 0, 1)
+    country_names = _read_code_names(countries_path, 0, 4)
+    admin1 = [
+        admin1_names.get(f"{cc}.{code}", "") for cc, code in zip(places["country_code"], places["admin1_code"])
+    ]
+    country = [country_names.get(cc, cc) for cc in places["country_code"]]
+    timezones, tz_codes = np.unique(places["timezone"].replace("", "UTC").to_numpy(str), return_inverse=True)
+
+    # One key per distinct normalised spelling of each place
+    key_list, key_rows = [], []
+    for row, (name, ascii_name) in enumerate(zip(places["name"], places["asciiname"])):
+        for key in {_encode_key(name), _encode_key(ascii_name)}:
+            if key:
+                key_list.append(key)
+                key_rows.append(row)
+    keys = np.array(key_list, dtype=f"S{KEY_BYTES}")
+    order = np.argsort(keys, kind="stable")
+
+    os.makedirs(out_dir, exist_ok=True)
+    elevation = places["elevation"].fillna(places["dem"]).to_numpy(np.float32)
+    np.save(os.path.join(out_dir, "keys.npy"), keys[order])
+    np.save(os.path.join(out_dir, "key_rows.npy"), np.asarray(key_rows, dtype=np.int32)[order])
+    np.save(os.path.join(out_dir, "lat.npy"), places["latitude"].to_numpy(np.float32))
+    np.save(os.path.join(out_dir, "lon.npy"), places["longitude"].to_numpy(np.float32))
+    np.save(os.path.join(out_dir, "population.npy"), places["population"].fillna(0).to_numpy(np.int64))
+    np.save(os.path.join(out_dir, "elevation.npy"), elevation)
+    np.save(os.path.join(out_dir, "tz_codes.npy"), tz_codes.astype(np.uint16))
+    _write_strings(os.path.join(out_dir, "name"), places["name"].tolist())
+    _write_strings(os.path.join(out_dir, "admin1"), admin1)
+    _write_strings(os.path.join(out_dir, "country"), country)
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as fh:
+        json.dump({
+            "version": FORMAT_VERSION,
+            "key_bytes": KEY_BYTES,
+            "places": len(places),
+            "keys": len(keys),
+            "timezones": timezones.tolist(),
+            "source": os.path.basename(dump_path),
+        }, fh)
+    return len(places)
+
+
+class _Strings:
+    """Read side of _write_strings, memory-mapped."""
+
+    def __init__(self, path: str):
+        self.blob = np.load(f"{path}.blob.npy", mmap_mode="r")
+        self.offsets = np.load(f"{path}.offsets.npy", mmap_mode="r")
+
+    def __getitem__(self, i: int) -> str:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+
+class Gazetteer:
+    """Memory-mapped index written by `build`. Thread-safe for concurrent searches."""
+
+    def __init__(self, root: str):
+        with open(os.path.join(root, "meta.json"), encoding="utf-8") as fh:
+            meta = json.load(fh)
+        if meta.get("version") != FORMAT_VERSION or meta.get("key_bytes") != KEY_BYTES:
+            raise ValueError(f"{root}: index format {meta.get('version')} is stale; rebuild it")
+        self.root = root
+        self.timezones: List[str] = meta["timezones"]
+
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(root, f"{name}.npy"), mmap_mode="r")
+
+        self.keys = load("keys")
+        self.key_rows = load("key_rows")
+        self.lat = load("lat")
+        self.lon = load("lon")
+        self.population = load("population")
+        self.elevation = load("elevation")
+        self.tz_codes = load("tz_codes")
+        self.names = _Strings(os.path.join(root, "name"))
+        self.admin1 = _Strings(os.path.join(root, "admin1"))
+        self.country = _Strings(os.path.join(root, "country"))
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def _lookup(self, prefixes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows whose key starts with one of `prefixes`, rows whose key equals one of them).
+
+        `prefixes` is an S{KEY_BYTES} array; all of them are looked up in one vectorised pass.
+        """
+        lo = np.searchsorted(self.keys, prefixes, side="left")
+        eq = np.searchsorted(self.keys, prefixes, side="right")
+        # Every key starting with p sorts below p + b"\xff"; a full-width p can only match itself
+        hi = np.searchsorted(self.keys, np.char.add(prefixes, b"\xff").astype(self.keys.dtype), side="left")
+        full = np.char.str_len(prefixes) >= KEY_BYTES
+        hi[full] = eq[full]
+        empty = np.empty(0, dtype=np.int32)
+        matches = [self.key_rows[a:b] for a, b in zip(lo, hi) if b > a]
+        exact = [self.key_rows[a:b] for a, b in zip(lo, eq) if b > a]
+        # May contain duplicates (a place listed under two spellings); _rank removes them
+        return np.concatenate(matches) if matches else empty, np.concatenate(exact) if exact else empty
+
+    def _rank(self, rows: np.ndarray, exact: np.ndarray, count: int) -> np.ndarray:
+        """Top `count` distinct rows: exact name matches first, then by population."""
+        shortlist = count * 4
+        if len(rows) > shortlist:
+            # Short prefixes ("s", "san") match thousands of places; only the most populous matter
+            top = np.argpartition(-self.population[rows], shortlist)[:shortlist]
+            rows = np.concatenate([rows[top], exact[:shortlist]])
+        rows = np.unique(rows)
+        order = np.lexsort((-self.population[rows], ~np.isin(rows, exact)))
+        return rows[order[:count]]
+
+    def search(self, query: str, count: int = 5, fuzzy: bool = True) -> pd.DataFrame:
+        """Places matching `query`, shaped like `weather_core.geocode` results (empty if none)."""
+        key = _encode_key(query)
+        if not key:
+            return pd.DataFrame()
+        rows, exact = self._lookup(np.array([key], dtype=f"S{KEY_BYTES}"))
+        if not len(rows) and fuzzy and len(key) >= MIN_FUZZY_LEN:
+            variants = {_fit_key(v) for v in _edits1(key.decode("utf-8"))} - {b""}
+            rows, exact = self._lookup(np.array(sorted(variants), dtype=f"S{KEY_BYTES}"))
+        if not len(rows):
+            return pd.DataFrame()
+        best = self._rank(rows, exact, count)
+        return pd.DataFrame({
+            "name": [self.names[r] for r in best],
+            "country": [self.country[r] or None for r in best],
+            "admin1": [self.admin1[r] or None for r in best],
+            # float32 storage; GeoNames only has 5 decimals anyway
+            "lat": self.lat[best].astype(float).round(5),
+            "lon": self.lon[best].astype(float).round(5),
+            "timezone": [self.timezones[c] for c in self.tz_codes[best]],
+            "elevation": self.elevation[best].astype(float),
+        })
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="build an index from a GeoNames dump")
+    b.add_argument("dump", help="GeoNames table, e.g. cities15000.txt")
+    b.add_argument("-o", "--output", default=os.environ.get("WEATHER_GAZETTEER_DIR", DEFAULT_DIR))
+    b.add_argument("--admin1", help="admin1CodesASCII.txt, for region names")
+    b.add_argument("--countries", help="countryInfo.txt, for country names")
+    b.add_argument("--min-population", type=int, default=0)
+    s = sub.add_parser("search", help="query an index")
+    s.add_argument("query")
+    s.add_argument("-d", "--dir", default=os.environ.get("WEATHER_GAZETTEER_DIR", DEFAULT_DIR))
+    s.add_argument("-n", "--count", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        n = build(args.dump, args.output, args.admin1, args.countries, args.min_population)
+        print(f"indexed {n} places into {args.output}", file=sys.stderr)
+    else:
+        print(Gazetteer(args.dir).search(args.query, args.count).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""Offline stand-ins for the Open-Meteo APIs: fixture replay and a local stub server.
+
+Fixtures live in one directory per endpoint (geocode/, forecast/, air_quality/, archive/). A request
+is answered by the fixture recorded for its exact parameters if there is one, otherwise by
+that endpoint's default.json. fixtures/openmeteo ships a default set.
+
+Replay inside the app, batch jobs or API (no sockets involved):
+    WEATHER_REPLAY_DIR=fixtures/openmeteo streamlit run weather_app.py
+
+Record live responses as fixtures:
+    WEATHER_RECORD_DIR=fixtures/openmeteo streamlit run weather_app.py
+
+Local stub server with injected latency and errors, for load tests over real HTTP:
+    python openmeteo_stub.py --port 8089 --latency-ms 120 --jitter-ms 40 --error-rate 0.02
+    WEATHER_UPSTREAM_URL=http://127.0.0.1:8089 streamlit run weather_app.py
+"""
+import argparse
+import copy
+import datetime as dt
+import gzip
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from response_cache import make_key
+
+DEFAULT_FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "openmeteo")
+
+# URL path -> endpoint name used for cache keys and fixture folders
+ENDPOINT_PATHS = {
+    "/v1/search": "geocode",
+    "/v1/forecast": "forecast",
+    "/v1/air-quality": "air_quality",
+    "/v1/archive": "archive",
+}
+
+
+class FixtureStore:
+    """Recorded responses on disk, keyed by endpoint and request parameters."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Any] = {}
+
+    def _path(self, endpoint: str, params: Dict[str, Any]) -> str:
+        digest = hashlib.sha1(make_key(endpoint, params).encode()).hexdigest()[:16]
+        return os.path.join(self.root, endpoint, f"{digest}.json")
+
+    def _read(self, path: str) -> Optional[Any]:
+        with self._lock:
+            if path not in self._cache:
+                try:
+                    with open(path, encoding="utf-8") as fh:
+                        self._cache[path] = json.load(fh)
+                except FileNotFoundError:
+                    self._cache[path] = None
+            return self._cache[path]
+
+    def load(self, endpoint: str, params: Dict[str, Any]) -> Any:
+        """Response for a request; multi-coordinate requests get a list, like the real API."""
+        lats = str(params.get("latitude", "")).split(",")
+        lons = str(params.get("longitude", "")).split(",")
+        if len(lats) > 1:
+            return [self.load(endpoint, {**params, "latitude": la, "longitude": lo}) for la, lo in zip(lats, lons)]
+        data = self._read(self._path(endpoint, params))
+        if data is None:
+            data = self._read(os.path.join(self.root, endpoint, "default.json"))
+            if data is None:
+                raise FileNotFoundError(f"No fixture for {make_key(endpoint, params)} in {self.root}")
+            if "latitude" in params and isinstance(data, dict) and "latitude" in data:
+                data = {**data, "latitude": float(params["latitude"]), "longitude": float(params["longitude"])}
+            if endpoint == "forecast":
+                return shape_forecast(data, params)
+            if endpoint == "archive":
+                return shape_archive(data, params)
+        # Callers may decorate responses; never hand out the cached object itself
+        return copy.deepcopy(data)
+
+    def save(self, endpoint: str, params: Dict[str, Any], data: Any) -> None:
+        path = self._path(endpoint, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+        with self._lock:
+            self._cache.pop(path, None)
+
+
+def _select(block: Dict[str, Any], names: str, rows: Optional[int]) -> Dict[str, Any]:
+    """`time` plus the requested variables of one response block, cut to `rows` entries."""
+    keep = ["time"] + [n for n in names.split(",") if n in block]
+    return {k: list(block[k][:rows]) for k in keep}
+
+
+def shape_forecast(data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+    """A default forecast fixture trimmed to the request's variables and forecast_days.
+
+    Requests for minutely_15 get the hourly values interpolated to 15-minute steps, which is
+    enough to exercise the detailed charts offline.
+    """
+    days = int(params["forecast_days"]) if "forecast_days" in params else None
+    out = {k: copy.deepcopy(v) for k, v in data.items() if k not in ("hourly", "daily")}
+    if "hourly" in data:
+        out["hourly"] = _select(data["hourly"], params.get("hourly", ""), days and days * 24)
+    if "daily" in data:
+        out["daily"] = _select(data["daily"], params.get("daily", ""), days)
+    if params.get("minutely_15") and "hourly" in data:
+        hourly = data["hourly"]
+        n = len(hourly["time"][:days * 24 if days else None])
+        steps = [i / 4 for i in range(4 * (n - 1) + 1)]
+        block: Dict[str, Any] = {"time": []}
+        for s in steps:
+            hour = hourly["time"][int(s)]
+            block["time"].append(f"{hour[:-2]}{int(round((s % 1) * 60)):02d}")
+        for name in params["minutely_15"].split(","):
+            values = hourly.get(name)
+            if values is None:
+                continue
+            column = []
+            for s in steps:
+                lo = int(s)
+                a, b = values[lo], values[min(lo + 1, n - 1)]
+                column.append(a if a is None or b is None else round(a + (b - a) * (s - lo), 2))
+            block[name] = column
+        out["minutely_15"] = block
+    return out
+
+
+def shape_archive(data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+    """Daily history for the requested start_date..end_date, from a one-year default fixture.
+
+    Each day takes the fixture's value for the same month/day, nudged by a small deterministic
+    per-year offset so that normals and percentiles have some spread.
+    """
+    start = dt.date.fromisoformat(params["start_date"])
+    end = dt.date.fromisoformat(params["end_date"])
+    block = data["daily"]
+    by_day = {t[5:]: i for i, t in enumerate(block["time"])}
+    days = [start + dt.timedelta(days=i) for i in range((end - start).days + 1)]
+    rows = [by_day.get(f"{d:%m-%d}", by_day.get("02-28")) for d in days]
+    daily: Dict[str, Any] = {"time": [d.isoformat() for d in days]}
+    for name in params.get("daily", "").split(","):
+        values = block.get(name)
+        if values is None:
+            continue
+        column = []
+        for d, row in zip(days, rows):
+            value = values[row]
+            nudge = ((d.year * 7 + d.month) % 9 - 4) * 0.4
+            if value is not None and name.startswith("temperature"):
+                value = round(value + nudge, 1)
+            column.append(value)
+        daily[name] = column
+    out = {k: copy.deepcopy(v) for k, v in data.items() if k != "daily"}
+    out["daily"] = daily
+    return out
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serves the four Open-Meteo paths (ENDPOINT_PATHS) from a FixtureStore with injected latency/errors."""
+
+    store: FixtureStore
+    latency_s = 0.0
+    jitter_s = 0.0
+    error_rate = 0.0
+    error_status = 503
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        delay = self.latency_s + random.uniform(0, self.jitter_s)
+        if delay:
+            time.sleep(delay)
+        if random.random() < self.error_rate:
+            headers = {"Retry-After": "1"} if self.error_status == 429 else {}
+            return self._reply(self.error_status, {"error": True, "reason": "injected failure"}, headers)
+        try:
+            endpoint = ENDPOINT_PATHS[parts.path]
+        except KeyError:
+            return self._reply(404, {"error": True, "reason": f"unknown path {parts.path}"})
+        try:
+            body = self.store.load(endpoint, dict(parse_qsl(parts.query)))
+        except FileNotFoundError as exc:
+            return self._reply(400, {"error": True, "reason": str(exc)})
+        self._reply(200, body)
+
+    def _reply(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        payload = json.dumps(body, separators=(",", ":"), ensure_ascii=False).encode()
+        gzipped = "gzip" in self.headers.get("Accept-Encoding", "")
+        if gzipped:
+            payload = gzip.compress(payload, 5)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, fmt, *args):
+        pass  # keep load tests quiet
+
+
+def serve(
+    fixture_dir: str = DEFAULT_FIXTURE_DIR,
+    host: str = "127.0.0.1",
+    port: int = 8089,
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    error_rate: float = 0.0,
+    error_status: int = 503,
+) -> ThreadingHTTPServer:
+    """Create (but don't start) a stub server; call serve_forever() or run it in a thread."""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "store": FixtureStore(fixture_dir),
+        "latency_s": latency_ms / 1000,
+        "jitter_s": jitter_ms / 1000,
+        "error_rate": error_rate,
+        "error_status": error_status,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Local Open-Meteo stub serving recorded fixtures")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURE_DIR, help="fixture directory")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="extra uniform random delay")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="status for injected failures (e.g. 429, 503)")
+    args = parser.parse_args(argv)
+    server = serve(args.fixtures, args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.error_status)
+    print(f"Open-Meteo stub on http://{args.host}:{server.server_port} (fixtures: {args.fixtures})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""Lightweight timing spans and counters for the hot path.
+
+One process-wide Recorder collects named timings (count, total and a bounded window of
+recent samples for percentiles) and labelled counters. The dashboard times its sections with
+SectionTimer, weather_core times fetches and upstream calls, the response cache counts
+hits/misses/stale serves, and the benchmarks read the results.
+
+Exposition:
+    metrics_text()           Prometheus/OpenMetrics text (weather_api serves it at /metrics)
+    WEATHER_METRICS_LOG_S    if set, log a JSON summary to the "perf" logger every N seconds
+"""
+import functools
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+# Recent samples kept per timing name, for percentiles
+WINDOW = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+
+log = logging.getLogger("perf")
+
+
+def metric_key(name: str, labels: Dict[str, Any]) -> str:
+    """Counter key in exposition form: name{label="value",...} (labels sorted)."""
+    if not labels:
+        return name
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{inner}}}"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def quantile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    # nearest-rank
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+class Recorder:
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._count: Counter = Counter()
+        self._total: Dict[str, float] = defaultdict(float)
+        self._recent: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.window))
+        self.counters: Counter = Counter()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._count[name] += 1
+            self._total[name] += seconds
+            self._recent[name].append(seconds)
+
+    def incr(self, name: str, n: int = 1, **labels: Any) -> None:
+        key = metric_key(name, labels)
+        with self._lock:
+            self.counters[key] += n
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copy of everything recorded so far: {"timings": {name: {...}}, "counters": {...}}."""
+        with self._lock:
+            timings = {
+                name: {"count": self._count[name], "total": self._total[name], "recent": list(self._recent[name])}
+                for name in self._count
+            }
+            return {"timings": timings, "counters": dict(self.counters)}
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-timing count/total/p50/p95/max (over the recent window) plus counters."""
+        snap = self.snapshot()
+        timings = {}
+        for name, t in sorted(snap["timings"].items()):
+            recent = sorted(t["recent"])
+            timings[name] = {
+                "count": t["count"],
+                "total": t["total"],
+                "p50": quantile(recent, 0.5),
+                "p95": quantile(recent, 0.95),
+                "max": recent[-1] if recent else float("nan"),
+            }
+        return {"timings": timings, "counters": dict(sorted(snap["counters"].items()))}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._count.clear()
+            self._total.clear()
+            self._recent.clear()
+            self.counters.clear()
+
+
+RECORDER = Recorder()
+span = RECORDER.span
+incr = RECORDER.incr
+
+
+def timed(name: str) -> Callable:
+    """Decorator: record every call of the function as a `name` span."""
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with RECORDER.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def metrics_text(recorder: Recorder = RECORDER, prefix: str = "weather_") -> str:
+    """Prometheus text exposition: counters as-is, timings as one `span_seconds` summary."""
+    snap = recorder.snapshot()
+    lines = []
+    families: Dict[str, List[str]] = defaultdict(list)
+    for key, value in sorted(snap["counters"].items()):
+        families[key.split("{", 1)[0]].append(f"{prefix}{key} {value}")
+    for family, samples in families.items():
+        lines.append(f"# TYPE {prefix}{family} counter")
+        lines.extend(samples)
+    if snap["timings"]:
+        metric = f"{prefix}span_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        for name, t in sorted(snap["timings"].items()):
+            recent = sorted(t["recent"])
+            label = f'span="{_escape(name)}"'
+            for q in QUANTILES:
+                lines.append(f'{metric}{{{label},quantile="{q}"}} {quantile(recent, q):.6f}')
+            lines.append(f"{metric}_sum{{{label}}} {t['total']:.6f}")
+            lines.append(f"{metric}_count{{{label}}} {t['count']}")
+    return "\n".join(lines) + "\n"
+
+
+class LogSink:
+    """Daemon thread that logs RECORDER.summary() as one JSON line every `interval` seconds."""
+
+    def __init__(self, interval: float, recorder: Recorder = RECORDER, logger: logging.Logger = log):
+        self.interval = interval
+        self.recorder = recorder
+        self.logger = logger
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="perf-log-sink", daemon=True)
+
+    def start(self) -> "LogSink":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.logger.info(json.dumps({"metrics": self.recorder.summary(), "ts": time.time()}))
+
+
+@functools.lru_cache(maxsize=None)
+def log_sink_from_env() -> Optional[LogSink]:
+    """Start the log sink once per process if WEATHER_METRICS_LOG_S is set."""
+    interval = float(os.environ.get("WEATHER_METRICS_LOG_S", 0) or 0)
+    return LogSink(interval).start() if interval > 0 else None
+
+
+class SectionTimer:
+    """Times consecutive sections of a script: each start() closes the previous section.
+
+    Lets a top-level Streamlit script be timed section by section without re-indenting it.
+    """
+
+    def __init__(self, prefix: str = "render", recorder: Recorder = RECORDER):
+        self.prefix = prefix
+        self.recorder = recorder
+        self._current: Optional[str] = None
+        self._started = 0.0
+
+    def start(self, name: str) -> None:
+        self.finish()
+        self._current = name
+        self._started = time.perf_counter()
+
+    def finish(self) -> None:
+        if self._current is not None:
+            self.recorder.record(f"{self.prefix}.{self._current}", time.perf_counter() - self._started)
+            self._current = None
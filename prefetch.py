@@ -0,0 +1,195 @@
+"""Background refresh of popular cache entries, so busy pages rarely render on an expired entry.
+
+Every page view of a location is recorded with `Prefetcher.record` under its cache key,
+together with two callables: when the entry expires and how to refresh it. Views are kept
+as exponentially decayed counts, so "popular" means popular recently. A daemon thread wakes
+every few seconds, takes the top-N keys, and refreshes those expiring within the lead time,
+most urgent first, spending at most `budget` upstream requests per minute.
+
+    WEATHER_PREFETCH_TOP=20          # keys kept warm (0 disables the scheduler)
+    WEATHER_PREFETCH_BUDGET=30       # upstream requests per minute, at most
+    WEATHER_PREFETCH_LEAD_S=45       # refresh this long before expiry
+"""
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import perf
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TOP = 20
+DEFAULT_BUDGET_PER_MIN = 30
+DEFAULT_LEAD_S = 45.0
+DEFAULT_INTERVAL_S = 5.0
+# Views lose half their weight every hour; keys below MIN_SCORE are not refreshed
+DEFAULT_HALF_LIFE_S = 60 * 60
+MIN_SCORE = 0.5
+# Least popular keys are forgotten beyond this many
+MAX_KEYS = 2048
+
+
+class Popularity:
+    """Exponentially decayed view counts per key."""
+
+    def __init__(self, half_life_s: float = DEFAULT_HALF_LIFE_S, max_keys: int = MAX_KEYS):
+        self.rate = math.log(2) / half_life_s
+        self.max_keys = max_keys
+        # key -> (score, time of last update); the score decays from that time on
+        self._scores: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _decayed(self, score: float, since: float, now: float) -> float:
+        return score * math.exp(-self.rate * (now - since))
+
+    def record(self, key: str, now: Optional[float] = None) -> List[str]:
+        """Count one view of `key`; returns the keys forgotten to stay within `max_keys`."""
+        now = time.time() if now is None else now
+        with self._lock:
+            score, since = self._scores.get(key, (0.0, now))
+            self._scores[key] = (self._decayed(score, since, now) + 1.0, now)
+            if len(self._scores) > self.max_keys:
+                return self._prune(now)
+            return []
+
+    def _prune(self, now: float) -> List[str]:
+        ranked = sorted(self._scores, key=lambda k: self._decayed(*self._scores[k], now))
+        evicted = ranked[:len(ranked) - self.max_keys]
+        for key in evicted:
+            del self._scores[key]
+        return evicted
+
+    def top(self, n: int, min_score: float = MIN_SCORE, now: Optional[float] = None) -> List[Tuple[str, float]]:
+        """The `n` highest-scoring keys with at least `min_score`, best first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            scored = [(key, self._decayed(score, since, now)) for key, (score, since) in self._scores.items()]
+        scored = [item for item in scored if item[1] >= min_score]
+        scored.sort(key=lambda item: -item[1])
+        return scored[:n]
+
+
+class Budget:
+    """At most `per_minute` spends in any sliding 60-second window."""
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self._spent: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def take(self, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        with self._lock:
+            while self._spent and now - self._spent[0] >= 60:
+                self._spent.popleft()
+            if len(self._spent) >= self.per_minute:
+                return False
+            self._spent.append(now)
+            return True
+
+
+class Prefetcher:
+    """Daemon thread keeping the top-N most viewed cache entries fresh."""
+
+    def __init__(
+        self,
+        top: int = DEFAULT_TOP,
+        budget_per_min: int = DEFAULT_BUDGET_PER_MIN,
+        lead_s: float = DEFAULT_LEAD_S,
+        interval_s: float = DEFAULT_INTERVAL_S,
+        popularity: Optional[Popularity] = None,
+    ):
+        self.top = top
+        self.lead_s = lead_s
+        self.interval_s = interval_s
+        self.budget = Budget(budget_per_min)
+        self.popularity = popularity or Popularity()
+        # key -> (expires_at, refresh); refresh returns True if it stored a new response
+        self._jobs: Dict[str, Tuple[Callable[[], float], Callable[[], bool]]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="prefetch", daemon=True)
+
+    def start(self) -> "Prefetcher":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def record(self, key: str, expires_at: Callable[[], float], refresh: Callable[[], bool]) -> None:
+        """Count a view of `key` and remember how to check and refresh its cache entry.
+
+        Jobs of keys the popularity counts forget are dropped with them, so `_jobs` stays
+        within `popularity.max_keys` however many locations get viewed.
+        """
+        with self._lock:
+            self._jobs[key] = (expires_at, refresh)
+            for evicted in self.popularity.record(key):
+                self._jobs.pop(evicted, None)
+
+    def due(self, now: Optional[float] = None) -> List[Tuple[float, str]]:
+        """(expires_at, key) of popular entries expiring within the lead time, most urgent first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            jobs = {key: self._jobs.get(key) for key, _ in self.popularity.top(self.top, now=now)}
+        due = []
+        for key, job in jobs.items():
+            if job is None:
+                continue
+            try:
+                expires = job[0]()
+            except Exception as exc:
+                log.warning("Prefetch expiry check for %s failed: %s", key, exc)
+                continue
+            if expires - now <= self.lead_s:
+                due.append((expires, key))
+        return sorted(due)
+
+    def run_once(self, now: Optional[float] = None) -> int:
+        """Refresh what is due within the budget; returns the number of entries refreshed."""
+        refreshed = 0
+        for _, key in self.due(now):
+            if not self.budget.take():
+                perf.incr("prefetch_total", result="over_budget")
+                break
+            with self._lock:
+                job = self._jobs.get(key)
+            if job is None:
+                # Forgotten since due() ran
+                continue
+            _, refresh = job
+            try:
+                with perf.span("prefetch.refresh"):
+                    ok = refresh()
+            except Exception as exc:
+                log.warning("Prefetch of %s failed: %s", key, exc)
+                ok = False
+            perf.incr("prefetch_total", result="refreshed" if ok else "failed")
+            refreshed += ok
+        return refreshed
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.run_once()
+            except Exception:
+                log.exception("Prefetch pass failed")
+
+
+@functools.lru_cache(maxsize=None)
+def prefetcher_from_env() -> Optional[Prefetcher]:
+    """Start the scheduler once per process unless WEATHER_PREFETCH_TOP is 0."""
+    top = int(os.environ.get("WEATHER_PREFETCH_TOP", DEFAULT_TOP))
+    if top <= 0:
+        return None
+    return Prefetcher(
+        top=top,
+        budget_per_min=int(os.environ.get("WEATHER_PREFETCH_BUDGET", DEFAULT_BUDGET_PER_MIN)),
+        lead_s=float(os.environ.get("WEATHER_PREFETCH_LEAD_S", DEFAULT_LEAD_S)),
+    ).start()
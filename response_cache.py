@@ -0,0 +1,424 @@
+"""Persistent cache for raw Open-Meteo responses.
+
+`st.cache_data` only lives in one process's memory, so every restart and every extra
+replica starts cold. This module keeps the JSON bodies in a store that several Streamlit
+processes on the same host can share (SQLite in WAL mode by default), bounded by size
+with least-recently-used eviction.
+
+Configuration (environment):
+    WEATHER_CACHE_BACKEND   "sqlite" (default) or "memory"
+    WEATHER_CACHE_PATH      SQLite file, default ~/.cache/zainweather/responses.sqlite3
+    WEATHER_CACHE_MAX_MB    size budget for stored payloads, default 256
+
+JSON goes through orjson when it is installed (optional; several times faster on the large
+multi-day responses), otherwise the standard library.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+from urllib.parse import urlencode
+
+import perf
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "zainweather", "responses.sqlite3")
+DEFAULT_MAX_MB = 256
+
+T = TypeVar("T")
+# Small shared records (e.g. the upstream token bucket): name -> tuple of floats
+BucketUpdate = Callable[[Optional[Tuple[float, ...]]], Tuple[Tuple[float, ...], T]]
+
+
+def snap_to_grid(lat: float, lon: float, step: float) -> Tuple[float, float]:
+    """Move a coordinate to the centre of its `step`-degree grid cell (no-op for step <= 0)."""
+    if step <= 0:
+        return lat, lon
+    lat = min(90.0, max(-90.0, lat))
+    lon = (lon + 180.0) % 360.0 - 180.0
+    return round(round(lat / step) * step, 6), round(round(lon / step) * step, 6)
+
+
+def grid_cell(lat: float, lon: float, step: float) -> str:
+    """Readable id of the grid cell holding a coordinate, e.g. "0.05:497:1340"."""
+    if step <= 0:
+        return f"raw:{lat}:{lon}"
+    return f"{step:g}:{round(lat / step)}:{round(lon / step)}"
+
+
+def json_loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def json_dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+class CellStats:
+    """Per-cell counters: how often a cell was asked for vs. how often it went upstream."""
+
+    def __init__(self):
+        self.lookups: Counter = Counter()
+        self.fetches: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record_lookup(self, cell: str) -> None:
+        with self._lock:
+            self.lookups[cell] += 1
+
+    def record_fetch(self, cell: str) -> None:
+        with self._lock:
+            self.fetches[cell] += 1
+
+    def hit_rate(self) -> float:
+        with self._lock:
+            asked = sum(self.lookups.values())
+            fetched = sum(self.fetches.values())
+        return 1.0 - fetched / asked if asked else 0.0
+
+
+def make_key(endpoint: str, params: Dict[str, Any]) -> str:
+    """Stable cache key for an endpoint call; parameter order doesn't matter."""
+    return f"{endpoint}?{urlencode(sorted((k, str(v)) for k, v in params.items()))}"
+
+
+class MemoryBackend:
+    """In-process LRU store. Used when no disk is available and in tests/benchmarks."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._size = 0
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, key: str, endpoint: str, payload: bytes, stored_at: float) -> None:
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._items[key] = (payload, stored_at)
+            self._size += len(payload)
+            while self._size > self.max_bytes and len(self._items) > 1:
+                _, (evicted, _) = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+    def update_bucket(self, name: str, update: BucketUpdate) -> T:
+        """Replace the record `name` with `update(old)[0]` atomically; returns `update(old)[1]`."""
+        with self._lock:
+            state, result = update(self._buckets.get(name))
+            self._buckets[name] = state
+            return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+
+class SQLiteBackend:
+    """File-backed store shared by all processes on the host.
+
+    WAL mode lets readers in other workers proceed while one writes; each thread gets its
+    own connection because sqlite3 connections can't be shared across threads. Shared
+    records such as the upstream token bucket live in a second table, so every worker
+    updates the same one.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        # Used for shared records while the database is locked or unwritable
+        self._fallback = MemoryBackend(0)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (accessed_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, state TEXT NOT NULL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        conn = self._conn()
+        row = conn.execute("SELECT payload, stored_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        try:
+            with conn:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.OperationalError:
+            pass  # another worker holds the write lock; recency is best-effort
+        return bytes(row[0]), row[1]
+
+    def put(self, key: str, endpoint: str, payload: bytes, stored_at: float) -> None:
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, payload, size, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, payload, len(payload), stored_at, stored_at),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop the shortest least-recently-used prefix whose sizes cover the overflow
+        conn.execute(
+            """DELETE FROM responses WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, size, SUM(size) OVER (ORDER BY accessed_at ASC, key) AS running
+                    FROM responses
+                ) WHERE running - size < ?
+            )""",
+            (total - self.max_bytes,),
+        )
+
+    def update_bucket(self, name: str, update: BucketUpdate) -> T:
+        """Replace the record `name` with `update(old)[0]` in one write transaction; returns `update(old)[1]`.
+
+        Falls back to a per-process record if the database can't be written.
+        """
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT state FROM buckets WHERE name = ?", (name,)).fetchone()
+                state, result = update(tuple(json.loads(row[0])) if row else None)
+                conn.execute("INSERT OR REPLACE INTO buckets (name, state) VALUES (?, ?)", (name, json.dumps(state)))
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+            return result
+        except sqlite3.Error as exc:
+            log.warning("Shared record %s unavailable, using a per-process one: %s", name, exc)
+            return self._fallback.update_bucket(name, update)
+
+    def clear(self) -> None:
+        with self._conn() as conn:
+            conn.execute("DELETE FROM responses")
+
+
+class ResponseCache:
+    """JSON response cache in front of a backend, with stale-while-revalidate refreshes.
+
+    Payloads are stored zlib-compressed; the most recently used ones are also kept decoded
+    in memory so a warm read costs a dict lookup. Returned data is shared between callers
+    and must be treated as read-only.
+    """
+
+    def __init__(self, backend, hot_entries: int = 256, refresh_workers: int = 4):
+        self.backend = backend
+        self.hot_entries = hot_entries
+        self._hot: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._refresh_pool = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="cache-refresh")
+
+    def _remember(self, key: str, data: Dict[str, Any], stored_at: float) -> None:
+        with self._lock:
+            self._hot[key] = (data, stored_at)
+            self._hot.move_to_end(key)
+            while len(self._hot) > self.hot_entries:
+                self._hot.popitem(last=False)
+
+    def lookup(self, key: str, ttl: float = 0.0) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return (data, stored_at) for a stored response, whatever its age.
+
+        A hot entry younger than `ttl` is returned as is; otherwise the backend is read too,
+        since another worker may have refreshed it in the meantime.
+        """
+        with self._lock:
+            hot = self._hot.get(key)
+        if hot is not None and time.time() - hot[1] < ttl:
+            return hot
+        try:
+            hit = self.backend.get(key)
+        except sqlite3.Error:
+            hit = None
+        if hit is None or (hot is not None and hot[1] >= hit[1]):
+            return hot
+        payload, stored_at = hit
+        data = json_loads(zlib.decompress(payload))
+        self._remember(key, data, stored_at)
+        return data, stored_at
+
+    def store(self, key: str, endpoint: str, data: Dict[str, Any]) -> float:
+        stored_at = time.time()
+        self._remember(key, data, stored_at)
+        payload = zlib.compress(json_dumps(data), 1)
+        try:
+            self.backend.put(key, endpoint, payload, stored_at)
+        except sqlite3.Error:
+            pass  # a full or locked disk must never break a render
+        return stored_at
+
+    def clear(self) -> None:
+        """Forget every stored response (hot entries and backend)."""
+        with self._lock:
+            self._hot.clear()
+        self.backend.clear()
+
+    def _single_flight(self, key: str) -> Tuple[Future, bool]:
+        """Return the in-flight fetch for `key`, creating it if none is running.
+
+        The boolean tells the caller whether it owns the new future and must run it.
+        """
+        with self._lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                return fut, False
+            fut = Future()
+            self._inflight[key] = fut
+            return fut, True
+
+    def _run(self, key: str, endpoint: str, fetch: Callable[[], Dict[str, Any]], fut: Future) -> None:
+        try:
+            data = fetch()
+            stored_at = self.store(key, endpoint, data)
+        except Exception as exc:
+            fut.set_exception(exc)
+        else:
+            fut.set_result((data, stored_at))
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _refresh(self, key: str, endpoint: str, fetch: Callable[[], Dict[str, Any]], fut: Future) -> None:
+        self._run(key, endpoint, fetch, fut)
+        if fut.exception() is not None:
+            perf.incr("cache_refresh_errors_total", endpoint=endpoint)
+            log.warning("Background refresh of %s failed: %s", key, fut.exception())
+
+    def refresh(self, endpoint: str, params: Dict[str, Any], fetch: Callable[[], Dict[str, Any]]) -> bool:
+        """Fetch and store an entry now, whatever its age (used by the prefetcher).
+
+        Returns False if the fetch failed or another caller was already fetching the same key.
+        """
+        key = make_key(endpoint, params)
+        fut, owner = self._single_flight(key)
+        if not owner:
+            return False
+        self._refresh(key, endpoint, fetch, fut)
+        return fut.exception() is None
+
+    def peek(
+        self,
+        endpoint: str,
+        params: Dict[str, Any],
+        ttl: float,
+        refresh_fetch: Callable[[], Dict[str, Any]],
+    ) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return the stored (data, stored_at) for an endpoint call, or None; never fetches in the foreground.
+
+        An entry past its `ttl` is still returned, and refreshed in the background with
+        `refresh_fetch` unless a fetch of it is already running.
+        """
+        key = make_key(endpoint, params)
+        hit = self.lookup(key, ttl)
+        if hit is not None and time.time() - hit[1] >= ttl:
+            fut, owner = self._single_flight(key)
+            if owner:
+                self._refresh_pool.submit(self._refresh, key, endpoint, refresh_fetch, fut)
+        return hit
+
+    def get_json(
+        self,
+        endpoint: str,
+        params: Dict[str, Any],
+        ttl: float,
+        fetch: Callable[[], Dict[str, Any]],
+        max_stale: float = 0.0,
+        refresh_fetch: Optional[Callable[[], Dict[str, Any]]] = None,
+    ) -> Tuple[Dict[str, Any], float]:
+        """Return (data, stored_at) for an endpoint call.
+
+        Entries younger than `ttl` are served directly. Entries up to `ttl + max_stale` old are
+        served immediately while one background refresh per key (with `refresh_fetch`, if given)
+        brings them up to date. Anything older, or missing, is fetched in the foreground;
+        concurrent callers for the same key wait on that single fetch instead of each going
+        upstream. If that fetch fails, the last stored response is served whatever its age;
+        only a key that was never fetched raises.
+        """
+        key = make_key(endpoint, params)
+        hit = self.lookup(key, ttl)
+        age = time.time() - hit[1] if hit is not None else None
+        if age is not None and age < ttl:
+            perf.incr("cache_requests_total", endpoint=endpoint, result="hit")
+            return hit
+        fut, owner = self._single_flight(key)
+        if age is not None and age < ttl + max_stale:
+            perf.incr("cache_requests_total", endpoint=endpoint, result="stale")
+            if owner:
+                self._refresh_pool.submit(self._refresh, key, endpoint, refresh_fetch or fetch, fut)
+            return hit
+        # "coalesced": waited on another caller's fetch instead of going upstream itself
+        perf.incr("cache_requests_total", endpoint=endpoint, result="miss" if owner else "coalesced")
+        if owner:
+            self._run(key, endpoint, fetch, fut)
+        try:
+            return fut.result()
+        except Exception as exc:
+            if hit is None:
+                raise
+            perf.incr("cache_requests_total", endpoint=endpoint, result="fallback")
+            log.warning("Serving %.0fs old %s after a failed fetch: %s", age, key, exc)
+            return hit
+
+
+def backend_from_env():
+    """Build the backend selected by WEATHER_CACHE_* environment variables."""
+    max_bytes = int(float(os.environ.get("WEATHER_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+    kind = os.environ.get("WEATHER_CACHE_BACKEND", "sqlite").lower()
+    if kind == "memory":
+        return MemoryBackend(max_bytes)
+    if kind != "sqlite":
+        raise ValueError(f"Unknown WEATHER_CACHE_BACKEND: {kind!r} (expected 'sqlite' or 'memory')")
+    path = os.environ.get("WEATHER_CACHE_PATH", DEFAULT_PATH)
+    try:
+        return SQLiteBackend(path, max_bytes)
+    except (OSError, sqlite3.Error):
+        # Read-only or missing disk: keep serving from memory rather than failing the app
+        return MemoryBackend(max_bytes)
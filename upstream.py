@@ -0,0 +1,214 @@
+"""Rate-limit-aware scheduling of upstream (Open-Meteo) calls.
+
+Open-Meteo limits calls per IP, so every upstream call first takes tokens from one token
+bucket. The bucket's state lives in the response cache's backend: with the default SQLite
+store every session and every worker process on the host draws on the same budget. A 429
+answer empties the bucket until its Retry-After, for all of them at once.
+
+Callers queue by priority: interactive renders first, then background refreshes (prefetch,
+stale-while-revalidate), then batch jobs. Non-interactive callers also leave `reserve` tokens
+in the bucket, which keeps room for renders in other processes too. Interactive callers give
+up after a short wait (the cache then serves its last good response); batch callers wait as
+long as it takes, so a large job runs at the full allowed rate.
+
+    WEATHER_UPSTREAM_RATE_PER_MIN=500   # sustained calls per minute for the host (0 disables)
+    WEATHER_UPSTREAM_BURST=20           # bucket size
+    WEATHER_UPSTREAM_RESERVE=4          # tokens only interactive calls may use
+    WEATHER_UPSTREAM_MAX_WAIT_S=8       # longest an interactive call queues for a token
+
+Several hosts behind one egress IP don't share a store; give each its share of the quota.
+"""
+import datetime as dt
+import email.utils
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import perf
+
+log = logging.getLogger(__name__)
+
+# Open-Meteo's free tier allows 600 calls per minute; stay below it
+DEFAULT_RATE_PER_MIN = 500
+DEFAULT_BURST = 20
+DEFAULT_RESERVE = 4
+DEFAULT_MAX_WAIT_S = 8.0
+# Background refreshes can wait longer than a render; batch jobs wait indefinitely
+BACKGROUND_MAX_WAIT_S = 30.0
+# Used when a 429 carries no (readable) Retry-After
+DEFAULT_RETRY_AFTER_S = 60.0
+# A queued caller re-checks the shared bucket at least this often (other processes spend from it)
+POLL_S = 0.5
+
+INTERACTIVE, BACKGROUND, BATCH = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background", BATCH: "batch"}
+
+# Bucket state as stored: (tokens, updated_at, blocked_until)
+BucketState = Tuple[float, float, float]
+
+
+class RateLimited(Exception):
+    """No upstream budget within the caller's wait limit, or the upstream answered 429."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str], default: float = DEFAULT_RETRY_AFTER_S) -> float:
+    """Seconds to wait from a Retry-After header (delta-seconds or an HTTP date)."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=dt.timezone.utc)
+    return max(0.0, when.timestamp() - time.time())
+
+
+class TokenBucket:
+    """`rate` tokens per second up to `capacity`, in a store shared by everyone using it.
+
+    `store.update_bucket(name, update)` must apply `update` to the stored state atomically
+    (see the response_cache backends).
+    """
+
+    def __init__(self, store: Any, rate: float, capacity: float, name: str = "openmeteo"):
+        self.store = store
+        self.rate = rate
+        self.capacity = capacity
+        self.name = name
+
+    def _refill(self, state: Optional[BucketState], now: float) -> BucketState:
+        if state is None:
+            return float(self.capacity), now, 0.0
+        tokens, updated, blocked = state
+        return min(self.capacity, tokens + max(0.0, now - updated) * self.rate), max(now, updated), blocked
+
+    def take(self, cost: float = 1.0, keep: float = 0.0, now: Optional[float] = None) -> float:
+        """Take `cost` tokens if at least `keep` would be left; returns 0, or seconds until it could.
+
+        A call costing more than the bucket holds runs off a full bucket and leaves it in debt,
+        so the long-run rate still holds.
+        """
+        now = time.time() if now is None else now
+
+        def update(state: Optional[BucketState]) -> Tuple[BucketState, float]:
+            tokens, updated, blocked = self._refill(state, now)
+            if blocked > now:
+                return (tokens, updated, blocked), blocked - now
+            need = min(cost, max(self.capacity - keep, 1.0)) + keep
+            if tokens >= need:
+                return (tokens - cost, updated, blocked), 0.0
+            return (tokens, updated, blocked), (need - tokens) / self.rate
+
+        return self.store.update_bucket(self.name, update)
+
+    def block(self, until: float, now: Optional[float] = None) -> None:
+        """Hand out nothing before `until`, then refill from empty."""
+        now = time.time() if now is None else now
+
+        def update(state: Optional[BucketState]) -> Tuple[BucketState, None]:
+            _, updated, blocked = self._refill(state, now)
+            return (0.0, max(updated, until), max(blocked, until)), None
+
+        self.store.update_bucket(self.name, update)
+
+
+class Scheduler:
+    """Lets upstream calls through in priority order, as fast as the bucket allows.
+
+    Only the head of the queue (lowest priority value, then arrival order) takes tokens;
+    everyone behind it waits, so a render arriving during a batch run goes next.
+    """
+
+    def __init__(
+        self,
+        bucket: TokenBucket,
+        reserve: float = DEFAULT_RESERVE,
+        max_wait: Optional[Dict[int, Optional[float]]] = None,
+    ):
+        self.bucket = bucket
+        self.reserve = reserve
+        self.max_wait = {INTERACTIVE: DEFAULT_MAX_WAIT_S, BACKGROUND: BACKGROUND_MAX_WAIT_S, BATCH: None}
+        self.max_wait.update(max_wait or {})
+        self._queue: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def acquire(self, priority: int = INTERACTIVE, cost: float = 1.0) -> float:
+        """Wait until a call may go upstream; returns the seconds waited.
+
+        Raises RateLimited when no tokens will be available within the priority's wait limit.
+        """
+        started = time.monotonic()
+        limit = self.max_wait[priority]
+        keep = 0.0 if priority == INTERACTIVE else min(self.reserve, self.bucket.capacity - 1)
+        entry = (priority, next(self._seq))
+        name = PRIORITY_NAMES[priority]
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    wait = None
+                    if self._queue[0] == entry:
+                        wait = self.bucket.take(cost, keep)
+                        if wait <= 0:
+                            break
+                    waited = time.monotonic() - started
+                    if limit is not None and waited + (wait or 0.0) > limit:
+                        perf.incr("upstream_scheduled_total", priority=name, result="rate_limited")
+                        retry = wait if wait is not None else POLL_S
+                        raise RateLimited(f"upstream budget exhausted; retry in {retry:.1f}s", retry)
+                    timeout = min(wait if wait is not None else POLL_S, POLL_S)
+                    if limit is not None:
+                        timeout = min(timeout, limit - waited)
+                    self._cond.wait(timeout)
+            finally:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                self._cond.notify_all()
+        waited = time.monotonic() - started
+        perf.incr("upstream_scheduled_total", priority=name, result="granted")
+        perf.RECORDER.record(f"ratelimit.wait.{name}", waited)
+        return waited
+
+    def backoff(self, retry_after: float) -> None:
+        """The upstream answered 429: stop everyone (every process sharing the bucket) for `retry_after`."""
+        perf.incr("upstream_rate_limited_total")
+        log.warning("Upstream rate limit hit; pausing upstream calls for %.0fs", retry_after)
+        self.bucket.block(time.time() + retry_after)
+        with self._cond:
+            self._cond.notify_all()
+
+    def queued(self) -> Dict[str, int]:
+        """Callers waiting per priority, for the debug panel."""
+        with self._cond:
+            counts = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._queue:
+                counts[PRIORITY_NAMES[priority]] += 1
+            return counts
+
+
+def scheduler_from_env(store: Any) -> Optional[Scheduler]:
+    """A Scheduler on `store` configured by WEATHER_UPSTREAM_*; None when the rate is 0."""
+    per_min = float(os.environ.get("WEATHER_UPSTREAM_RATE_PER_MIN", DEFAULT_RATE_PER_MIN))
+    if per_min <= 0:
+        return None
+    bucket = TokenBucket(store, per_min / 60, float(os.environ.get("WEATHER_UPSTREAM_BURST", DEFAULT_BURST)))
+    return Scheduler(
+        bucket,
+        reserve=float(os.environ.get("WEATHER_UPSTREAM_RESERVE", DEFAULT_RESERVE)),
+        max_wait={INTERACTIVE: float(os.environ.get("WEATHER_UPSTREAM_MAX_WAIT_S", DEFAULT_MAX_WAIT_S))},
+    )
@@ -0,0 +1,216 @@
+"""Lightweight JSON API serving the dashboard's forecast/advice payload.
+
+A plain ASGI application (no framework), so mobile clients get the advice chips, rain-start
+time and current AQI without a Streamlit session per user. It shares weather_core's fetchers
+and response cache with the dashboard and batch jobs.
+
+    uvicorn weather_api:app --host 0.0.0.0 --port 8000
+
+    GET /forecast?lat=24.86&lon=67.00[&tz=Asia/Karachi][&prefs=Runner,Hate%20rain][&units=metric|imperial][&air=0]
+    GET /healthz
+    GET /metrics    Prometheus text exposition of perf spans and counters
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import perf
+from response_cache import snap_to_grid
+from weather_core import (
+    AIR_QUALITY_GRID_DEG,
+    FORECAST_GRID_DEG,
+    FORECAST_TTL_S,
+    PREFERENCES,
+    SUMMARY_FORECAST_DAYS,
+    SUMMARY_HOURLY,
+    fetch_air_quality,
+    fetch_forecast,
+    forecast_summary,
+    unit_labels,
+)
+
+# Rendered payloads kept per (location, response versions, options)
+PAYLOAD_CACHE_ENTRIES = 4096
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class _PayloadCache:
+    """Small thread-safe LRU of encoded responses, so repeat requests skip parsing entirely."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._items: "OrderedDict[Tuple, Tuple[bytes, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, key: Tuple, value: Tuple[bytes, str]) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+
+_payloads = _PayloadCache(PAYLOAD_CACHE_ENTRIES)
+
+
+def _valid_timezone(tz: str) -> bool:
+    """True for "auto" or an IANA zone name; anything else would cost an upstream call and a 502."""
+    if tz == "auto":
+        return True
+    try:
+        ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+def parse_query(query: Dict[str, List[str]]) -> Dict[str, Any]:
+    """Validate /forecast query parameters."""
+    def one(name: str, default: Optional[str] = None) -> Optional[str]:
+        return query.get(name, [default])[0]
+
+    try:
+        lat = float(one("lat"))
+        lon = float(one("lon"))
+    except (TypeError, ValueError):
+        raise BadRequest("lat and lon are required numbers")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise BadRequest("lat must be in [-90, 90] and lon in [-180, 180]")
+    prefs = tuple(sorted(p.strip() for p in (one("prefs") or "").split(",") if p.strip()))
+    unknown = set(prefs) - set(PREFERENCES)
+    if unknown:
+        raise BadRequest(f"unknown prefs: {', '.join(sorted(unknown))}")
+    tz = one("tz", "auto") or "auto"
+    if not _valid_timezone(tz):
+        raise BadRequest("tz must be \"auto\" or an IANA time zone name, e.g. Asia/Karachi")
+    units = (one("units") or "metric").lower()
+    if units not in ("metric", "imperial"):
+        raise BadRequest("units must be metric or imperial")
+    return {
+        "lat": lat,
+        "lon": lon,
+        "tz": tz,
+        "prefs": prefs,
+        "imperial": units == "imperial",
+        "air": one("air", "1") not in ("0", "false", "no"),
+    }
+
+
+def build_payload(opts: Dict[str, Any]) -> Tuple[bytes, str, int]:
+    """Return (body, etag, max_age) for validated options. Blocking; run it off the event loop."""
+    fc_lat, fc_lon = snap_to_grid(opts["lat"], opts["lon"], FORECAST_GRID_DEG)
+    fc = fetch_forecast(fc_lat, fc_lon, opts["tz"], SUMMARY_HOURLY, SUMMARY_FORECAST_DAYS)
+    aq = None
+    if opts["air"]:
+        aq_lat, aq_lon = snap_to_grid(opts["lat"], opts["lon"], AIR_QUALITY_GRID_DEG)
+        try:
+            aq = fetch_air_quality(aq_lat, aq_lon, opts["tz"])
+        except Exception:
+            aq = None  # forecast without AQI beats no answer
+    fetched_at = fc.get("_fetched_at", time.time())
+    max_age = max(0, int(FORECAST_TTL_S - (time.time() - fetched_at)))
+    key = (
+        fc_lat, fc_lon, opts["tz"], fetched_at, aq.get("_fetched_at") if aq else None,
+        opts["prefs"], opts["imperial"],
+    )
+    cached = _payloads.get(key)
+    if cached is None:
+        summary = forecast_summary(fc, aq, opts["prefs"], opts["imperial"])
+        summary["location"] = {"lat": fc_lat, "lon": fc_lon, "timezone": fc.get("timezone", opts["tz"])}
+        temp_unit, wind_unit = unit_labels(opts["imperial"])
+        summary["units"] = {"temperature": temp_unit, "windspeed": wind_unit}
+        body = json.dumps(summary, separators=(",", ":"), ensure_ascii=False).encode()
+        cached = (body, '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"')
+        _payloads.put(key, cached)
+    return cached[0], cached[1], max_age
+
+
+async def _send(
+    send, status: int, body: bytes, headers: List[Tuple[bytes, bytes]] = (), content_type: bytes = b"application/json"
+) -> None:
+    perf.incr("api_responses_total", status=status)
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _error(message: str) -> bytes:
+    return json.dumps({"error": message}).encode()
+
+
+async def app(scope, receive, send):
+    """ASGI entry point."""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+    if scope["method"] not in ("GET", "HEAD"):
+        await _send(send, 405, _error("method not allowed"), [(b"allow", b"GET, HEAD")])
+        return
+    if scope["path"] == "/healthz":
+        await _send(send, 200, b'{"ok":true}')
+        return
+    if scope["path"] == "/metrics":
+        await _send(send, 200, perf.metrics_text().encode(), content_type=b"text/plain; version=0.0.4; charset=utf-8")
+        return
+    if scope["path"] != "/forecast":
+        await _send(send, 404, _error("not found"))
+        return
+
+    try:
+        opts = parse_query(parse_qs(scope["query_string"].decode("latin-1")))
+    except BadRequest as exc:
+        await _send(send, 400, _error(str(exc)))
+        return
+    started = time.perf_counter()
+    try:
+        body, etag, max_age = await asyncio.get_running_loop().run_in_executor(None, build_payload, opts)
+    except Exception as exc:
+        await _send(send, 502, _error(f"upstream unavailable: {exc}"))
+        return
+    finally:
+        perf.RECORDER.record("api.forecast", time.perf_counter() - started)
+
+    headers = [
+        (b"etag", etag.encode()),
+        (b"cache-control", f"public, max-age={max_age}, stale-while-revalidate=60".encode()),
+    ]
+    if_none_match = dict(scope["headers"]).get(b"if-none-match", b"").decode("latin-1")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        perf.incr("api_responses_total", status=304)
+        await send({"type": "http.response.start", "status": 304, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
+        return
+    if scope["method"] == "HEAD":
+        perf.incr("api_responses_total", status=200)
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers,
+        ]})
+        await send({"type": "http.response.body", "body": b""})
+        return
+    await _send(send, 200, body, headers)
@@ -1,329 +1,219 @@
-import math
+import os
+import threading
 import time
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from datetime import datetime, time as dtime, timedelta
+from typing import Dict, Any, List, Tuple
 
 import numpy as np
 import pandas as pd
-import requests
 import streamlit as st
-import pytz
-import plotly.express as px
+
+import assets
+import perf
+from archive import DEFAULT_WINDOW_DAYS
+from response_cache import grid_cell, snap_to_grid
+from weather_core import (
+    AIR_QUALITY_GRID_DEG,
+    ARCHIVE_GRID_DEG,
+    AdviceMasks,
+    DEFAULT_FORECAST_DAYS,
+    FORECAST_GRID_DEG,
+    FORECAST_MINUTELY_15,
+    FORECAST_TTL_S,
+    GEOCODE_TTL_S,
+    HourlyLookup,
+    PREFERENCES,
+    WATCHLIST_TZ,
+    aqi_advice,
+    cell_stats,
+    display_units,
+    fetch_air_quality,
+    fetch_concurrently,
+    fetch_forecast,
+    fetch_history,
+    fetch_watchlist,
+    first_rain,
+    forecast_summary,
+    geocode,
+    get_weather_icon,
+    history_comparison,
+    hourly_variables,
+    local_now,
+    parse_air_quality,
+    parse_forecast,
+    parse_minutely_15,
+    record_air_quality_view,
+    record_forecast_view,
+    resolve_watchlist,
+    row_at,
+    unit_labels,
+    upstream_scheduler,
+    wardrobe_advice,
+    warm_up,
+)
 
 st.set_page_config(page_title="ZainWeatherApp", page_icon="🌦️", layout="wide")
 
 
-# Add styling for metrics and weather description
-st.markdown("""
-<style>
-.stMetric {
-    border: 1px solid #e5e7eb;
-    border-radius: 0 !important;
-    padding: 1rem !important;
-    background: white;
-}
-.stMetric-value {
-    font-size: 1.5rem !important;
-    font-weight: 600 !important;
-}
-.stMetric-label {
-    font-size: 0.9rem !important;
-    color: #6b7280 !important;
-}
-.weather-desc {
-    background: #e0e7ff;
-    color: #2563eb;
-    padding: 0.4rem 1rem;
-    border-radius: 999px;
-    display: inline-block;
-    font-weight: 600;
-    margin: 0.5rem 0;
-}
-.temp-display {
-    font-size: 2.5rem;
-    font-weight: 600;
-    margin: 0.5rem 0;
-}
-
-/* Card container used for small panels */
-.panel {
-  background: #ffffff;
-  border: 1px solid #e6e7eb;
-  padding: 0.8rem;
-  border-radius: 6px;
-  box-shadow: 0 1px 2px rgba(16,24,40,0.03);
-}
-
-/* Make Streamlit metrics use subtle square corners and consistent sizing */
-div[data-testid="stMetric"] {
-  border-radius: 4px !important;
-  padding: 0.45rem 0.6rem !important;
-  background: #ffffff !important;
-  border: 1px solid #e6e7eb !important;
-  box-shadow: none !important;
-  display: flex !important;
-  align-items: center !important;
-  justify-content: space-between !important;
-  gap: 0.6rem !important;
-}
-
-/* Label on the left, value on the right */
-div[data-testid="stMetricLabel"] {
-  font-size: 0.95rem !important;
-  color: #6b7280 !important;
-  text-align: left !important;
-  flex: 1 1 auto !important;
-  margin-right: 0.6rem !important;
-}
-
-div[data-testid="stMetricValue"] {
-  font-size: 1.3rem !important;
-  font-weight: 700 !important;
-  color: #0f172a !important;
-  text-align: right !important;
-  min-width: 4.5ch !important;
-}
-
-/* Ensure metrics inside small right column stack nicely */
-.panel > div[data-testid="stMetric"] {
-  margin-bottom: 0.5rem !important;
-}
-
-/* Row helper when showing multiple metrics directly under a panel */
-.panel .metric-row { display:flex; gap:0.6rem; margin-top:0.6rem; }
-.panel .metric-row > div { flex:1; }
-
-/* Prominent temperature display (no pill) */
-.temp-large { font-size: 3rem; font-weight: 800; color: #0f172a; }
-
-/* Small badge for weather description (subtle, not full pill for all items) */
-.weather-badge { display:inline-block; background:#eef2ff; color:#3730a3; padding:0.28rem 0.6rem; border-radius:6px; font-weight:600; margin-top:0.5rem; }
-
-/* Dark mode adjustments */
-[data-theme="dark"] .panel {
-  background: #071122;
-  border-color: #203040;
-}
-[data-theme="dark"] div[data-testid="stMetric"] {
-  background: #08131b !important;
-  border-color: #1f2a34 !important;
-}
-[data-theme="dark"] div[data-testid="stMetricValue"] {
-  color: #e6eef8 !important;
-}
-[data-theme="dark"] div[data-testid="stMetricLabel"] {
-  color: #93a0b8 !important;
-}
-[data-theme="dark"] .weather-badge { background:#0f1724; color:#bfdbfe; }
-
-@media (max-width: 640px) {
-  div[data-testid="stMetric"] {
-    flex-direction: column !important;
-    align-items: flex-start !important;
-  }
-  div[data-testid="stMetricValue"] { text-align: left !important; }
-  .temp-large { font-size: 2.2rem; }
-}
-</style>
-""", unsafe_allow_html=True)
+# One minified stylesheet per run; every card below uses its classes instead of inline styles
+st.markdown(assets.STYLE_TAG, unsafe_allow_html=True)
 
 # Place title and small branding in the sidebar so the main dashboard starts at the top
 with st.sidebar:
-    st.markdown("<div style='display:flex;align-items:center;gap:0.6rem'>🌦️ <strong style='font-size:1.1rem'>ZainWeather</strong></div>", unsafe_allow_html=True)
+    st.markdown(assets.BRAND, unsafe_allow_html=True)
     st.caption("Powered by Open‑Meteo — no API keys required")
 
 
-# Weather code to icon/description mapping
-WMO_CODES = {
-    0: ("☀️", "Clear sky"),
-    1: ("🌤️", "Mainly clear"),
-    2: ("⛅", "Partly cloudy"),
-    3: ("☁️", "Overcast"),
-    45: ("🌫️", "Foggy"),
-    48: ("🌫️", "Depositing rime fog"),
-    51: ("🌦️", "Light drizzle"),
-    53: ("🌦️", "Moderate drizzle"),
-    55: ("🌧️", "Dense drizzle"),
-    56: ("🌧️", "Light freezing drizzle"),
-    57: ("🌧️", "Dense freezing drizzle"),
-    61: ("🌧️", "Slight rain"),
-    63: ("🌧️", "Moderate rain"),
-    65: ("🌧️", "Heavy rain"),
-    66: ("🌧️", "Light freezing rain"),
-    67: ("🌧️", "Heavy freezing rain"),
-    71: ("🌨️", "Slight snow"),
-    73: ("🌨️", "Moderate snow"),
-    75: ("🌨️", "Heavy snow"),
-    77: ("❄️", "Snow grains"),
-    80: ("🌦️", "Slight rain showers"),
-    81: ("🌧️", "Moderate rain showers"),
-    82: ("🌧️", "Violent rain showers"),
-    85: ("🌨️", "Slight snow showers"),
-    86: ("🌨️", "Heavy snow showers"),
-    95: ("⛈️", "Thunderstorm"),
-    96: ("⛈️", "Thunderstorm with slight hail"),
-    99: ("⛈️", "Thunderstorm with heavy hail"),
-}
-
-def get_weather_icon(code: int) -> tuple:
-    """Get weather icon and description for a WMO code."""
-    return WMO_CODES.get(code, ("❓", "Unknown"))
-
-def temp_color(temp: float) -> str:
-    """Return color based on temperature."""
-    if temp < 0: return "#A4CAFE"  # Very cold - light blue
-    elif temp < 10: return "#60A5FA"  # Cold - blue
-    elif temp < 20: return "#34D399"  # Mild - green
-    elif temp < 30: return "#FBBF24"  # Warm - yellow
-    else: return "#F87171"  # Hot - red
-
 # -----------------------------
 # Utilities & Caching
 # -----------------------------
-@st.cache_data(show_spinner=False, ttl=60 * 30)
+# Fetching, parsing, AQI and advice live in weather_core; this layer adds Streamlit caching.
+# Sidebar timing/cache panel: always with WEATHER_DEBUG_PANEL=1, otherwise per page with ?debug=1
+DEBUG_PANEL = os.environ.get("WEATHER_DEBUG_PANEL", "") not in ("", "0")
+# Prime caches, parsers and Plotly in the background when a process starts; WEATHER_WARMUP=0 skips it
+WARM_UP = os.environ.get("WEATHER_WARMUP", "1") not in ("", "0")
+
+@st.cache_resource(show_spinner=False)
+def start_warm_up() -> threading.Thread:
+    """Run weather_core.warm_up once per process, off the first visitor's render path."""
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+if WARM_UP:
+    start_warm_up()
+
+@st.cache_data(show_spinner=False, ttl=GEOCODE_TTL_S)
 def geocode_place(q: str, count: int = 5) -> pd.DataFrame:
     """Search locations using Open-Meteo Geocoding API."""
-    url = "https://geocoding-api.open-meteo.com/v1/search"
-    params = {"name": q, "count": count, "language": "en", "format": "json"}
-    r = requests.get(url, params=params, timeout=20)
-    r.raise_for_status()
-    data = r.json()
-    if not data or "results" not in data:
-        return pd.DataFrame()
-    rows = []
-    for it in data["results"]:
-        rows.append({
-            "name": it.get("name"),
-            "country": it.get("country"),
-            "admin1": it.get("admin1"),
-            "lat": it.get("latitude"),
-            "lon": it.get("longitude"),
-            "timezone": it.get("timezone"),
-            "elevation": it.get("elevation"),
-        })
-    return pd.DataFrame(rows)
-
-@st.cache_data(show_spinner=False, ttl=5 * 60)
-def fetch_forecast(lat: float, lon: float, tz: str) -> Dict[str, Any]:
-    """Fetch current, hourly, and daily weather from Open-Meteo."""
-    url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "hourly": ",".join([
-            "temperature_2m",
-            "relative_humidity_2m",
-            "apparent_temperature",
-            "precipitation",
-            "rain",
-            "snowfall",
-            "precipitation_probability",
-            "weathercode",  # Added weathercode to hourly
-            "cloud_cover",
-            "windspeed_10m",
-            "windgusts_10m",
-            "winddirection_10m",
-            "uv_index",
-            "uv_index_clear_sky",
-        ]),
-        "daily": ",".join([
-            "weathercode",
-            "temperature_2m_max",
-            "temperature_2m_min",
-            "temperature_2m_max",
-            "temperature_2m_min",
-            "windspeed_10m_max",
-        ]),
-        "current_weather": True,
-        "timezone": tz,
-    }
-    r = requests.get(url, params=params, timeout=30)
-    r.raise_for_status()
-    return r.json()
-
-@st.cache_data(show_spinner=False, ttl=10 * 60)
-def fetch_air_quality(lat: float, lon: float, tz: str) -> Dict[str, Any]:
-    """Fetch hourly air quality (PM2.5, PM10, O3, NO2, SO2) from Open-Meteo AQ API."""
-    url = "https://air-quality-api.open-meteo.com/v1/air-quality"
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "hourly": ",".join([
-            "pm2_5",
-            "pm10",
-            "ozone",
-            "nitrogen_dioxide",
-            "sulphur_dioxide",
-            "carbon_monoxide",
-            "us_aqi",
-        ]),
-        "timezone": tz,
-    }
-    r = requests.get(url, params=params, timeout=30)
-    r.raise_for_status()
-    return r.json()
-
-# -----------------------------
-# Helpers: AQI computation (fallback if us_aqi absent)
-# -----------------------------
-# Breakpoints for US EPA AQI (2012 PM2.5, PM10; 2015 O3 8hr; NO2 1hr; SO2 1hr simplified)
-# This is a simplified implementation for demo purposes.
-AQI_BP = {
-    "pm2_5": [
-        (0.0, 12.0, 0, 50),
-        (12.1, 35.4, 51, 100),
-        (35.5, 55.4, 101, 150),
-        (55.5, 150.4, 151, 200),
-        (150.5, 250.4, 201, 300),
-        (250.5, 350.4, 301, 400),
-        (350.5, 500.4, 401, 500),
-    ],
-    "pm10": [
-        (0, 54, 0, 50), (55, 154, 51, 100), (155, 254, 101, 150),
-        (255, 354, 151, 200), (355, 424, 201, 300), (425, 504, 301, 400), (505, 604, 401, 500)
-    ],
-}
-
-AQI_CATEGORIES = [
-    (0, 50, "Good", "Air quality is satisfactory."),
-    (51, 100, "Moderate", "Unusually sensitive people should limit outdoor exertion."),
-    (101, 150, "Unhealthy for Sensitive Groups", "Reduce prolonged or heavy exertion."),
-    (151, 200, "Unhealthy", "Avoid prolonged or heavy exertion; sensitive groups should stay indoors."),
-    (201, 300, "Very Unhealthy", "Health alert: everyone may experience serious effects."),
-    (301, 500, "Hazardous", "Health warnings of emergency conditions."),
-]
-
-def calc_aqi_subindex(pollutant: str, conc: float) -> Optional[float]:
-    bps = AQI_BP.get(pollutant)
-    if not bps or conc is None or math.isnan(conc):
-        return None
-    for c_low, c_high, aqi_low, aqi_high in bps:
-        if c_low <= conc <= c_high:
-            return (aqi_high - aqi_low) / (c_high - c_low) * (conc - c_low) + aqi_low
-    return None
-
-
-def categorize_aqi(aqi: float) -> str:
-    for lo, hi, name, _ in AQI_CATEGORIES:
-        if lo <= aqi <= hi:
-            return name
-    return "Unknown"
-
-
-def aqi_advice(aqi: float) -> str:
-    for lo, hi, name, advice in AQI_CATEGORIES:
-        if lo <= aqi <= hi:
-            return advice
-    return "—"
+    return geocode(q, count)
+
+@st.cache_resource(show_spinner=False, max_entries=512)
+def forecast_frames(key: Tuple, fetched_at: float, _fc: Dict[str, Any]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Hourly and daily frames for a forecast response, parsed once per (key, fetched_at).
+
+    The frames are shared across sessions and reruns; treat them as read-only.
+    """
+    return parse_forecast(_fc)
+
+@st.cache_resource(show_spinner=False, max_entries=512)
+def minutely_frame(key: Tuple, fetched_at: float, _fc: Dict[str, Any]) -> pd.DataFrame:
+    """15-minute frame for a forecast response (empty if none was requested); read-only."""
+    return parse_minutely_15(_fc)
+
+@st.cache_resource(show_spinner=False, max_entries=512)
+def advice_masks(
+    key: Tuple, fetched_at: float, aq_fetched_at: Any, _hdf: pd.DataFrame, _ddf: pd.DataFrame, _aqdf: Any
+) -> AdviceMasks:
+    """Every advice rule evaluated over the whole forecast, once per data version; read-only.
+
+    Preferences only select from it, so changing them doesn't re-evaluate anything.
+    """
+    return AdviceMasks(_hdf, _ddf, _aqdf)
+
+@st.cache_resource(show_spinner=False, max_entries=512)
+def air_quality_frame(key: Tuple, fetched_at: float, _aq: Dict[str, Any]) -> pd.DataFrame:
+    """Hourly air-quality frame with computed AQI columns, built once per (key, fetched_at); read-only."""
+    return parse_air_quality(_aq)
+
+# Hourly chart horizons offered in the panel (hours); longer ones are downsampled for the browser
+HORIZONS = {"48 h": 48, "3 days": 72, "7 days": 168, "10 days": 240, "16 days": 384}
+FORECAST_DAY_CHOICES = [3, 7, 10, 14, 16]
+# Live-mode refresh intervals (seconds)
+LIVE_INTERVALS = {"15 s": 15, "1 min": 60, "5 min": 300}
+# Watchlist defaults, size cap and the hourly series offered as small multiples
+DEFAULT_WATCHLIST = "Karachi\nLahore\nIslamabad\nPeshawar\nQuetta"
+WATCHLIST_MAX = 100
+WATCHLIST_METRICS = {"Temperature": "temp", "Precipitation chance": "pop", "Wind gusts": "gust"}
+# Hourly variables the dashboard reads; the rest of FORECAST_HOURLY is never downloaded
+DASHBOARD_HOURLY = hourly_variables("current", "advice", "charts", "event")
+
+@st.cache_resource(show_spinner=False, max_entries=512)
+def hourly_lookup(key: Tuple, fetched_at: float, _hdf: pd.DataFrame) -> HourlyLookup:
+    """Time-indexed view of the hourly frame for the event checker, built once per data version."""
+    return HourlyLookup(_hdf)
+
+@st.cache_resource(show_spinner=False, max_entries=256)
+def hourly_figures(
+    key: Tuple, fetched_at: float, imperial: bool, hours: int,
+    _hdf: pd.DataFrame, _ddf: pd.DataFrame, _detail: pd.DataFrame,
+) -> List[Any]:
+    """Hourly subplots and daily-range chart, built once per (request, data version, units, horizon).
+
+    Shared across sessions and reruns; treat the figures as read-only.
+    """
+    import charts  # Plotly figure code loads with the first chart panel, not at startup
+    return [charts.hourly_figure(_hdf, imperial, hours, detail=_detail), charts.daily_figure(_ddf, imperial)]
+
+@st.cache_resource(show_spinner=False, max_entries=256)
+def history_frame(cell: str, key: Tuple, fetched_at: float, _ddf: pd.DataFrame) -> pd.DataFrame:
+    """Outlook days against the archived normals and last year, once per forecast version; read-only."""
+    return history_comparison(cell, _ddf.iloc[:7])
+
+@st.cache_resource(show_spinner=False, max_entries=256)
+def air_quality_figures(key: Tuple, fetched_at: float, _aqdf: pd.DataFrame) -> List[Any]:
+    """PM and AQI subplots, built once per (location, data version); read-only."""
+    import charts
+    return [charts.air_quality_figure(_aqdf)]
+
+def debug_panel() -> None:
+    """Sidebar expander with the process-wide timings, counters and grid-cell hit rate."""
+    if not (DEBUG_PANEL or st.query_params.get("debug") == "1"):
+        return
+    stats = perf.RECORDER.summary()
+    with st.sidebar.expander("🛠 Debug metrics"):
+        st.caption("Whole process since start; percentiles over recent samples.")
+        st.metric("Grid-cell cache hit rate", f"{cell_stats().hit_rate():.0%}")
+        scheduler = upstream_scheduler()
+        if scheduler is not None:
+            st.caption("Waiting for upstream budget: " + " · ".join(f"{k} {v}" for k, v in scheduler.queued().items()))
+        if stats["timings"]:
+            spans = pd.DataFrame.from_dict(stats["timings"], orient="index")
+            spans[["total", "p50", "p95", "max"]] *= 1000
+            st.dataframe(
+                spans.rename(columns={"total": "total ms", "p50": "p50 ms", "p95": "p95 ms", "max": "max ms"}).round(1),
+                use_container_width=True,
+            )
+        if stats["counters"]:
+            st.dataframe(
+                pd.Series(stats["counters"], name="count").rename_axis("counter").reset_index(),
+                use_container_width=True, hide_index=True,
+            )
+
+def format_span(start: pd.Timestamp, end: pd.Timestamp, now: pd.Timestamp) -> str:
+    """Compact label for an advice span, e.g. 'today 14:00–18:00' or 'Thu 23:00–Fri 08:00'."""
+    def day(ts: pd.Timestamp) -> str:
+        return "today" if ts.normalize() == now.normalize() else ts.strftime("%a")
+    last = end - pd.Timedelta(minutes=1)
+    if start.normalize() == last.normalize():
+        return f"{day(start)} {start:%H:%M}–{end:%H:%M}"
+    return f"{day(start)} {start:%H:%M}–{day(end)} {end:%H:%M}"
+
+def format_age(seconds: float) -> str:
+    """Short human description of a data age, e.g. 'just now', '4 min ago'."""
+    if seconds < 60:
+        return "just now"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} min ago"
+    return f"{int(seconds // 3600)} h ago"
 
 # -----------------------------
 # UX: Sidebar controls
 # -----------------------------
+sections = perf.SectionTimer()
+sections.start("sidebar")
 with st.sidebar:
     st.subheader("🔎 Location & Settings")
-    q = st.text_input("Search a place", value="Karachi")
+    watchlist_mode = st.radio("View", ["Single place", "Watchlist"], horizontal=True, key="view_mode") == "Watchlist"
+    if watchlist_mode:
+        watch_text = st.text_area(
+            "Places", value=DEFAULT_WATCHLIST, height=200, help="One per line: a place name, or lat, lon[, label]"
+        )
+    q = "" if watchlist_mode else st.text_input("Search a place", value="Karachi")
     if q:
-        results = geocode_place(q)
+        with perf.span("geocode_place"):
+            # geocode() tries the local index first; only misses reach the remote API
+            results = geocode_place(q)
         if results.empty:
             st.warning("No locations found. Try a different name.")
             st.stop()
@@ -339,438 +229,356 @@ with st.sidebar:
         with st.container():
             st.map(pd.DataFrame({"lat": [lat], "lon": [lon]}), use_container_width=True, height=180)
 
-    st.markdown("<hr style='margin:1rem 0 0.5rem 0;border:0;border-top:1px solid #e5e7eb;'>", unsafe_allow_html=True)
+    st.markdown(assets.RULE, unsafe_allow_html=True)
     st.subheader("🎒 Wardrobe & Health")
-    user_pref = st.multiselect(
-        "Preferences",
-        ["Hate rain", "Sensitive to cold", "Allergy-prone", "Runner", "Cyclist", "Carry laptop"],
-    )
+    user_pref = st.multiselect("Preferences", PREFERENCES)
     st.divider()
     units = st.radio("Units", ["Metric (°C, m/s)", "Imperial (°F, mph)"])
-    show_hourly = st.checkbox("Show hourly charts", value=True)
-    show_daily = st.checkbox("Show 7‑day outlook", value=True)
+    imperial = units.startswith("Imperial")
+    if not watchlist_mode:
+        forecast_days = st.select_slider("Forecast days", FORECAST_DAY_CHOICES, value=DEFAULT_FORECAST_DAYS)
+        detail_15 = st.checkbox("15-minute detail", value=False, help="Finer temperature and wind lines in the charts")
+        show_daily = st.checkbox("Show 7‑day outlook", value=True)
+        # Wall displays: only the "now" blocks refresh on the timer; charts redraw when new data lands
+        live = st.checkbox("Live mode", value=False, help="Keep current conditions and AQI fresh without reloading")
+        live_every = LIVE_INTERVALS[st.select_slider("Refresh every", list(LIVE_INTERVALS), value="1 min", disabled=not live)]
     show_air = st.checkbox("Show air quality panel", value=True)
+    if not watchlist_mode:
+        # The first view of a place downloads its history into the local archive (needs pyarrow)
+        show_history = st.checkbox(
+            "Compare with past years", value=False, help="Normals and last year's values next to the outlook"
+        )
 
     
 
+# -----------------------------
+# Watchlist: many places in one grid
+# -----------------------------
+# All places share chunked multi-coordinate requests instead of one session and request each
+@st.cache_data(show_spinner=False, ttl=GEOCODE_TTL_S)
+def watchlist_places(text: str) -> pd.DataFrame:
+    """Watchlist lines resolved to coordinates with the cached geocoder (local index first)."""
+    return resolve_watchlist(text, lambda name: geocode_place(name, 1))
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def watchlist_view(
+    versions: Tuple, prefs: Tuple[str, ...], _forecasts: List[Any], _airs: List[Any], _errors: List[Any]
+) -> Tuple[pd.DataFrame, List[Tuple[str, pd.DataFrame]]]:
+    """Comparison rows (metric units) and hourly frames per place, once per data version; read-only."""
+    rows, frames = [], []
+    for (name, key, fetched_at, aq_key, aq_fetched_at), fc, aq, error in zip(versions, _forecasts, _airs, _errors):
+        if fc is None:
+            rows.append({"Place": name, "Now": f"⚠️ {error or 'no data'}"})
+            continue
+        hdf, ddf = forecast_frames(key, fetched_at, fc)
+        aqdf = air_quality_frame(aq_key, aq_fetched_at, aq) if aq else None
+        masks = advice_masks(key, fetched_at, aq_fetched_at if aq else None, hdf, ddf, aqdf)
+        summary = forecast_summary(fc, aq, prefs, frames=(hdf, ddf, aqdf), masks=masks)
+        rain_at = summary["rain_start"]
+        rows.append({
+            "Place": name,
+            "Now": " ".join(get_weather_icon(summary["weathercode"])) if summary["weathercode"] is not None else "—",
+            "temp": summary["temperature"],
+            "t_max": summary["temp_max"],
+            "t_min": summary["temp_min"],
+            "wind": summary["windspeed"],
+            "Rain chance (%)": summary["pop_max"],
+            "Rain (mm)": summary["precip_sum"],
+            "Rain from": f"{pd.Timestamp(rain_at):%a %H:%M}" if rain_at else "—",
+            "AQI": summary["aqi"],
+            "Advice": "".join(tip.split(" ")[0] for tip in summary["advice"]),
+        })
+        frames.append((name, hdf))
+    return pd.DataFrame(rows), frames
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def watchlist_figure(versions: Tuple, column: str, imperial: bool, _frames: List[Tuple[str, pd.DataFrame]]) -> Any:
+    """Small multiples for the watchlist, once per (data version, metric, units); read-only."""
+    import charts
+    return charts.small_multiples(_frames, column, imperial)
+
+def watchlist_dashboard(text: str, prefs: List[str], imperial: bool, with_air: bool) -> None:
+    places = watchlist_places(text)
+    skipped = places[places["error"].notna()]
+    places = places[places["error"].isna()].reset_index(drop=True)
+    if not skipped.empty:
+        st.warning("Skipped: " + "; ".join(f"{n} ({e})" for n, e in zip(skipped["name"], skipped["error"])))
+    if len(places) > WATCHLIST_MAX:
+        st.warning(f"Showing the first {WATCHLIST_MAX} of {len(places)} places.")
+        places = places.iloc[:WATCHLIST_MAX]
+    if places.empty:
+        st.info("Add places to the watchlist in the sidebar, one per line.")
+        return
+    fc_coords = [snap_to_grid(lat, lon, FORECAST_GRID_DEG) for lat, lon in zip(places["lat"], places["lon"])]
+    aq_coords = [snap_to_grid(lat, lon, AIR_QUALITY_GRID_DEG) for lat, lon in zip(places["lat"], places["lon"])]
+    with st.spinner(f"Fetching {len(places)} forecasts…"):
+        forecasts, airs, errors = fetch_watchlist(fc_coords, aq_coords if with_air else None)
+    versions = tuple(
+        (name, (*fc_coord, WATCHLIST_TZ, "summary"), fc.get("_fetched_at", 0.0) if fc else None,
+         (*aq_coord, WATCHLIST_TZ), aq.get("_fetched_at", 0.0) if aq else None)
+        for name, fc_coord, aq_coord, fc, aq in zip(places["name"], fc_coords, aq_coords, forecasts, airs)
+    )
+    grid, frames = watchlist_view(versions, tuple(sorted(prefs)), forecasts, airs, errors)
+
+    temp_unit, wind_unit = unit_labels(imperial)
+    st.markdown(assets.title(f"📋 Watchlist · {len(places)} places"), unsafe_allow_html=True)
+    fetched = [v[2] for v in versions if v[2]]
+    if fetched:
+        st.caption(f"Forecasts updated {format_age(time.time() - min(fetched))} · next 48 h, local time at each place")
+    st.dataframe(
+        display_units(grid, imperial).round(1).rename(columns={
+            "temp": f"Now ({temp_unit})", "t_max": f"High ({temp_unit})", "t_min": f"Low ({temp_unit})",
+            "wind": f"Wind ({wind_unit})",
+        }),
+        hide_index=True, use_container_width=True,
+    )
+    if frames:
+        label = st.selectbox("Compare", list(WATCHLIST_METRICS), key="watch_metric")
+        unit = {"temp": temp_unit, "gust": wind_unit}.get(WATCHLIST_METRICS[label], "%")
+        st.caption(f"{label} ({unit}), next 48 h")
+        st.plotly_chart(
+            watchlist_figure(versions, WATCHLIST_METRICS[label], imperial, frames), use_container_width=True
+        )
+
+if watchlist_mode:
+    sections.start("watchlist")
+    watchlist_dashboard(watch_text, user_pref, imperial, show_air)
+    sections.finish()
+    debug_panel()
+    st.stop()
+
 # -----------------------------
 # Fetch data
 # -----------------------------
+sections.start("fetch")
+fc_lat, fc_lon = snap_to_grid(lat, lon, FORECAST_GRID_DEG)
+cell_stats().record_lookup(grid_cell(fc_lat, fc_lon, FORECAST_GRID_DEG))
+minutely_15 = FORECAST_MINUTELY_15 if detail_15 else ()
+fetch_jobs = {"forecast": (fetch_forecast, (fc_lat, fc_lon, tz, DASHBOARD_HOURLY, forecast_days, minutely_15))}
+if show_air:
+    aq_lat, aq_lon = snap_to_grid(lat, lon, AIR_QUALITY_GRID_DEG)
+    cell_stats().record_lookup(grid_cell(aq_lat, aq_lon, AIR_QUALITY_GRID_DEG))
+    fetch_jobs["air_quality"] = (fetch_air_quality, (aq_lat, aq_lon, tz))
+if show_history:
+    fetch_jobs["history"] = (fetch_history, snap_to_grid(lat, lon, ARCHIVE_GRID_DEG))
+# Popularity for the background prefetcher: one view per selection in a session, not per rerun
+viewed = (fc_lat, fc_lon, tz, forecast_days, detail_15, show_air)
+if st.session_state.get("prefetch_viewed") != viewed:
+    st.session_state["prefetch_viewed"] = viewed
+    record_forecast_view(*fetch_jobs["forecast"][1])
+    if show_air:
+        record_air_quality_view(*fetch_jobs["air_quality"][1])
+
 with st.spinner("Fetching forecast…"):
-    fc = fetch_forecast(lat, lon, tz)
-    aq = fetch_air_quality(lat, lon, tz) if show_air else None
+    fetched, fetch_errors = fetch_concurrently(fetch_jobs)
+
+if "forecast" not in fetched:
+    st.error(f"Could not load the forecast: {fetch_errors.get('forecast', 'unknown error')}")
+    st.stop()
+fc = fetched["forecast"]
+aq = fetched.get("air_quality")
+if show_air and aq is None:
+    st.warning(f"Air quality is unavailable right now: {fetch_errors.get('air_quality', 'unknown error')}")
 
 # -----------------------------
 # Parse & present current conditions
 # -----------------------------
+sections.start("parse")
 current = fc.get("current_weather", {})
-hourly = fc.get("hourly", {})
-daily = fc.get("daily", {})
-
+# Frames and figures are cached per request, so the horizon and detail settings are part of the key
+fc_key = (fc_lat, fc_lon, tz, forecast_days, detail_15)
+hdf, ddf = forecast_frames(fc_key, fc.get("_fetched_at", 0.0), fc)
+detail = minutely_frame(fc_key, fc.get("_fetched_at", 0.0), fc)
+aqdf = air_quality_frame((aq_lat, aq_lon, tz), aq.get("_fetched_at", 0.0), aq) if aq else None
+masks = advice_masks(
+    fc_key, fc.get("_fetched_at", 0.0), aq.get("_fetched_at") if aq and show_air else None,
+    hdf, ddf, aqdf if show_air else None,
+)
+
+sections.start("current")
 # Enhanced current weather display with city name and icons
 city_display = f"{sel['name']}"
 if sel.get('admin1'):
     city_display += f", {sel['admin1']}"
 if sel.get('country'):
     city_display += f", {sel['country']}"
-# Reduce margin above and below city name
-st.markdown(f"<div style='font-size:1.35rem;font-weight:700;margin-bottom:0.2em;margin-top:0.2em'>{city_display}</div>", unsafe_allow_html=True)
-
-code = current.get('weathercode', 0)
-icon, description = get_weather_icon(code)
-temp = current.get('temperature', '—')
-temp_str = f"{temp}°C" if units.startswith("Metric") else f"{temp * 9/5 + 32:.1f}°F"
-wind_speed = current.get('windspeed', '—')
-wind_str = f"{wind_speed} km/h" if units.startswith("Metric") else f"{wind_speed * 0.621371:.1f} mph"
-
-# Modern minimal CSS for cards and metrics (no gradients, no full-body backgrounds)
-st.markdown("""
-<style>
-/* Card container used for small panels */
-.panel {
-  background: #ffffff;
-  border: 1px solid #e6e7eb;
-  padding: 0.8rem;
-  border-radius: 6px;
-  box-shadow: 0 1px 2px rgba(16,24,40,0.03);
-}
-
-/* Make Streamlit metrics use subtle square corners and consistent sizing */
-div[data-testid="stMetric"] {
-  border-radius: 4px !important;
-  padding: 0.45rem 0.6rem !important;
-  background: #ffffff !important;
-  border: 1px solid #e6e7eb !important;
-  box-shadow: none !important;
-  display: flex !important;
-  align-items: center !important;
-  justify-content: space-between !important;
-  gap: 0.6rem !important;
-  color: #0f172a !important;
-}
-
-/* Label on the left, value on the right */
-div[data-testid="stMetricLabel"] {
-  font-size: 0.95rem !important;
-  color: #6b7280 !important;
-  text-align: left !important;
-  flex: 1 1 auto !important;
-  margin-right: 0.6rem !important;
-}
-
-div[data-testid="stMetricValue"] {
-  font-size: 1.3rem !important;
-  font-weight: 700 !important;
-  color: #0f172a !important;
-  text-align: right !important;
-  min-width: 4.5ch !important;
-}
-
-/* Ensure metrics inside small right column stack nicely */
-.panel > div[data-testid="stMetric"] {
-  margin-bottom: 0.5rem !important;
-}
-
-/* Row helper when showing multiple metrics directly under a panel */
-.panel .metric-row { display:flex; gap:0.6rem; margin-top:0.6rem; }
-.panel .metric-row > div { flex:1; }
-
-/* Prominent temperature display (no pill) */
-.temp-large { font-size: 3rem; font-weight: 800; color: #0f172a; }
-
-/* Small badge for weather description (subtle, not full pill for all items) */
-.weather-badge { display:inline-block; background:#eef2ff; color:#3730a3; padding:0.28rem 0.6rem; border-radius:6px; font-weight:600; margin-top:0.5rem; }
-
-/* Dark mode adjustments */
-[data-theme="dark"] .panel {
-  background: #071122 !important;
-  border-color: #203040 !important;
-}
-[data-theme="dark"] div[data-testid="stMetric"] {
-  background: #08131b !important;
-  border-color: #1f2a34 !important;
-  color: #e6eef8 !important;
-}
-[data-theme="dark"] div[data-testid="stMetricValue"] {
-  color: #e6eef8 !important;
-}
-[data-theme="dark"] div[data-testid="stMetricLabel"] {
-  color: #93a0b8 !important;
-}
-[data-theme="dark"] .weather-badge { background:#0f1724 !important; color:#bfdbfe !important; }
-[data-theme="dark"] .temp-large { color: #e6eef8 !important; }
-
-@media (max-width: 640px) {
-  div[data-testid="stMetric"] {
-    flex-direction: column !important;
-    align-items: flex-start !important;
-  }
-  div[data-testid="stMetricValue"] { text-align: left !important; }
-  .temp-large { font-size: 2.2rem; }
-}
-</style>
-""", unsafe_allow_html=True)
-
-# Layout: left shows temp & description, metrics moved below it; right kept for future small widgets
-with st.container():
-    # Use a single column to make the panel and metrics fit the body width with margins
-    st.markdown(
-        """
-        <div style="max-width: 90rem; margin: 1.5rem auto 1.2rem auto;">
-            <div class="panel" style="margin-bottom:1.2rem;">
-              <div style="display:flex;align-items:center;gap:1rem">
-                <div style="font-size:3.8rem">{icon}</div>
-                <div>
-                  <div class="temp-large">{temp_str}</div>
-                  <div class="weather-badge">{description}</div>
-                </div>
-              </div>
-              <!-- metrics row placed under the temperature display -->
-              <div style="margin-top:0.75rem"></div>
-            </div>
-        """.format(icon=icon, temp_str=temp_str, description=description),
-        unsafe_allow_html=True
+st.markdown(assets.title(city_display), unsafe_allow_html=True)
+# Layout: left shows temp & description, metrics moved below it
+@st.fragment(run_every=live_every if live else None)
+def current_conditions(
+    key: Tuple, fetched_at: float, aq_fetched_at: Any, imperial: bool, fc: Dict[str, Any], hdf: pd.DataFrame,
+    live_jobs: Dict[str, Tuple],
+) -> None:
+    """Now-block: report, age and the hourly values at the current time.
+
+    In live mode this fragment alone reruns on the timer. Each tick only reads the response
+    cache (expired entries refresh in the background, nothing is fetched while it waits);
+    when it holds newer data the whole page reruns once so charts and tables follow,
+    otherwise just this block (and none of the figures) is sent again.
+    """
+    if live_jobs:
+        cached = {name: fn(*args, cached_only=True) for name, (fn, args) in live_jobs.items()}
+        latest = {name: data["_fetched_at"] for name, data in cached.items() if data is not None}
+        if latest.get("forecast", fetched_at) != fetched_at or latest.get("air_quality", aq_fetched_at) != aq_fetched_at:
+            st.rerun()
+    current = fc.get("current_weather", {})
+    fc_age = time.time() - (fetched_at or time.time())
+    st.caption(
+        f"Forecast updated {format_age(fc_age)}"
+        + (" · refreshing in the background" if fc_age >= FORECAST_TTL_S else "")
+        + (" · live" if live_jobs else "")
     )
+    code = current.get('weathercode', 0)
+    icon, description = get_weather_icon(code)
+    temp = current.get('temperature', '—')
+    temp_str = f"{temp}°C" if not imperial else f"{temp * 9/5 + 32:.1f}°F"
+    wind_speed = current.get('windspeed', '—')
+    wind_str = f"{wind_speed} km/h" if not imperial else f"{wind_speed * 0.621371:.1f} mph"
+    humidity = row_at(hdf, local_now(fc))["humidity"] if not hdf.empty else np.nan
+
+    with st.container():
+        st.markdown(assets.current_card(icon, temp_str, description), unsafe_allow_html=True)
+        # Metrics as a row under the temperature panel
+        mcols = st.columns(3)
+        with mcols[0]:
+            st.metric("💨 Wind", wind_str, border=True)
+        with mcols[1]:
+            st.metric("🧭 Wind Dir", f"{current.get('winddirection', '—')}°", border=True)
+        with mcols[2]:
+            st.metric("💧 Humidity", f"{humidity:.0f}%" if not np.isnan(humidity) else "—", border=True)
+
+live_jobs = {name: fetch_jobs[name] for name in ("forecast", "air_quality") if name in fetch_jobs} if live else {}
+current_conditions(
+    fc_key, fc.get("_fetched_at", 0.0), aq.get("_fetched_at") if aq else None, imperial, fc, hdf, live_jobs,
+)
 
-    # Metrics displayed as a row under the temperature panel, also centered and max-width
-    mcols = st.columns(3)
-    with mcols[0]:
-        st.metric("💨 Wind", wind_str, border=True)
-    with mcols[1]:
-        st.metric("🧭 Wind Dir", f"{current.get('winddirection', '—')}°", border=True)
-    with mcols[2]:
-        humidity = hourly.get("relative_humidity_2m", [None])[0]
-        st.metric("💧 Humidity", f"{humidity}%" if humidity is not None else "—", border=True)
-
-    st.markdown("</div>", unsafe_allow_html=True)
-
-    # Reserved for compact widgets / small forecasts — currently empty to keep layout clean
-    # (No right column, everything is centered and fits the body)
-    # -----------------------------
+# -----------------------------
 # 7-day outlook
 # -----------------------------
-if show_daily and daily:
+sections.start("daily")
+if show_daily and not ddf.empty:
     st.subheader("🗓️ 7‑Day Outlook")
-    st.markdown('<div class="weather-card">', unsafe_allow_html=True)
-    
-    daily_cols = st.columns(7)
-    dates = pd.to_datetime(daily.get("time", []))
-    t_max = daily.get("temperature_2m_max", [])
-    t_min = daily.get("temperature_2m_min", [])
-    codes = daily.get("weathercode", [])
-    
-    for i, (date, tmax, tmin, code) in enumerate(zip(dates, t_max, t_min, codes)):
-        icon, desc = get_weather_icon(code)
-        with daily_cols[i]:
-            st.markdown(f"""
-                <div style='text-align: center'>
-                    <div style='color: #666'>{date.strftime('%a')}</div>
-                    <div style='font-size: 2rem'>{icon}</div>
-                    <div style='color: {temp_color(tmax)}'>{tmax:.1f}°</div>
-                    <div style='color: #666'>{tmin:.1f}°</div>
-                </div>
-            """, unsafe_allow_html=True)
-    
-    st.markdown('</div>', unsafe_allow_html=True)
-
-
+    week = ddf.iloc[:7]
+    day_advice = masks.by_day(user_pref)
+    # All seven tiles are one element laid out by the stylesheet's grid
+    st.markdown(assets.day_tiles(
+        (f"{date:%a}", get_weather_icon(int(code))[0], tmax, tmin, day_advice.get(date, []))
+        for date, tmax, tmin, code in zip(week.index, week["t_max"], week["t_min"], week["weathercode"])
+    ), unsafe_allow_html=True)
+
+    if show_history:
+        history_cell = fetched.get("history")
+        history_error = fetch_errors.get("history", "")
+        if history_cell is None and history_error.startswith("timed out"):
+            st.info("Building the local history archive for this place; the comparison appears on the next refresh.")
+        elif history_cell is None:
+            st.warning(f"History is unavailable right now: {history_error or 'no archive'}")
+        else:
+            comparison = history_frame(history_cell, fc_key, fc.get("_fetched_at", 0.0), ddf)
+            if not comparison.empty:
+                shown = comparison.astype(np.float64)
+                shown = (shown * 9 / 5 + 32 if imperial else shown).round(1)
+                temp_unit, _ = unit_labels(imperial)
+                verdict = np.select(
+                    [comparison["t_max"] > comparison["t_max_p90"], comparison["t_max"] < comparison["t_max_p10"]],
+                    ["🔺 unusually warm", "🔻 unusually cool"], default="",
+                )
+                st.dataframe(
+                    pd.DataFrame({
+                        "Day": comparison.index.strftime("%a %d %b"),
+                        f"High ({temp_unit})": shown["t_max"],
+                        "Normal high": shown["t_max_p50"],
+                        "Usual range": [f"{lo:.0f}–{hi:.0f}" for lo, hi in zip(shown["t_max_p10"], shown["t_max_p90"])],
+                        "Last year high": shown["last_t_max"],
+                        f"Low ({temp_unit})": shown["t_min"],
+                        "Normal low": shown["t_min_p50"],
+                        "Last year low": shown["last_t_min"],
+                        "": verdict,
+                    }),
+                    hide_index=True, use_container_width=True,
+                )
+                st.caption(
+                    f"Normals are the median of {comparison.attrs.get('years', 0)} years of history within "
+                    f"±{DEFAULT_WINDOW_DAYS // 2} days of each date; the usual range spans the 10th–90th percentile."
+                )
 
 # -----------------------------
 # Wardrobe & Health — compact, modern, mobile-inspired
 # -----------------------------
-st.markdown("<div style='font-size:1.25rem;font-weight:700;margin-bottom:0.2em;margin-top:0.5em;'>🧭 Wardrobe & Health</div>", unsafe_allow_html=True)
-now_temp = current.get("temperature")
-now_wind = current.get("windspeed")
-advice_bits: List[str] = []
-
-if now_temp is not None:
-    t = float(now_temp)
-    if units.startswith("Imperial"):
-        t = t * 9/5 + 32
-    if (units.startswith("Metric") and t < 12) or (units.startswith("Imperial") and t < 54):
-        advice_bits.append("🧥 Warm layer")
-    elif (units.startswith("Metric") and t > 30) or (units.startswith("Imperial") and t > 86):
-        advice_bits.append("🧢 Light & breathable; hydrate")
-    else:
-        advice_bits.append("👕 Light jacket or tee")
-
-if now_wind is not None and float(now_wind) >= 30:
-    advice_bits.append("💨 Windbreaker suggested")
-
-if hourly:
-    next_pop = hourly.get("precipitation_probability", [0])[0] or 0
-    if next_pop >= 50 or (hourly.get("precipitation", [0])[0] or 0) > 0.1:
-        advice_bits.append("🌂 Umbrella/waterproofs")
-        if "Hate rain" in user_pref:
-            advice_bits.append("⏰ Leave early to dodge showers")
-
-if show_air and aq:
-    ah = aq.get("hourly", {})
-    if ah and ah.get("us_aqi"):
-        aqi_now = ah.get("us_aqi")[0]
-        if aqi_now is not None and not np.isnan(aqi_now):
-            if aqi_now > 100 and "Runner" in user_pref:
-                advice_bits.append("🏃‍♂️ Indoor workout (AQI)")
-            if aqi_now > 150 and "Allergy-prone" in user_pref:
-                advice_bits.append("😷 Mask outdoors (AQI)")
-
-if daily:
-    uvi_max = daily.get("uv_index_max", [0])[0]
-    if uvi_max and uvi_max >= 6:
-        advice_bits.append("🧴 High UV: SPF30+, sunglasses, hat")
-
-if "Carry laptop" in user_pref and hourly:
-    if (hourly.get("precipitation_probability", [0])[0] or 0) >= 30:
-        advice_bits.append("💻 Rain cover for bag")
+sections.start("advice")
+st.markdown(assets.title("🧭 Wardrobe & Health", "section-title"), unsafe_allow_html=True)
+advice_bits = wardrobe_advice(current, hdf, ddf, aqdf if show_air else None, user_pref, masks=masks)
 
 if advice_bits:
-    st.markdown(
-        "<div style='display:flex;flex-wrap:wrap;gap:0.5em 1em;margin-bottom:1em;'>"
-        + "".join(f"<span style='background:#f1f5f9;border-radius:1em;padding:0.3em 0.9em;font-size:1.05rem;font-weight:500;'>{bit}</span>" for bit in dict.fromkeys(advice_bits))
-        + "</div>", unsafe_allow_html=True)
+    st.markdown(assets.chips(advice_bits), unsafe_allow_html=True)
 else:
-    st.markdown("<span style='color:#22c55e;font-size:1.1rem;font-weight:600;'>You're good to go! ✨</span>", unsafe_allow_html=True)
+    st.markdown(assets.ALL_CLEAR, unsafe_allow_html=True)
+
+# What changes over the next 48 h, one line per advice: "🌂 Umbrella/waterproofs — today 14:00–18:00"
+now_ts = pd.Timestamp(current["time"]) if current.get("time") else (hdf.index[0] if not hdf.empty else None)
+if now_ts is not None:
+    upcoming: Dict[str, List[str]] = {}
+    spans = masks.spans(user_pref, now_ts, 48)
+    for advice, start, end in zip(spans["advice"], spans["start"], spans["end"]):
+        if start > now_ts:
+            upcoming.setdefault(advice, []).append(format_span(start, end, now_ts))
+    if upcoming:
+        st.caption("Coming up  \n" + "  \n".join(f"{advice} — {', '.join(when)}" for advice, when in upcoming.items()))
 
 # -----------------------------
 # Hourly charts & rain start detector
 # -----------------------------
-if show_hourly and hourly:
-    ht = pd.to_datetime(hourly.get("time", []))
-    hdf = pd.DataFrame({
-        "time": ht,
-        "temp": hourly.get("temperature_2m", []),
-        "apparent": hourly.get("apparent_temperature", []),
-        "precip": hourly.get("precipitation", []),
-        "pop": hourly.get("precipitation_probability", []),
-        "wind": hourly.get("windspeed_10m", []),
-        "gust": hourly.get("windgusts_10m", []),
-        "uv": hourly.get("uv_index", []),
-        "cloud": hourly.get("cloud_cover", []),
-        "weathercode": hourly.get("weathercode", []),
-    }).set_index("time")
-
-    st.subheader("📈 Next 48 hours")
-    subdf = hdf.iloc[:48]
+sections.start("hourly")
+# The panel is a fragment: its own toggle reruns only this panel, not the whole page
+@st.fragment
+def hourly_panel(
+    key: Tuple, fetched_at: float, imperial: bool, hdf: pd.DataFrame, ddf: pd.DataFrame, detail: pd.DataFrame
+) -> None:
+    span_h = (hdf.index[-1] - hdf.index[0]) / pd.Timedelta(hours=1) + 1
+    available = {label: h for label, h in HORIZONS.items() if h <= max(span_h, 48)}
+    title_col, horizon_col, toggle_col = st.columns([4, 1, 1], vertical_alignment="bottom")
+    label = horizon_col.selectbox("Horizon", list(available), key="hourly_horizon")
+    hours = available[label]
+    title_col.subheader(f"📈 Next {label}")
+    if not toggle_col.toggle("Show charts", value=True, key="show_hourly"):
+        return
 
     # Rain start/stop detector with enhanced styling
-    rain_mask = (subdf["precip"] > 0.05) | (subdf["pop"] >= 50)
-    if rain_mask.any():
-        first_rain_time = rain_mask.idxmax()
-        rain_time_str = first_rain_time.strftime('%I:%M %p')
-        st.markdown(
-            f"""
-            <div style="
-            display: flex;
-            align-items: center;
-            background: #FEF9C3;
-            border: 1px solid #FBBF24;
-            border-radius: 4px;
-            padding: 1rem 1.2rem;
-            margin-bottom: 0.5rem;
-            gap: 1rem;
-            ">
-            <div style="font-size:2.2rem;line-height:1">🌧️</div>
-            <div>
-                <div style="font-size:1.1rem;font-weight:700;color:#92400e;">Rain Expected</div>
-                <div style="font-size:1rem;color:#92400e;">
-                Rain likely starting at {rain_time_str}.
-                </div>
-            </div>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
+    first_rain_time = first_rain(hdf, hours)
+    if first_rain_time is not None:
+        st.markdown(assets.rain_banner(first_rain_time.strftime('%I:%M %p')), unsafe_allow_html=True)
     else:
-        st.markdown(
-            f"""
-            <div style="
-            display: flex;
-            align-items: center;
-            background: #F0FDF4;
-            border: 1px solid #22C55E;
-            border-radius: 4px;
-            padding: 1rem 1.2rem;
-            margin-bottom: 0.5rem;
-            gap: 1rem;
-            ">
-            <div style="font-size:2.2rem;line-height:1">☀️</div>
-            <div>
-                <div style="font-size:1.1rem;font-weight:700;color:#166534;">Clear Weather</div>
-                <div style="font-size:1rem;color:#334155;">
-                No significant rain expected in the next 48 hours.
-                </div>
-            </div>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
-
-    # Enhanced temperature chart with custom colors
-    fig1 = px.line(subdf.reset_index(), x="time", y=["temp", "apparent"],
-                   title="Temperature vs Feels-like",
-                   labels={"temp": "Temperature", "apparent": "Feels like"},
-                   color_discrete_map={"temp": "#F87171", "apparent": "#60A5FA"})
-    fig1.update_layout(hovermode="x unified")
-    st.plotly_chart(fig1, use_container_width=True)
-
-    # Enhanced precipitation chart
-    fig2 = px.bar(subdf.reset_index(), x="time", y="pop",
-                  title="Precipitation Probability (%)",
-                  color_discrete_sequence=["#60A5FA"])
-    st.plotly_chart(fig2, use_container_width=True)
-
-    # Enhanced wind chart
-    fig3 = px.line(subdf.reset_index(), x="time", y=["wind", "gust"],
-                   title="Wind & Gusts",
-                   labels={"wind": "Wind Speed", "gust": "Wind Gusts"},
-                   color_discrete_map={"wind": "#34D399", "gust": "#F87171"})
-    st.plotly_chart(fig3, use_container_width=True)
+        st.markdown(assets.clear_banner(label), unsafe_allow_html=True)
 
-    
+    for fig in hourly_figures(key, fetched_at, imperial, hours, hdf, ddf, detail):
+        st.plotly_chart(fig, use_container_width=True)
 
-
-    # Daily temperature range chart
-    # Build daily DataFrame safely: ensure all arrays are same length by trimming to the shortest series
-    def _as_list(x):
-        # Convert pandas Index/Series to plain list
-        if x is None:
-            return []
-        try:
-            return list(x)
-        except Exception:
-            return [x]
-    
-    series_map = {
-        "date": _as_list(dates),
-        "t_max": _as_list(t_max),
-        "t_min": _as_list(t_min),
-        "uv_max": _as_list(daily.get("uv_index_max", [])),
-        "precip_sum": _as_list(daily.get("precipitation_sum", [])),
-        "precip_hours": _as_list(daily.get("precipitation_hours", [])),
-        "wind_max": _as_list(daily.get("windspeed_10m_max", [])),
-    }
-    
-    # Determine minimum length and trim all series to that length
-    lengths = {k: len(v) for k, v in series_map.items()}
-    min_len = min(lengths.values()) if lengths else 0
-    
-    if min_len == 0:
-        # No valid data — create empty DataFrame with the expected columns
-        ddf = pd.DataFrame(columns=["date", "t_max", "t_min", "uv_max", "precip_sum", "precip_hours", "wind_max"])
-    else:
-        trimmed = {k: (pd.to_datetime(series_map[k][:min_len]) if k == "date" else series_map[k][:min_len]) for k in series_map}
-        ddf = pd.DataFrame({
-            "date": trimmed["date"],
-            "t_max": trimmed["t_max"],
-            "t_min": trimmed["t_min"],
-            "uv_max": trimmed["uv_max"],
-            "precip_sum": trimmed["precip_sum"],
-            "precip_hours": trimmed["precip_hours"],
-            "wind_max": trimmed["wind_max"],
-        })
-
-    figd = px.bar(ddf, x="date", y=["t_max", "t_min"],
-                  barmode="group",
-                  title="Daily Temperature Range",
-                  labels={"t_max": "High", "t_min": "Low", "date": "Date"},
-                  color_discrete_map={"t_max": "#F87171", "t_min": "#60A5FA"})
-    st.plotly_chart(figd, use_container_width=True)
+if not hdf.empty:
+    hourly_panel(fc_key, fc.get("_fetched_at", 0.0), imperial, hdf, ddf, detail)
 
 # -----------------------------
 # Air Quality Panel
 # -----------------------------
-if show_air and aq:
+sections.start("air_quality")
+# Live mode reruns only this reading on the timer; the figures below wait for new data
+@st.fragment(run_every=live_every if live else None)
+def air_quality_now(fc: Dict[str, Any], aqdf: pd.DataFrame) -> None:
+    """US AQI for the hour containing the location's current time."""
+    latest = row_at(aqdf, local_now(fc))
+    aqi_val = latest["aqi"]
+    if not np.isnan(aqi_val):
+        source = "" if not np.isnan(latest["us_aqi"]) else ", computed"
+        st.metric(f"US AQI (now{source})", f"{round(aqi_val)} — {latest['category']}")
+        pollutant = f" Main pollutant: {latest['dominant']}." if pd.notna(latest["dominant"]) else ""
+        st.caption(f"{aqi_advice(aqi_val)}{pollutant}")
+
+if show_air and aqdf is not None:
     st.subheader("🫁 Air Quality")
-    ah = aq.get("hourly", {})
-    if ah:
-        aqdf = pd.DataFrame({
-            "time": pd.to_datetime(ah.get("time", [])),
-            "pm2_5": ah.get("pm2_5", []),
-            "pm10": ah.get("pm10", []),
-            "o3": ah.get("ozone", []),
-            "no2": ah.get("nitrogen_dioxide", []),
-            "so2": ah.get("sulphur_dioxide", []),
-            "co": ah.get("carbon_monoxide", []),
-            "us_aqi": ah.get("us_aqi", []),
-        }).set_index("time")
-
-        latest = aqdf.iloc[0] if not aqdf.empty else None
-        if latest is not None:
-            if np.isnan(latest.get("us_aqi", np.nan)):
-                # Fallback: compute AQI from PM2.5/PM10
-                sub_pm25 = calc_aqi_subindex("pm2_5", latest.get("pm2_5", np.nan))
-                sub_pm10 = calc_aqi_subindex("pm10", latest.get("pm10", np.nan))
-                aqi_val = max([v for v in [sub_pm25, sub_pm10] if v is not None] or [np.nan])
-            else:
-                aqi_val = float(latest["us_aqi"]) if not np.isnan(latest["us_aqi"]) else np.nan
-
-            if not np.isnan(aqi_val):
-                cat = categorize_aqi(aqi_val)
-                st.metric("US AQI (now)", f"{round(aqi_val)} — {cat}")
-                st.caption(aqi_advice(aqi_val))
-
-        figaq = px.line(aqdf.reset_index().iloc[:72], x="time", y=["pm2_5", "pm10"], title="PM2.5 & PM10 (next 72h)")
-        st.plotly_chart(figaq, use_container_width=True)
+    if not aqdf.empty:
+        air_quality_now(fc, aqdf)
+
+        for fig in air_quality_figures((aq_lat, aq_lon, tz), aq.get("_fetched_at", 0.0), aqdf):
+            st.plotly_chart(fig, use_container_width=True)
 
         st.dataframe(aqdf.iloc[:48])
 
@@ -778,31 +586,78 @@ if show_air and aq:
 # -----------------------------
 # Travel/Event checker
 # -----------------------------
-st.subheader("🧭 Quick Event Weather Check")
-colA, colB = st.columns(2)
-with colA:
-    when = st.date_input("Event date", value=datetime.now().date())
-with colB:
-    hour = st.slider("Event hour (local)", 0, 23, value=datetime.now().hour)
-
-if hourly:
-    ht = pd.to_datetime(hourly.get("time", []))
-    idx = (ht == pd.Timestamp(datetime.combine(when, datetime.min.time()) + timedelta(hours=hour)))
-    if idx.any():
-        row = pd.DataFrame(hourly).loc[list(idx)].iloc[0]
-        et = row.get("temperature_2m", "—")
-        ep = row.get("precipitation_probability", "—")
-        ew = row.get("windspeed_10m", "—")
-        st.info(f"At {when} {hour:02d}:00 — Temp: {et}°C, POP: {ep}%, Wind: {ew} km/h")
+sections.start("event")
+# A fragment too: changing an event only re-evaluates this panel
+@st.fragment
+def event_check(key: Tuple, fetched_at: float, hdf: pd.DataFrame, imperial: bool) -> None:
+    st.subheader("🧭 Quick Event Weather Check")
+    several = st.toggle("Several events", key="multi_event")
+    now = datetime.now()
+    if several:
+        events = st.data_editor(
+            pd.DataFrame({
+                "Event": ["Morning", "Evening"],
+                "Date": [now.date(), now.date()],
+                "Time": [dtime(9, 0), dtime(18, 0)],
+            }),
+            num_rows="dynamic", hide_index=True, use_container_width=True, key="events",
+            column_config={
+                "Date": st.column_config.DateColumn(required=True),
+                "Time": st.column_config.TimeColumn(required=True, step=timedelta(minutes=15), format="HH:mm"),
+            },
+        ).dropna(subset=["Date", "Time"])
+        labels = events["Event"].fillna("").tolist()
+        times = [datetime.combine(d, t) for d, t in zip(events["Date"], events["Time"])]
     else:
-        st.caption("Hourly detail unavailable for that time.")
+        colA, colB = st.columns(2)
+        with colA:
+            when = st.date_input("Event date", value=now.date())
+        with colB:
+            clock = st.slider(
+                "Event time (local)", min_value=dtime(0, 0), max_value=dtime(23, 45),
+                value=dtime(now.hour, 0), step=timedelta(minutes=15), format="HH:mm",
+            )
+        labels, times = [""], [datetime.combine(when, clock)]
+
+    if hdf.empty or not times:
+        return
+    # One vectorised lookup for every event; values between hours are interpolated
+    rows = display_units(hourly_lookup(key, fetched_at, hdf).at(times), imperial)
+    temp_unit, wind_unit = unit_labels(imperial)
+    if not several:
+        row = rows.iloc[0]
+        if np.isnan(row["temp"]):
+            st.caption("Hourly detail unavailable for that time.")
+        else:
+            icon, description = get_weather_icon(int(row["weathercode"]))
+            st.info(
+                f"At {times[0]:%Y-%m-%d %H:%M} — {icon} {description}, Temp: {row['temp']:.1f}{temp_unit}, "
+                f"POP: {row['pop']:.0f}%, Wind: {row['wind']:.1f} {wind_unit}"
+            )
+        return
+    st.dataframe(
+        pd.DataFrame({
+            "Event": labels,
+            "When": [f"{t:%a %d %b %H:%M}" for t in times],
+            "Conditions": [" ".join(get_weather_icon(int(c))) if c >= 0 else "—" for c in rows["weathercode"]],
+            f"Temp ({temp_unit})": rows["temp"].round(1).to_numpy(),
+            f"Feels like ({temp_unit})": rows["apparent"].round(1).to_numpy(),
+            "POP (%)": rows["pop"].round(0).to_numpy(),
+            f"Wind ({wind_unit})": rows["wind"].round(1).to_numpy(),
+        }),
+        hide_index=True, use_container_width=True,
+    )
+    if rows["temp"].isna().any():
+        st.caption("Events outside the forecast window show no values.")
+
+event_check(fc_key, fc.get("_fetched_at", 0.0), hdf, imperial)
 
 st.divider()
 
-# Modern footer
-st.markdown("""
-    <div class='footer'>
-        <b>ZainWeather</b> &mdash; Powered by Open‑Meteo Forecast, Geocoding & Air Quality APIs.<br>
-        <span style='font-size:0.95rem;'>App is for informational purposes only. &copy; 2025</span>
-    </div>
-""", unsafe_allow_html=True)
+st.markdown(assets.FOOTER, unsafe_allow_html=True)
+sections.finish()
+
+# -----------------------------
+# Debug panel
+# -----------------------------
+debug_panel()
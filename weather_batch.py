@@ -0,0 +1,236 @@
+"""Headless batch forecasts for a list of locations.
+
+Reads a CSV of locations, fetches forecasts (and optionally air quality) with Open-Meteo
+multi-coordinate requests in bounded-concurrency chunks, and streams one summary record per
+location to JSONL or Parquet. Uses the same response cache as the dashboard.
+
+    python weather_batch.py sites.csv -o forecasts.jsonl
+    python weather_batch.py sites.csv -o forecasts.parquet --chunk-size 100 --concurrency 8
+
+The CSV needs `lat`/`lon` (or `latitude`/`longitude`) columns; `id`, `name` and
+`timezone` are optional (timezone defaults to "auto"). Rows whose coordinates are blank,
+not numbers or out of range are written as records with `error` set and never sent upstream.
+"""
+import argparse
+import json
+import math
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List
+
+import pandas as pd
+
+import upstream
+import weather_core
+from response_cache import snap_to_grid
+from weather_core import (
+    AIR_QUALITY_GRID_DEG,
+    AIR_QUALITY_TTL_S,
+    AIR_QUALITY_URL,
+    FORECAST_GRID_DEG,
+    FORECAST_TTL_S,
+    FORECAST_URL,
+    PREFERENCES,
+    air_quality_params,
+    fetch_many,
+    forecast_summary,
+    summary_params,
+)
+
+DEFAULT_CHUNK_SIZE = 50
+DEFAULT_CONCURRENCY = 4
+
+# Output columns in order; forecast_summary() fills everything after `timezone`
+RECORD_FIELDS = [
+    "id", "name", "lat", "lon", "timezone",
+    "time", "temperature", "windspeed", "winddirection", "weathercode", "description",
+    "temp_max", "temp_min", "pop_max", "precip_sum", "rain_start",
+    "aqi", "aqi_category", "aqi_dominant", "advice", "fetched_at", "error",
+]
+
+
+def read_locations(path: str) -> pd.DataFrame:
+    """Load and normalise the locations CSV (id, name, lat, lon, timezone)."""
+    df = pd.read_csv(path)
+    df = df.rename(columns={c: c.strip().lower() for c in df.columns})
+    df = df.rename(columns={"latitude": "lat", "longitude": "lon", "lng": "lon", "tz": "timezone"})
+    missing = {"lat", "lon"} - set(df.columns)
+    if missing:
+        raise ValueError(f"{path}: missing column(s) {', '.join(sorted(missing))}")
+    if "id" not in df.columns:
+        df["id"] = df.index.astype(str)
+    if "name" not in df.columns:
+        df["name"] = None
+    if "timezone" not in df.columns:
+        df["timezone"] = "auto"
+    df["timezone"] = df["timezone"].fillna("auto")
+    df["id"] = df["id"].astype(str)
+    raw = df[["lat", "lon"]].copy()
+    df["lat"] = pd.to_numeric(df["lat"], errors="coerce")
+    df["lon"] = pd.to_numeric(df["lon"], errors="coerce")
+    # NaN (blank or unparsable) and infinite values fail between() as well
+    bad = ~(df["lat"].between(-90, 90) & df["lon"].between(-180, 180))
+    df["error"] = None
+    df.loc[bad, "error"] = [f"invalid coordinates: lat={lat}, lon={lon}" for lat, lon in raw[bad].values]
+    return df[["id", "name", "lat", "lon", "timezone", "error"]]
+
+
+def chunks(locations: pd.DataFrame, size: int) -> Iterator[pd.DataFrame]:
+    """Split locations into chunks that share a timezone (one upstream request each)."""
+    for _, group in locations.groupby("timezone", sort=False):
+        for start in range(0, len(group), size):
+            yield group.iloc[start:start + size]
+
+
+def process_chunk(chunk: pd.DataFrame, with_air: bool, prefs: List[str], imperial: bool) -> List[Dict[str, Any]]:
+    """Fetch and summarise one chunk; failures become records with `error` set."""
+    tz = chunk["timezone"].iloc[0]
+    fc_coords = [snap_to_grid(lat, lon, FORECAST_GRID_DEG) for lat, lon in zip(chunk["lat"], chunk["lon"])]
+    aq_coords = [snap_to_grid(lat, lon, AIR_QUALITY_GRID_DEG) for lat, lon in zip(chunk["lat"], chunk["lon"])]
+    base = chunk.to_dict("records")
+    try:
+        # Batch requests queue behind dashboard renders and run as fast as the rate budget allows
+        forecasts = fetch_many(
+            "forecast", FORECAST_URL, summary_params, fc_coords, tz, FORECAST_TTL_S, priority=upstream.BATCH
+        )
+        airs = (
+            fetch_many(
+                "air_quality", AIR_QUALITY_URL, air_quality_params, aq_coords, tz, AIR_QUALITY_TTL_S,
+                priority=upstream.BATCH,
+            )
+            if with_air else [None] * len(base)
+        )
+    except Exception as exc:
+        return [{**row, "error": str(exc)} for row in base]
+    records = []
+    for row, fc, aq in zip(base, forecasts, airs):
+        try:
+            records.append({**row, **forecast_summary(fc, aq, prefs, imperial), "error": None})
+        except Exception as exc:
+            records.append({**row, "error": f"parse failed: {exc}"})
+    return records
+
+
+def _json_value(value: Any) -> Any:
+    """NaN (e.g. an unparsable lat or a blank name) as null; bare NaN isn't valid JSON."""
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+class JsonlWriter:
+    def __init__(self, path: str):
+        self._fh = sys.stdout if path == "-" else open(path, "w", encoding="utf-8")
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        for rec in records:
+            row = {f: _json_value(rec.get(f)) for f in RECORD_FIELDS}
+            self._fh.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self._fh.flush()
+
+    def close(self) -> None:
+        if self._fh is not sys.stdout:
+            self._fh.close()
+
+
+class ParquetWriter:
+    """Streams record batches into one Parquet file (needs pyarrow)."""
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+        self._pa = pa
+        self.schema = pa.schema([
+            ("id", pa.string()), ("name", pa.string()), ("lat", pa.float64()), ("lon", pa.float64()),
+            ("timezone", pa.string()), ("time", pa.string()), ("temperature", pa.float64()),
+            ("windspeed", pa.float64()), ("winddirection", pa.float64()), ("weathercode", pa.int16()),
+            ("description", pa.string()), ("temp_max", pa.float64()), ("temp_min", pa.float64()),
+            ("pop_max", pa.float64()), ("precip_sum", pa.float64()), ("rain_start", pa.string()),
+            ("aqi", pa.float64()), ("aqi_category", pa.string()), ("aqi_dominant", pa.string()),
+            ("advice", pa.list_(pa.string())), ("fetched_at", pa.float64()), ("error", pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        rows = [{f: rec.get(f) for f in RECORD_FIELDS} for rec in records]
+        for row in rows:
+            row["name"] = None if pd.isna(row["name"]) else str(row["name"])
+        self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+def run(
+    locations: pd.DataFrame,
+    writer,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    with_air: bool = True,
+    prefs: List[str] = (),
+    imperial: bool = False,
+) -> Dict[str, int]:
+    """Process all locations, writing each chunk as soon as it completes. Returns counts.
+
+    Rows that read_locations() marked with an `error` are written as they are, so one bad row
+    can't fail the multi-coordinate request of its whole chunk.
+    """
+    invalid = locations["error"].notna()
+    done = failed = int(invalid.sum())
+    if done:
+        writer.write(locations[invalid].to_dict("records"))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+        futures = [
+            pool.submit(process_chunk, chunk, with_air, list(prefs), imperial)
+            for chunk in chunks(locations[~invalid], chunk_size)
+        ]
+        for fut in as_completed(futures):
+            records = fut.result()
+            writer.write(records)
+            done += len(records)
+            failed += sum(1 for r in records if r.get("error"))
+            print(
+                f"\r{done}/{len(locations)} locations, {failed} failed, {time.perf_counter() - started:.1f}s",
+                end="", file=sys.stderr, flush=True,
+            )
+    print(file=sys.stderr)
+    return {"locations": done, "failed": failed}
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("locations", help="CSV with lat/lon and optional id, name, timezone")
+    parser.add_argument("-o", "--output", default="-", help="output path (.jsonl or .parquet); '-' for stdout")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], help="default: from the output extension")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="locations per upstream request")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="upstream requests in flight")
+    parser.add_argument("--no-air", action="store_true", help="skip air quality")
+    parser.add_argument("--prefs", default="", help=f"comma-separated advice preferences: {', '.join(PREFERENCES)}")
+    parser.add_argument("--imperial", action="store_true", help="temperatures in °F and wind speeds in mph")
+    parser.add_argument("--replay", metavar="DIR", help="serve recorded fixtures from DIR instead of the network")
+    args = parser.parse_args(argv)
+    if args.replay:
+        weather_core.REPLAY_DIR = args.replay
+
+    prefs = [p.strip() for p in args.prefs.split(",") if p.strip()]
+    unknown = set(prefs) - set(PREFERENCES)
+    if unknown:
+        parser.error(f"unknown preference(s): {', '.join(sorted(unknown))}")
+    fmt = args.format or ("parquet" if args.output.endswith(".parquet") else "jsonl")
+    if fmt == "parquet" and args.output == "-":
+        parser.error("Parquet output needs a file path")
+
+    locations = read_locations(args.locations)
+    writer = ParquetWriter(args.output) if fmt == "parquet" else JsonlWriter(args.output)
+    try:
+        counts = run(locations, writer, args.chunk_size, args.concurrency, not args.no_air, prefs, args.imperial)
+    finally:
+        writer.close()
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
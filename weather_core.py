@@ -0,0 +1,1379 @@
+"""Weather core: Open-Meteo access, parsing, AQI and wardrobe/health advice.
+
+Nothing here imports Streamlit, so the dashboard (weather_app.py), the batch CLI
+(weather_batch.py) and any other entry point share one implementation and one
+response cache.
+"""
+import datetime as dt
+import functools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import perf
+import upstream
+from archive import DEFAULT_DIR as ARCHIVE_DEFAULT_DIR, Archive
+from gazetteer import DEFAULT_DIR as GAZETTEER_DEFAULT_DIR, Gazetteer
+from prefetch import prefetcher_from_env
+from response_cache import CellStats, ResponseCache, backend_from_env, grid_cell, json_loads, make_key
+
+log = logging.getLogger(__name__)
+
+# Weather code to icon/description mapping
+WMO_CODES = {
+    0: ("☀️", "Clear sky"),
+    1: ("🌤️", "Mainly clear"),
+    2: ("⛅", "Partly cloudy"),
+    3: ("☁️", "Overcast"),
+    45: ("🌫️", "Foggy"),
+    48: ("🌫️", "Depositing rime fog"),
+    51: ("🌦️", "Light drizzle"),
+    53: ("🌦️", "Moderate drizzle"),
+    55: ("🌧️", "Dense drizzle"),
+    56: ("🌧️", "Light freezing drizzle"),
+    57: ("🌧️", "Dense freezing drizzle"),
+    61: ("🌧️", "Slight rain"),
+    63: ("🌧️", "Moderate rain"),
+    65: ("🌧️", "Heavy rain"),
+    66: ("🌧️", "Light freezing rain"),
+    67: ("🌧️", "Heavy freezing rain"),
+    71: ("🌨️", "Slight snow"),
+    73: ("🌨️", "Moderate snow"),
+    75: ("🌨️", "Heavy snow"),
+    77: ("❄️", "Snow grains"),
+    80: ("🌦️", "Slight rain showers"),
+    81: ("🌧️", "Moderate rain showers"),
+    82: ("🌧️", "Violent rain showers"),
+    85: ("🌨️", "Slight snow showers"),
+    86: ("🌨️", "Heavy snow showers"),
+    95: ("⛈️", "Thunderstorm"),
+    96: ("⛈️", "Thunderstorm with slight hail"),
+    99: ("⛈️", "Thunderstorm with heavy hail"),
+}
+
+def get_weather_icon(code: int) -> tuple:
+    """Get weather icon and description for a WMO code."""
+    return WMO_CODES.get(code, ("❓", "Unknown"))
+
+# -----------------------------
+# Utilities & Caching
+# -----------------------------
+# WEATHER_UPSTREAM_URL points all four APIs at one host, e.g. the local stub in openmeteo_stub.py
+UPSTREAM_URL = os.environ.get("WEATHER_UPSTREAM_URL", "").rstrip("/")
+GEOCODE_URL = f"{UPSTREAM_URL or 'https://geocoding-api.open-meteo.com'}/v1/search"
+FORECAST_URL = f"{UPSTREAM_URL or 'https://api.open-meteo.com'}/v1/forecast"
+AIR_QUALITY_URL = f"{UPSTREAM_URL or 'https://air-quality-api.open-meteo.com'}/v1/air-quality"
+ARCHIVE_URL = f"{UPSTREAM_URL or 'https://archive-api.open-meteo.com'}/v1/archive"
+# Serve recorded fixtures instead of the network / record live responses (see openmeteo_stub.py)
+REPLAY_DIR = os.environ.get("WEATHER_REPLAY_DIR")
+RECORD_DIR = os.environ.get("WEATHER_RECORD_DIR")
+
+CONNECT_TIMEOUT_S = 5
+RETRY_STATUSES = (500, 502, 503, 504)
+
+def _retry_policy() -> Retry:
+    kwargs = dict(
+        total=3, connect=3, read=2, status=3,
+        backoff_factor=0.4,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET"}),
+        raise_on_status=False,
+    )
+    try:
+        # urllib3 >= 2 spreads retries out so replicas don't retry in lockstep
+        return Retry(backoff_jitter=0.3, **kwargs)
+    except TypeError:
+        return Retry(**kwargs)
+
+@functools.lru_cache(maxsize=None)
+def http_session() -> requests.Session:
+    """Keep-alive session shared by every Open-Meteo call: pooled per host, retried, gzip'd."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=_retry_policy())
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "User-Agent": "ZainWeatherApp"})
+    return session
+
+@functools.lru_cache(maxsize=None)
+def response_cache() -> ResponseCache:
+    """On-disk response store shared with other workers; survives restarts."""
+    return ResponseCache(backend_from_env())
+
+@functools.lru_cache(maxsize=None)
+def upstream_scheduler() -> Optional[upstream.Scheduler]:
+    """Process-wide upstream rate limiter; its token bucket lives in the response cache's store."""
+    return upstream.scheduler_from_env(response_cache().backend)
+
+@functools.lru_cache(maxsize=None)
+def cell_stats() -> CellStats:
+    """Process-wide lookup/fetch counters per grid cell, for measuring cache hit rate."""
+    return CellStats()
+
+@functools.lru_cache(maxsize=None)
+def fixture_store(root: str):
+    from openmeteo_stub import FixtureStore
+    return FixtureStore(root)
+
+@functools.lru_cache(maxsize=None)
+def gazetteer() -> Optional[Gazetteer]:
+    """Offline place index (built with `python gazetteer.py build ...`), or None if there is none."""
+    try:
+        return Gazetteer(os.environ.get("WEATHER_GAZETTEER_DIR", GAZETTEER_DEFAULT_DIR))
+    except (OSError, ValueError):
+        return None
+
+@functools.lru_cache(maxsize=None)
+def archive() -> Optional[Archive]:
+    """Local daily-history store (WEATHER_ARCHIVE_DIR), or None without pyarrow or a writable dir."""
+    try:
+        return Archive(os.environ.get("WEATHER_ARCHIVE_DIR", ARCHIVE_DEFAULT_DIR))
+    except (ImportError, OSError):
+        return None
+
+# Optional periodic JSON metrics in the logs, for deployments without a /metrics scraper
+perf.log_sink_from_env()
+
+def _get(
+    endpoint: str,
+    url: str,
+    params: Dict[str, Any],
+    timeout: float,
+    priority: int = upstream.INTERACTIVE,
+    cost: float = 1.0,
+) -> Any:
+    """One upstream call, after waiting its turn for the rate budget (`cost` calls' worth).
+
+    Raises upstream.RateLimited if the budget has no room for `priority` in time or the
+    upstream answers 429; the 429 also pauses every caller sharing the budget.
+    """
+    if REPLAY_DIR:
+        with perf.span(f"upstream.{endpoint}"):
+            perf.incr("upstream_responses_total", endpoint=endpoint, status="replay")
+            return fixture_store(REPLAY_DIR).load(endpoint, params)
+    scheduler = upstream_scheduler()
+    if scheduler is not None:
+        scheduler.acquire(priority, cost)
+    with perf.span(f"upstream.{endpoint}"):
+        try:
+            r = http_session().get(url, params=params, timeout=(CONNECT_TIMEOUT_S, timeout))
+        except requests.RequestException as exc:
+            perf.incr("upstream_responses_total", endpoint=endpoint, status=type(exc).__name__)
+            raise
+        perf.incr("upstream_responses_total", endpoint=endpoint, status=r.status_code)
+        perf.incr("upstream_bytes_total", len(r.content), endpoint=endpoint)
+        if r.status_code == 429:
+            retry_after = upstream.parse_retry_after(r.headers.get("Retry-After"))
+            if scheduler is not None:
+                scheduler.backoff(retry_after)
+            raise upstream.RateLimited(f"{endpoint}: rate limited upstream, retry in {retry_after:.0f}s", retry_after)
+        r.raise_for_status()
+        data = json_loads(r.content)
+    if RECORD_DIR and "," not in str(params.get("latitude", "")):
+        fixture_store(RECORD_DIR).save(endpoint, params, data)
+    return data
+
+
+def get_json(
+    endpoint: str,
+    url: str,
+    params: Dict[str, Any],
+    timeout: float,
+    ttl: float,
+    max_stale: float = 0.0,
+    cell: Optional[str] = None,
+    cached_only: bool = False,
+) -> Optional[Dict[str, Any]]:
+    """GET an Open-Meteo endpoint through the persistent cache and the shared session.
+
+    The result carries `_fetched_at` (epoch seconds of the upstream response) so the UI can
+    show how fresh it is; see `ResponseCache.get_json` for the stale-while-revalidate rules
+    and the fallback to the last good response when a fetch fails (e.g. rate limited).
+    Foreground fetches queue as interactive, background refreshes behind them.
+    With `cached_only` nothing is fetched in the foreground (see `ResponseCache.peek`), and
+    None means nothing is stored yet.
+    """
+    def fetch(priority: int = upstream.INTERACTIVE) -> Dict[str, Any]:
+        if cell is not None:
+            cell_stats().record_fetch(cell)
+        return _get(endpoint, url, params, timeout, priority)
+    refresh_fetch = functools.partial(fetch, upstream.BACKGROUND)
+    if cached_only:
+        hit = response_cache().peek(endpoint, params, ttl, refresh_fetch)
+        return {**hit[0], "_fetched_at": hit[1]} if hit is not None else None
+    data, fetched_at = response_cache().get_json(
+        endpoint, params, ttl, fetch, max_stale=max_stale, refresh_fetch=refresh_fetch,
+    )
+    return {**data, "_fetched_at": fetched_at}
+
+GEOCODE_TTL_S = 30 * 60
+FORECAST_TTL_S = 5 * 60
+AIR_QUALITY_TTL_S = 10 * 60
+# Past its TTL an entry is still served (and refreshed in the background) for this long
+GEOCODE_MAX_STALE_S = 24 * 60 * 60
+FORECAST_MAX_STALE_S = 30 * 60
+AIR_QUALITY_MAX_STALE_S = 60 * 60
+
+# Grid steps (degrees) roughly matching the model resolution behind each endpoint. Users in the
+# same cell get the same upstream answer, so coordinates are snapped before caching and fetching.
+FORECAST_GRID_DEG = float(os.environ.get("WEATHER_FORECAST_GRID_DEG", 0.05))
+AIR_QUALITY_GRID_DEG = float(os.environ.get("WEATHER_AQ_GRID_DEG", 0.1))
+ARCHIVE_GRID_DEG = float(os.environ.get("WEATHER_ARCHIVE_GRID_DEG", 0.1))
+
+FORECAST_HOURLY = [
+    "temperature_2m",
+    "relative_humidity_2m",
+    "apparent_temperature",
+    "precipitation",
+    "rain",
+    "snowfall",
+    "precipitation_probability",
+    "weathercode",
+    "cloud_cover",
+    "windspeed_10m",
+    "windgusts_10m",
+    "winddirection_10m",
+    "uv_index",
+    "uv_index_clear_sky",
+]
+FORECAST_DAILY = [
+    "weathercode",
+    "temperature_2m_max",
+    "temperature_2m_min",
+    "uv_index_max",
+    "windspeed_10m_max",
+]
+# Hourly variables each consumer reads. Requests ask only for the union of what is on screen,
+# so a 16-day horizon doesn't multiply the payload by variables nobody looks at.
+PANEL_VARIABLES = {
+    "current": ["relative_humidity_2m"],
+    "advice": [
+        "temperature_2m", "precipitation", "precipitation_probability", "windspeed_10m", "windgusts_10m", "uv_index",
+    ],
+    "charts": [
+        "temperature_2m", "apparent_temperature", "precipitation_probability", "windspeed_10m", "windgusts_10m",
+    ],
+    "event": [
+        "temperature_2m", "apparent_temperature", "precipitation_probability", "weathercode",
+        "windspeed_10m", "winddirection_10m",
+    ],
+    "summary": ["temperature_2m", "precipitation", "precipitation_probability"],
+}
+# 15-minute variables for the detailed charts (precipitation chance is hourly-only upstream)
+FORECAST_MINUTELY_15 = ["temperature_2m", "apparent_temperature", "precipitation", "windspeed_10m", "windgusts_10m"]
+DEFAULT_FORECAST_DAYS = 7
+MAX_FORECAST_DAYS = 16
+
+def hourly_variables(*panels: str) -> Tuple[str, ...]:
+    """Hourly variables needed by `panels` (keys of PANEL_VARIABLES), in FORECAST_HOURLY order."""
+    wanted = {v for panel in panels for v in PANEL_VARIABLES[panel]}
+    return tuple(v for v in FORECAST_HOURLY if v in wanted)
+
+# What the JSON API, batch summaries and the watchlist read (forecast_summary looks 48 h ahead)
+SUMMARY_HOURLY = hourly_variables("summary", "advice")
+SUMMARY_FORECAST_DAYS = 3
+
+AIR_QUALITY_HOURLY = [
+    "pm2_5",
+    "pm10",
+    "ozone",
+    "nitrogen_dioxide",
+    "sulphur_dioxide",
+    "carbon_monoxide",
+    "us_aqi",
+]
+ARCHIVE_DAILY = [
+    "temperature_2m_max",
+    "temperature_2m_min",
+    "temperature_2m_mean",
+    "precipitation_sum",
+    "windspeed_10m_max",
+]
+# Years of history behind the normals, and how far behind today the archive API runs
+ARCHIVE_YEARS = int(os.environ.get("WEATHER_ARCHIVE_YEARS", 30))
+ARCHIVE_LAG_DAYS = 5
+
+def local_geocode(q: str, count: int = 5) -> pd.DataFrame:
+    """Search the offline gazetteer; empty when there is no index or no match."""
+    index = gazetteer()
+    if index is None:
+        return pd.DataFrame()
+    with perf.span("geocode.local"):
+        results = index.search(q, count)
+    perf.incr("geocode_total", source="local" if not results.empty else "local_miss")
+    return results
+
+@perf.timed("fetch.geocode")
+def geocode(q: str, count: int = 5) -> pd.DataFrame:
+    """Search locations: the offline gazetteer first, the Open-Meteo Geocoding API for misses."""
+    local = local_geocode(q, count)
+    if not local.empty:
+        return local
+    params = {"name": q, "count": count, "language": "en", "format": "json"}
+    data = get_json("geocode", GEOCODE_URL, params, timeout=20, ttl=GEOCODE_TTL_S, max_stale=GEOCODE_MAX_STALE_S)
+    if not data or "results" not in data:
+        return pd.DataFrame()
+    rows = []
+    for it in data["results"]:
+        rows.append({
+            "name": it.get("name"),
+            "country": it.get("country"),
+            "admin1": it.get("admin1"),
+            "lat": it.get("latitude"),
+            "lon": it.get("longitude"),
+            "timezone": it.get("timezone"),
+            "elevation": it.get("elevation"),
+        })
+    return pd.DataFrame(rows)
+
+def forecast_params(
+    lat: float,
+    lon: float,
+    tz: str,
+    hourly: Sequence[str] = tuple(FORECAST_HOURLY),
+    days: int = DEFAULT_FORECAST_DAYS,
+    minutely_15: Sequence[str] = (),
+) -> Dict[str, Any]:
+    """Query parameters for a forecast request (also the basis of its cache key)."""
+    if not 1 <= days <= MAX_FORECAST_DAYS:
+        raise ValueError(f"forecast days must be between 1 and {MAX_FORECAST_DAYS}, got {days}")
+    params = {
+        "latitude": lat,
+        "longitude": lon,
+        "hourly": ",".join(hourly),
+        "daily": ",".join(FORECAST_DAILY),
+        "current_weather": True,
+        "forecast_days": days,
+        "timezone": tz,
+    }
+    if minutely_15:
+        params["minutely_15"] = ",".join(minutely_15)
+    return params
+
+def air_quality_params(lat: float, lon: float, tz: str) -> Dict[str, Any]:
+    """Query parameters for an air-quality request (also the basis of its cache key)."""
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "hourly": ",".join(AIR_QUALITY_HOURLY),
+        "timezone": tz,
+    }
+
+@perf.timed("fetch.forecast")
+def fetch_forecast(
+    lat: float,
+    lon: float,
+    tz: str,
+    hourly: Sequence[str] = tuple(FORECAST_HOURLY),
+    days: int = DEFAULT_FORECAST_DAYS,
+    minutely_15: Sequence[str] = (),
+    cached_only: bool = False,
+) -> Optional[Dict[str, Any]]:
+    """Fetch current, hourly, and daily weather (optionally 15-minute data) from Open-Meteo.
+
+    Callers pass coordinates already snapped with `snap_to_grid(..., FORECAST_GRID_DEG)`, and
+    should ask only for the `hourly` variables they show (see `hourly_variables`).
+    Caching (TTL, stale-while-revalidate, single-flight, `cached_only`) happens in `get_json`.
+    """
+    cell = grid_cell(lat, lon, FORECAST_GRID_DEG)
+    return get_json(
+        "forecast", FORECAST_URL, forecast_params(lat, lon, tz, hourly, days, minutely_15),
+        timeout=30, ttl=FORECAST_TTL_S, max_stale=FORECAST_MAX_STALE_S, cell=cell, cached_only=cached_only,
+    )
+
+@perf.timed("fetch.air_quality")
+def fetch_air_quality(lat: float, lon: float, tz: str, cached_only: bool = False) -> Optional[Dict[str, Any]]:
+    """Fetch hourly air quality (PM2.5, PM10, O3, NO2, SO2, CO) from Open-Meteo AQ API.
+
+    Callers pass coordinates already snapped with `snap_to_grid(..., AIR_QUALITY_GRID_DEG)`.
+    Caching (TTL, stale-while-revalidate, single-flight, `cached_only`) happens in `get_json`.
+    """
+    cell = grid_cell(lat, lon, AIR_QUALITY_GRID_DEG)
+    return get_json(
+        "air_quality", AIR_QUALITY_URL, air_quality_params(lat, lon, tz),
+        timeout=30, ttl=AIR_QUALITY_TTL_S, max_stale=AIR_QUALITY_MAX_STALE_S, cell=cell,
+        cached_only=cached_only,
+    )
+
+def record_view(
+    endpoint: str, url: str, params: Dict[str, Any], timeout: float, ttl: float, cell: Optional[str] = None
+) -> None:
+    """Count a page view of a request, so the prefetcher refreshes it before expiry while it stays popular.
+
+    No-op when prefetching is disabled (WEATHER_PREFETCH_TOP=0); see prefetch.py.
+    """
+    scheduler = prefetcher_from_env()
+    if scheduler is None:
+        return
+    key = make_key(endpoint, params)
+
+    def expires_at() -> float:
+        hit = response_cache().lookup(key, ttl)
+        return hit[1] + ttl if hit is not None else 0.0
+
+    def refresh() -> bool:
+        def fetch() -> Dict[str, Any]:
+            if cell is not None:
+                cell_stats().record_fetch(cell)
+            return _get(endpoint, url, params, timeout, upstream.BACKGROUND)
+        return response_cache().refresh(endpoint, params, fetch)
+
+    scheduler.record(key, expires_at, refresh)
+
+def record_forecast_view(
+    lat: float,
+    lon: float,
+    tz: str,
+    hourly: Sequence[str] = tuple(FORECAST_HOURLY),
+    days: int = DEFAULT_FORECAST_DAYS,
+    minutely_15: Sequence[str] = (),
+) -> None:
+    """`record_view` for the request `fetch_forecast` makes with the same arguments."""
+    record_view(
+        "forecast", FORECAST_URL, forecast_params(lat, lon, tz, hourly, days, minutely_15),
+        timeout=30, ttl=FORECAST_TTL_S, cell=grid_cell(lat, lon, FORECAST_GRID_DEG),
+    )
+
+def record_air_quality_view(lat: float, lon: float, tz: str) -> None:
+    """`record_view` for the request `fetch_air_quality` makes with the same arguments."""
+    record_view(
+        "air_quality", AIR_QUALITY_URL, air_quality_params(lat, lon, tz),
+        timeout=30, ttl=AIR_QUALITY_TTL_S, cell=grid_cell(lat, lon, AIR_QUALITY_GRID_DEG),
+    )
+
+def archive_params(lat: float, lon: float, start: dt.date, end: dt.date) -> Dict[str, Any]:
+    """Query parameters for a historical (archive) request of daily values.
+
+    Days are always cut in the cell's own time zone, so stored history doesn't depend on
+    which time zone the viewer picked.
+    """
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "daily": ",".join(ARCHIVE_DAILY),
+        "timezone": "auto",
+    }
+
+@perf.timed("fetch.history")
+def fetch_history(lat: float, lon: float, years: int = ARCHIVE_YEARS) -> Optional[str]:
+    """Bring the local archive for a location up to date; returns its cell id (None without an archive).
+
+    Callers pass coordinates already snapped with `snap_to_grid(..., ARCHIVE_GRID_DEG)`. Only
+    days the archive doesn't hold yet are requested, so repeat views make no upstream call.
+    """
+    store = archive()
+    if store is None:
+        return None
+    cell = grid_cell(lat, lon, ARCHIVE_GRID_DEG)
+    end = dt.date.today() - dt.timedelta(days=ARCHIVE_LAG_DAYS)
+    start = end.replace(year=end.year - years, day=min(end.day, 28))
+
+    def fetch(first: dt.date, last: dt.date) -> pd.DataFrame:
+        data = _get("archive", ARCHIVE_URL, archive_params(lat, lon, first, last), timeout=60)
+        return to_frame(data.get("daily", {}), ARCHIVE_COLUMNS, index_name="date")
+
+    written = store.backfill(cell, start, end, fetch)
+    perf.incr("archive_days_total", written)
+    return cell
+
+
+def fetch_many(
+    endpoint: str,
+    url: str,
+    params_for: Callable[[float, float, str], Dict[str, Any]],
+    coords: Sequence[Tuple[float, float]],
+    tz: str,
+    ttl: float,
+    timeout: float = 60,
+    priority: int = upstream.INTERACTIVE,
+) -> List[Dict[str, Any]]:
+    """Fetch several (already snapped) coordinates that share a timezone.
+
+    Each location is cached under the key a single-location request with the same
+    parameters would use. For forecasts that means batch runs, the watchlist and the JSON
+    API (all `summary_params`) share entries when their timezones match; the dashboard's
+    own forecast asks for other variables and days and never does. Air quality is shared
+    with the dashboard for the same location and timezone.
+
+    Fresh hits are served from the cache; all misses go upstream in one multi-coordinate
+    request (comma-separated latitude and longitude), which costs one rate-budget token per
+    location. If that request fails and every missing location has an older stored
+    response, those are served instead.
+    Results come back in the order of `coords`.
+    """
+    cache = response_cache()
+    keys = [make_key(endpoint, params_for(lat, lon, tz)) for lat, lon in coords]
+    found: Dict[str, Dict[str, Any]] = {}
+    missing: Dict[str, Tuple[float, float]] = {}
+    stale: Dict[str, Dict[str, Any]] = {}
+    for key, coord in zip(keys, coords):
+        if key in found or key in missing:
+            continue
+        hit = cache.lookup(key, ttl)
+        if hit is not None and time.time() - hit[1] < ttl:
+            found[key] = {**hit[0], "_fetched_at": hit[1]}
+        else:
+            missing[key] = coord
+            if hit is not None:
+                stale[key] = {**hit[0], "_fetched_at": hit[1]}
+        perf.incr("cache_requests_total", endpoint=endpoint, result="miss" if key in missing else "hit")
+    if missing:
+        params = params_for(0.0, 0.0, tz)
+        params["latitude"] = ",".join(str(lat) for lat, _ in missing.values())
+        params["longitude"] = ",".join(str(lon) for _, lon in missing.values())
+        try:
+            body = _get(endpoint, url, params, timeout, priority, cost=len(missing))
+        except Exception:
+            if len(stale) < len(missing):
+                raise
+            perf.incr("cache_requests_total", len(stale), endpoint=endpoint, result="fallback")
+            found.update(stale)
+            return [found[key] for key in keys]
+        bodies = body if isinstance(body, list) else [body]
+        if len(bodies) != len(missing):
+            raise ValueError(f"{endpoint}: asked for {len(missing)} locations, got {len(bodies)}")
+        for key, data in zip(missing, bodies):
+            data.pop("location_id", None)
+            found[key] = {**data, "_fetched_at": cache.store(key, endpoint, data)}
+    return [found[key] for key in keys]
+
+
+# Wall-clock budget for one fetch stage; endpoints still running after it are reported as missing
+FETCH_DEADLINE_S = 35.0
+
+# Locations per multi-coordinate request in the watchlist
+WATCHLIST_CHUNK_SIZE = int(os.environ.get("WEATHER_WATCHLIST_CHUNK", 50))
+# Watchlist places share one request, so they use "auto": each gets its own local times
+WATCHLIST_TZ = "auto"
+
+@functools.lru_cache(maxsize=None)
+def fetch_pool() -> ThreadPoolExecutor:
+    """Shared worker pool for concurrent Open-Meteo calls (one per process)."""
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="openmeteo")
+
+def fetch_concurrently(
+    jobs: Dict[str, Tuple[Callable, tuple]], deadline: float = FETCH_DEADLINE_S
+) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """Run several fetch functions at once and wait at most `deadline` seconds.
+
+    Returns (results, errors) keyed like `jobs`, so callers can render whatever arrived.
+    Calls that overrun keep going in the background and land in their cache for the next rerun.
+    """
+    pool = fetch_pool()
+    futures = {name: pool.submit(fn, *args) for name, (fn, args) in jobs.items()}
+    wait(futures.values(), timeout=deadline)
+    results: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    for name, fut in futures.items():
+        if not fut.done():
+            errors[name] = f"timed out after {deadline:.0f}s"
+        elif fut.exception() is not None:
+            errors[name] = str(fut.exception())
+        else:
+            results[name] = fut.result()
+    return results, errors
+
+def summary_params(lat: float, lon: float, tz: str) -> Dict[str, Any]:
+    """Forecast parameters for summaries: the 48 h `forecast_summary` reads, nothing more."""
+    return forecast_params(lat, lon, tz, SUMMARY_HOURLY, SUMMARY_FORECAST_DAYS)
+
+def resolve_watchlist(text: str, geocoder: Callable[[str], pd.DataFrame]) -> pd.DataFrame:
+    """Places from a watchlist, one per line: `lat, lon[, label]` or a name (top `geocoder` hit).
+
+    Returns name, lat, lon and error columns in line order; unresolved lines keep NaN
+    coordinates and say why in `error`. Blank lines and `#` comments are skipped.
+    """
+    rows = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = [p.strip() for p in line.split(",")]
+        try:
+            lat, lon = float(parts[0]), float(parts[1])
+        except (ValueError, IndexError):
+            pass
+        else:
+            if -90 <= lat <= 90 and -180 <= lon <= 180:
+                rows.append((", ".join(parts[2:]) or f"{lat:.2f}, {lon:.2f}", lat, lon, None))
+            else:
+                rows.append((line, np.nan, np.nan, "coordinates out of range"))
+            continue
+        try:
+            hits = geocoder(line)
+        except Exception as exc:
+            rows.append((line, np.nan, np.nan, f"geocoding failed: {exc}"))
+            continue
+        if hits.empty:
+            rows.append((line, np.nan, np.nan, "place not found"))
+        else:
+            top = hits.iloc[0]
+            name = ", ".join(str(v) for v in (top["name"], top.get("country")) if v and pd.notna(v))
+            rows.append((name, float(top["lat"]), float(top["lon"]), None))
+    return pd.DataFrame(rows, columns=["name", "lat", "lon", "error"])
+
+def fetch_watchlist(
+    fc_coords: Sequence[Tuple[float, float]],
+    aq_coords: Optional[Sequence[Tuple[float, float]]] = None,
+    chunk_size: int = WATCHLIST_CHUNK_SIZE,
+    deadline: float = FETCH_DEADLINE_S,
+) -> Tuple[List[Optional[Dict[str, Any]]], List[Optional[Dict[str, Any]]], List[Optional[str]]]:
+    """Summary forecasts (and air quality with `aq_coords`) for many places, `chunk_size` per request.
+
+    Coordinates come snapped like the single-location fetches. Every chunk of every endpoint
+    runs at once on the shared pool, so N places cost about N / chunk_size upstream requests
+    per endpoint and one round trip. Returns (forecasts, air quality, errors) in the order of
+    `fc_coords`; a failed chunk only blanks its own places, with the reason in `errors`.
+    """
+    pool = fetch_pool()
+    stages = [("forecast", FORECAST_URL, summary_params, fc_coords, FORECAST_TTL_S)]
+    if aq_coords is not None:
+        stages.append(("air_quality", AIR_QUALITY_URL, air_quality_params, aq_coords, AIR_QUALITY_TTL_S))
+    futures = {
+        (endpoint, start): pool.submit(
+            fetch_many, endpoint, url, params_for, coords[start:start + chunk_size], WATCHLIST_TZ, ttl,
+        )
+        for endpoint, url, params_for, coords, ttl in stages
+        for start in range(0, len(coords), chunk_size)
+    }
+    wait(futures.values(), timeout=deadline)
+    n = len(fc_coords)
+    results: Dict[str, List[Optional[Dict[str, Any]]]] = {"forecast": [None] * n, "air_quality": [None] * n}
+    errors: List[Optional[str]] = [None] * n
+    for (endpoint, start), fut in futures.items():
+        stop = min(start + chunk_size, n)
+        if not fut.done():
+            error = f"{endpoint} timed out after {deadline:.0f}s"
+        elif fut.exception() is not None:
+            error = f"{endpoint}: {fut.exception()}"
+        else:
+            results[endpoint][start:stop] = fut.result()
+            continue
+        for i in range(start, stop):
+            errors[i] = errors[i] or error
+    return results["forecast"], results["air_quality"], errors
+
+# -----------------------------
+# Display units
+# -----------------------------
+# Open-Meteo units are °C and km/h; charts and readouts convert for the imperial setting
+TEMP_COLUMNS = ("temp", "apparent", "t_max", "t_min")
+WIND_COLUMNS = ("wind", "gust", "wind_max")
+KMH_TO_MPH = 0.621371
+
+def convert_temp(celsius: Any, imperial: bool) -> Any:
+    """°C value(s) in display units: °F when `imperial`."""
+    return celsius * 9 / 5 + 32 if imperial else celsius
+
+def convert_wind(kmh: Any, imperial: bool) -> Any:
+    """km/h value(s) in display units: mph when `imperial`."""
+    return kmh * KMH_TO_MPH if imperial else kmh
+
+def display_units(frame: pd.DataFrame, imperial: bool) -> pd.DataFrame:
+    """Copy of `frame` with temperatures in °F and wind speeds in mph when `imperial`."""
+    out = frame.copy()
+    if imperial:
+        for col in TEMP_COLUMNS:
+            if col in out:
+                out[col] = convert_temp(out[col], True)
+        for col in WIND_COLUMNS:
+            if col in out:
+                out[col] = convert_wind(out[col], True)
+    return out
+
+def unit_labels(imperial: bool) -> Tuple[str, str]:
+    """(temperature unit, wind unit) for display."""
+    return ("°F", "mph") if imperial else ("°C", "km/h")
+
+# -----------------------------
+# Parse: Open-Meteo JSON -> typed columnar frames
+# -----------------------------
+# Open-Meteo variable -> column name used by the panels
+HOURLY_COLUMNS = {
+    "temperature_2m": "temp",
+    "relative_humidity_2m": "humidity",
+    "apparent_temperature": "apparent",
+    "precipitation": "precip",
+    "rain": "rain",
+    "snowfall": "snow",
+    "precipitation_probability": "pop",
+    "weathercode": "weathercode",
+    "cloud_cover": "cloud",
+    "windspeed_10m": "wind",
+    "windgusts_10m": "gust",
+    "winddirection_10m": "wind_dir",
+    "uv_index": "uv",
+    "uv_index_clear_sky": "uv_clear",
+}
+DAILY_COLUMNS = {
+    "weathercode": "weathercode",
+    "temperature_2m_max": "t_max",
+    "temperature_2m_min": "t_min",
+    "uv_index_max": "uv_max",
+    "precipitation_sum": "precip_sum",
+    "precipitation_hours": "precip_hours",
+    "windspeed_10m_max": "wind_max",
+}
+ARCHIVE_COLUMNS = {
+    "temperature_2m_max": "t_max",
+    "temperature_2m_min": "t_min",
+    "temperature_2m_mean": "t_mean",
+    "precipitation_sum": "precip_sum",
+    "windspeed_10m_max": "wind_max",
+}
+AIR_QUALITY_COLUMNS = {
+    "pm2_5": "pm2_5",
+    "pm10": "pm10",
+    "ozone": "o3",
+    "nitrogen_dioxide": "no2",
+    "sulphur_dioxide": "so2",
+    "carbon_monoxide": "co",
+    "us_aqi": "us_aqi",
+}
+# Weather codes are stored as int8; this marks a missing value
+MISSING_CODE = -1
+
+def to_frame(block: Dict[str, Any], columns: Dict[str, str], index_name: str = "time") -> pd.DataFrame:
+    """Turn one Open-Meteo time block into a frame with a datetime64 index.
+
+    Values become float32 with NaN for nulls; weather codes become int8 (MISSING_CODE for nulls).
+    Variables missing from the response, or shorter than the time axis, are NaN-padded.
+    """
+    index = pd.DatetimeIndex(pd.to_datetime(block.get("time", [])), name=index_name)
+    n = len(index)
+    data = {}
+    for src, name in columns.items():
+        values = np.full(n, np.nan, dtype=np.float32)
+        raw = block.get(src)
+        if raw:
+            arr = np.asarray(raw[:n], dtype=np.float32)
+            values[:len(arr)] = arr
+        if name == "weathercode":
+            values = np.where(np.isnan(values), MISSING_CODE, values).astype(np.int8)
+        data[name] = values
+    return pd.DataFrame(data, index=index)
+
+def parse_forecast(fc: Dict[str, Any]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Hourly and daily frames for a forecast response."""
+    return (
+        to_frame(fc.get("hourly", {}), HOURLY_COLUMNS),
+        to_frame(fc.get("daily", {}), DAILY_COLUMNS, index_name="date"),
+    )
+
+def parse_minutely_15(fc: Dict[str, Any]) -> pd.DataFrame:
+    """15-minute frame (hourly column names) if the response has one, else an empty frame."""
+    block = fc.get("minutely_15")
+    if not block:
+        return pd.DataFrame()
+    return to_frame(block, {v: HOURLY_COLUMNS[v] for v in FORECAST_MINUTELY_15})
+
+# Columns interpolated as angles (degrees) rather than linearly
+CIRCULAR_COLUMNS = ("wind_dir",)
+
+class HourlyLookup:
+    """Hourly frame re-laid out for point-in-time queries.
+
+    Timestamps are kept as a sorted int64 array, so any number of query times is resolved
+    with one `searchsorted`. Values between two hours are linearly interpolated (angles
+    along the shorter arc). Weather codes take the nearest hour. Times outside the forecast
+    come back as NaN.
+    """
+
+    def __init__(self, hdf: pd.DataFrame):
+        # pandas may pick any datetime resolution; compare everything in nanoseconds
+        self.times = pd.DatetimeIndex(hdf.index).as_unit("ns").asi8
+        self.codes = hdf["weathercode"].to_numpy() if "weathercode" in hdf else None
+        self.values = {
+            col: hdf[col].to_numpy(dtype=np.float64) for col in hdf.columns if col != "weathercode"
+        }
+
+    def at(self, when: Any, interpolate: bool = True) -> pd.DataFrame:
+        """Rows for the given local time(s): a Timestamp, string or sequence of them.
+
+        With `interpolate=False` only exact hours match; anything else is NaN.
+        """
+        index = pd.DatetimeIndex(np.atleast_1d(pd.to_datetime(when)), name="time").as_unit("ns")
+        t = index.asi8
+        n = len(self.times)
+        if n == 0:
+            return pd.DataFrame({col: np.nan for col in self.values}, index=index)
+        # Left neighbour i and the fraction of the way to i + 1
+        i = np.clip(np.searchsorted(self.times, t, side="right") - 1, 0, max(n - 2, 0))
+        j = np.minimum(i + 1, n - 1)
+        span = (self.times[j] - self.times[i]).astype(np.float64)
+        frac = np.divide(t - self.times[i], span, out=np.zeros(len(t)), where=span > 0)
+        inside = (t >= self.times[0]) & (t <= self.times[-1])
+        if not interpolate:
+            inside &= (frac == 0) | (frac == 1)
+        out = {}
+        for col, v in self.values.items():
+            if col in CIRCULAR_COLUMNS:
+                delta = (v[j] - v[i] + 180) % 360 - 180
+                out[col] = (v[i] + frac * delta) % 360
+            else:
+                out[col] = v[i] + frac * (v[j] - v[i])
+            out[col][~inside] = np.nan
+        if self.codes is not None:
+            codes = np.where(frac >= 0.5, self.codes[j], self.codes[i])
+            out["weathercode"] = np.where(inside, codes, MISSING_CODE).astype(self.codes.dtype)
+        return pd.DataFrame(out, index=index)
+
+
+def row_at(frame: pd.DataFrame, when: pd.Timestamp) -> pd.Series:
+    """Row of the period containing `when`, clamped to the first and last rows of a non-empty frame."""
+    i = int(frame.index.searchsorted(when, side="right")) - 1
+    return frame.iloc[min(max(i, 0), len(frame) - 1)]
+
+def local_now(fc: Dict[str, Any]) -> pd.Timestamp:
+    """Local time at a forecast's location, to the second: its report time plus the response's age."""
+    stamp = fc.get("current_weather", {}).get("time")
+    if stamp:
+        age = max(0.0, time.time() - fc.get("_fetched_at", time.time()))
+        now = pd.Timestamp(stamp) + pd.Timedelta(seconds=age)
+    else:
+        now = pd.Timestamp.now("UTC").tz_localize(None) + pd.Timedelta(seconds=fc.get("utc_offset_seconds", 0))
+    return now.floor("s")
+
+
+# -----------------------------
+# Helpers: AQI computation (vectorized over the whole hourly series)
+# -----------------------------
+# US EPA breakpoints (2012 PM2.5/PM10; 8-hr O3 and CO; 1-hr NO2 and SO2), applied to hourly values.
+# This is a simplified implementation for demo purposes: no rolling averages. Hourly ozone above the
+# 8-hr table's 200 ppb continues on the 1-hr table from 205 ppb (201-300 up to 404 ppb); the 1-hr
+# rows below that never beat the 8-hr ones for the same value, so they are left out.
+# Units are μg/m³ for PM, ppb for O3/NO2/SO2, ppm for CO.
+AQI_BP = {
+    "pm2_5": [
+        (0.0, 12.0, 0, 50),
+        (12.1, 35.4, 51, 100),
+        (35.5, 55.4, 101, 150),
+        (55.5, 150.4, 151, 200),
+        (150.5, 250.4, 201, 300),
+        (250.5, 350.4, 301, 400),
+        (350.5, 500.4, 401, 500),
+    ],
+    "pm10": [
+        (0, 54, 0, 50), (55, 154, 51, 100), (155, 254, 101, 150),
+        (255, 354, 151, 200), (355, 424, 201, 300), (425, 504, 301, 400), (505, 604, 401, 500)
+    ],
+    "o3": [
+        (0, 54, 0, 50), (55, 70, 51, 100), (71, 85, 101, 150),
+        (86, 105, 151, 200), (106, 200, 201, 300),
+        # 1-hr table
+        (205, 404, 201, 300), (405, 504, 301, 400), (505, 604, 401, 500)
+    ],
+    "no2": [
+        (0, 53, 0, 50), (54, 100, 51, 100), (101, 360, 101, 150),
+        (361, 649, 151, 200), (650, 1249, 201, 300), (1250, 1649, 301, 400), (1650, 2049, 401, 500)
+    ],
+    "so2": [
+        (0, 35, 0, 50), (36, 75, 51, 100), (76, 185, 101, 150),
+        (186, 304, 151, 200), (305, 604, 201, 300), (605, 804, 301, 400), (805, 1004, 401, 500)
+    ],
+    "co": [
+        (0.0, 4.4, 0, 50), (4.5, 9.4, 51, 100), (9.5, 12.4, 101, 150),
+        (12.5, 15.4, 151, 200), (15.5, 30.4, 201, 300), (30.5, 40.4, 301, 400), (40.5, 50.4, 401, 500)
+    ],
+}
+
+# Open-Meteo reports every pollutant in μg/m³; gases are converted to ppb (ppm for CO) at 25 °C
+UGM3_TO_BP_UNITS = {
+    "pm2_5": 1.0,
+    "pm10": 1.0,
+    "o3": 24.45 / 48.00,
+    "no2": 24.45 / 46.01,
+    "so2": 24.45 / 64.07,
+    "co": 24.45 / 28.01 / 1000,
+}
+
+AQI_CATEGORIES = [
+    (0, 50, "Good", "Air quality is satisfactory."),
+    (51, 100, "Moderate", "Unusually sensitive people should limit outdoor exertion."),
+    (101, 150, "Unhealthy for Sensitive Groups", "Reduce prolonged or heavy exertion."),
+    (151, 200, "Unhealthy", "Avoid prolonged or heavy exertion; sensitive groups should stay indoors."),
+    (201, 300, "Very Unhealthy", "Health alert: everyone may experience serious effects."),
+    (301, 500, "Hazardous", "Health warnings of emergency conditions."),
+]
+
+# Breakpoint tables as (n_segments, 4) float arrays, built once at import
+_AQI_TABLES = {p: np.array(bps, dtype=np.float64) for p, bps in AQI_BP.items()}
+_CATEGORY_LOWS = np.array([lo for lo, _, _, _ in AQI_CATEGORIES], dtype=np.float64)
+_CATEGORY_NAMES = [name for _, _, name, _ in AQI_CATEGORIES]
+
+
+def aqi_subindex(pollutant: str, conc_ugm3: np.ndarray) -> np.ndarray:
+    """AQI sub-index for an array of concentrations in μg/m³ (NaN where unknown).
+
+    Values between two table rows are clamped to the lower row's top; values above the
+    table are capped at 500.
+
+    >>> aqi_subindex("o3", np.array([250.0]) / UGM3_TO_BP_UNITS["o3"]).round()
+    array([223.])
+    """
+    table = _AQI_TABLES[pollutant]
+    c_lo, c_hi, i_lo, i_hi = table.T
+    conc = np.asarray(conc_ugm3, dtype=np.float64) * UGM3_TO_BP_UNITS[pollutant]
+    seg = np.clip(np.searchsorted(c_lo, conc, side="right") - 1, 0, len(table) - 1)
+    clamped = np.minimum(conc, c_hi[seg])
+    out = (i_hi[seg] - i_lo[seg]) / (c_hi[seg] - c_lo[seg]) * (clamped - c_lo[seg]) + i_lo[seg]
+    out[np.isnan(conc) | (conc < 0)] = np.nan
+    return out
+
+
+def compute_aqi(frame: pd.DataFrame) -> pd.DataFrame:
+    """Overall AQI, dominant pollutant and category for every row of an air-quality frame."""
+    pollutants = [p for p in AQI_BP if p in frame.columns]
+    if not pollutants or frame.empty:
+        return pd.DataFrame(
+            {"aqi": np.full(len(frame), np.nan, dtype=np.float32), "dominant": None, "category": None},
+            index=frame.index,
+        )
+    sub = np.vstack([aqi_subindex(p, frame[p].to_numpy()) for p in pollutants])
+    known = ~np.isnan(sub).all(axis=0)
+    filled = np.where(np.isnan(sub), -np.inf, sub)
+    aqi = np.where(known, np.rint(filled.max(axis=0)), np.nan)
+    dominant_idx = np.where(known, filled.argmax(axis=0), -1)
+    return pd.DataFrame(
+        {
+            "aqi": aqi.astype(np.float32),
+            "dominant": pd.Categorical.from_codes(dominant_idx, categories=pollutants),
+            "category": aqi_categories(aqi),
+        },
+        index=frame.index,
+    )
+
+
+def aqi_categories(aqi: np.ndarray) -> pd.Categorical:
+    """AQI category names for an array of index values (missing where the value is NaN)."""
+    aqi = np.asarray(aqi, dtype=np.float64)
+    idx = np.searchsorted(_CATEGORY_LOWS, np.nan_to_num(aqi), side="right") - 1
+    return pd.Categorical.from_codes(np.where(np.isnan(aqi), -1, idx), categories=_CATEGORY_NAMES)
+
+
+def parse_air_quality(aq: Dict[str, Any]) -> pd.DataFrame:
+    """Hourly air-quality frame with computed AQI columns.
+
+    `aqi` is the upstream `us_aqi` where present and the computed index otherwise; `category`
+    always describes `aqi`. `dominant` is only known for computed values and is missing on
+    rows that use the reported index.
+    """
+    frame = to_frame(aq.get("hourly", {}), AIR_QUALITY_COLUMNS)
+    computed = compute_aqi(frame)
+    reported = frame["us_aqi"].notna()
+    frame["aqi_calc"] = computed["aqi"]
+    frame["aqi"] = frame["us_aqi"].where(reported, computed["aqi"])
+    frame["dominant"] = computed["dominant"].where(~reported)
+    frame["category"] = aqi_categories(frame["aqi"].to_numpy())
+    return frame
+
+
+def categorize_aqi(aqi: float) -> str:
+    for lo, hi, name, _ in AQI_CATEGORIES:
+        if lo <= aqi <= hi:
+            return name
+    return "Unknown"
+
+
+def aqi_advice(aqi: float) -> str:
+    for lo, hi, name, advice in AQI_CATEGORIES:
+        if lo <= aqi <= hi:
+            return advice
+    return "—"
+
+# -----------------------------
+# History comparison
+# -----------------------------
+def history_comparison(cell: str, ddf: pd.DataFrame) -> pd.DataFrame:
+    """Forecast highs/lows next to the normals and last year's values for the same days.
+
+    Columns (°C): t_max, t_min (forecast), t_max_p50/p10/p90 and t_min_p50 (normals over the
+    archived years), last_t_max, last_t_min; empty without an archive.
+    """
+    store = archive()
+    if store is None or ddf.empty:
+        return pd.DataFrame()
+    normals = store.normals(cell, ddf.index, columns=("t_max", "t_min"))
+    last = store.same_day(cell, ddf.index)
+    out = pd.DataFrame({
+        "t_max": ddf["t_max"].to_numpy(),
+        "t_max_p50": normals["t_max_p50"].to_numpy(),
+        "t_max_p10": normals["t_max_p10"].to_numpy(),
+        "t_max_p90": normals["t_max_p90"].to_numpy(),
+        "last_t_max": last["t_max"].to_numpy(),
+        "t_min": ddf["t_min"].to_numpy(),
+        "t_min_p50": normals["t_min_p50"].to_numpy(),
+        "last_t_min": last["t_min"].to_numpy(),
+    }, index=ddf.index).astype(np.float32)
+    out.attrs["years"] = int(normals["years"].iloc[0]) if len(normals) else 0
+    return out
+
+# -----------------------------
+# Wardrobe & Health advice
+# -----------------------------
+PREFERENCES = ["Hate rain", "Sensitive to cold", "Allergy-prone", "Runner", "Cyclist", "Carry laptop"]
+
+def first_rain(hdf: pd.DataFrame, hours: int = 48) -> Optional[pd.Timestamp]:
+    """Time of the first hour in the next `hours` with rain likely, or None."""
+    subdf = hdf.iloc[:hours]
+    rain_mask = (subdf["precip"] > 0.05) | (subdf["pop"] >= 50)
+    return rain_mask.idxmax() if rain_mask.any() else None
+
+# One row per advice chip: (key, advice, source, preference, conditions).
+# `source` is the frame the rule reads: "hourly", "daily" or "air". `preference` limits the rule
+# to users who picked that option (None: everyone). `conditions` are alternatives, any of which
+# may hold; each is a tuple of "column op number" clauses that must all hold. Thresholds are in
+# the frames' metric units (°C, km/h, mm, %). Rows are in display order.
+ADVICE_RULES = (
+    ("warm_layer", "🧥 Warm layer", "hourly", None, (("temp < 12",),)),
+    ("hydrate", "🧢 Light & breathable; hydrate", "hourly", None, (("temp > 30",),)),
+    ("light_layer", "👕 Light jacket or tee", "hourly", None, (("temp >= 12", "temp <= 30"),)),
+    ("extra_layer", "🧣 Extra layer", "hourly", "Sensitive to cold", (("temp < 16",),)),
+    ("windbreaker", "💨 Windbreaker suggested", "hourly", None, (("wind >= 30",),)),
+    ("gusts", "🚲 Strong gusts for cycling", "hourly", "Cyclist", (("gust >= 40",),)),
+    ("umbrella", "🌂 Umbrella/waterproofs", "hourly", None, (("pop >= 50",), ("precip > 0.1",))),
+    ("leave_early", "⏰ Leave early to dodge showers", "hourly", "Hate rain", (("pop >= 50",), ("precip > 0.1",))),
+    ("indoor_workout", "🏃‍♂️ Indoor workout (AQI)", "air", "Runner", (("aqi > 100",),)),
+    ("mask", "😷 Mask outdoors (AQI)", "air", "Allergy-prone", (("aqi > 150",),)),
+    ("sunscreen", "🧴 High UV: SPF30+, sunglasses, hat", "daily", None, (("uv_max >= 6",),)),
+    ("sunscreen_hours", "🧴 High UV: SPF30+, sunglasses, hat", "hourly", None, (("uv >= 6",),)),
+    ("rain_cover", "💻 Rain cover for bag", "hourly", "Carry laptop", (("pop >= 30",),)),
+)
+ADVICE_SOURCES = ("hourly", "daily", "air")
+_CLAUSE_OPS = ("<", "<=", ">", ">=")
+
+class CompiledRules:
+    """A rule table parsed into flat arrays per source, evaluated with a handful of NumPy calls.
+
+    Every clause of every rule becomes one row of a (clauses x times) comparison; clauses are
+    AND-ed per alternative and alternatives OR-ed per rule with `reduceat`.
+    """
+
+    def __init__(self, rules: Sequence[tuple] = ADVICE_RULES):
+        self.keys = [rule[0] for rule in rules]
+        self.advice = {rule[0]: rule[1] for rule in rules}
+        self.preference = {rule[0]: rule[3] for rule in rules}
+        self.sources: Dict[str, Dict[str, Any]] = {}
+        for source in ADVICE_SOURCES:
+            keys, columns, col_idx, ops, thresholds, alt_starts, rule_starts = [], [], [], [], [], [], []
+            for key, _, rule_source, _, conditions in rules:
+                if rule_source != source:
+                    continue
+                keys.append(key)
+                rule_starts.append(len(alt_starts))
+                for clauses in conditions:
+                    alt_starts.append(len(ops))
+                    for clause in clauses:
+                        column, op, number = clause.split()
+                        if op not in _CLAUSE_OPS:
+                            raise ValueError(f"rule {key!r}: unknown operator in {clause!r}")
+                        if column not in columns:
+                            columns.append(column)
+                        col_idx.append(columns.index(column))
+                        ops.append(_CLAUSE_OPS.index(op))
+                        thresholds.append(float(number))
+            self.sources[source] = {
+                "keys": keys,
+                "columns": columns,
+                "col_idx": np.array(col_idx, dtype=np.intp),
+                "ops": np.array(ops, dtype=np.int8)[:, None],
+                "thresholds": np.array(thresholds, dtype=np.float64)[:, None],
+                "alt_starts": np.array(alt_starts, dtype=np.intp),
+                "rule_starts": np.array(rule_starts, dtype=np.intp),
+            }
+
+    def evaluate(self, source: str, frame: Optional[pd.DataFrame]) -> pd.DataFrame:
+        """Boolean frame (frame's index x rule keys) of where each `source` rule holds.
+
+        Missing columns and NaN values never satisfy a clause.
+        """
+        spec = self.sources[source]
+        if frame is None or frame.empty or not spec["keys"]:
+            return pd.DataFrame(columns=spec["keys"], dtype=bool)
+        n = len(frame)
+        values = np.vstack([
+            frame[col].to_numpy(dtype=np.float64) if col in frame else np.full(n, np.nan)
+            for col in spec["columns"]
+        ])[spec["col_idx"]]
+        ops, limit = spec["ops"], spec["thresholds"]
+        with np.errstate(invalid="ignore"):
+            held = np.where(
+                ops == 0, values < limit,
+                np.where(ops == 1, values <= limit, np.where(ops == 2, values > limit, values >= limit)),
+            )
+        alternatives = np.logical_and.reduceat(held, spec["alt_starts"], axis=0)
+        rules = np.logical_or.reduceat(alternatives, spec["rule_starts"], axis=0)
+        return pd.DataFrame(rules.T, index=frame.index, columns=spec["keys"])
+
+@functools.lru_cache(maxsize=None)
+def compiled_rules() -> CompiledRules:
+    """ADVICE_RULES compiled once per process."""
+    return CompiledRules(ADVICE_RULES)
+
+class AdviceMasks:
+    """Every advice rule evaluated over a whole forecast, as boolean frames per source.
+
+    Built once per data version; the per-preference views (`now`, `spans`, `by_day`) only
+    select columns and are memoised, so reruns and preference switches cost next to nothing.
+    Returned frames and lists are shared; treat them as read-only.
+    """
+
+    def __init__(
+        self,
+        hdf: pd.DataFrame,
+        ddf: pd.DataFrame,
+        aqdf: Optional[pd.DataFrame] = None,
+        rules: Optional[CompiledRules] = None,
+    ):
+        self.rules = rules or compiled_rules()
+        self.hourly = self.rules.evaluate("hourly", hdf)
+        self.daily = self.rules.evaluate("daily", ddf)
+        self.air = self.rules.evaluate("air", aqdf)
+        self._views: Dict[Tuple, Any] = {}
+
+    def _memo(self, key: Tuple, build: Callable[[], Any]) -> Any:
+        if key not in self._views:
+            self._views[key] = build()
+        return self._views[key]
+
+    def _keys(self, mask: pd.DataFrame, prefs: Iterable[str]) -> List[str]:
+        prefs = set(prefs)
+        return [k for k in mask.columns if self.rules.preference[k] is None or self.rules.preference[k] in prefs]
+
+    def _in_order(self, keys: Iterable[str]) -> List[str]:
+        """Advice texts for `keys` in rule-table order, without duplicates."""
+        keys = set(keys)
+        return list(dict.fromkeys(self.rules.advice[k] for k in self.rules.keys if k in keys))
+
+    @staticmethod
+    def _row_at(mask: pd.DataFrame, when: pd.Timestamp) -> Optional[pd.Series]:
+        """The row of the period containing `when` (clamped to the first and last rows)."""
+        return None if mask.empty else row_at(mask, when)
+
+    def now(self, when: pd.Timestamp, prefs: Iterable[str] = ()) -> List[str]:
+        """Advice for the hour containing `when` (daily rules: that day)."""
+        prefs = frozenset(prefs)
+        return self._memo(("now", when, prefs), lambda: self._now(when, prefs))
+
+    def _now(self, when: pd.Timestamp, prefs: Iterable[str]) -> List[str]:
+        active = []
+        for mask, at in ((self.hourly, when), (self.air, when), (self.daily, when.normalize())):
+            row = self._row_at(mask, at)
+            if row is not None:
+                keys = self._keys(mask, prefs)
+                active += [k for k in keys if row[k]]
+        return self._in_order(active)
+
+    def spans(
+        self, prefs: Iterable[str] = (), start: Optional[pd.Timestamp] = None, hours: Optional[int] = None
+    ) -> pd.DataFrame:
+        """Hourly advice as time spans: one row per contiguous run (advice, start, end; end exclusive).
+
+        Optionally limited to runs overlapping [start, start + hours). Sorted by start.
+        """
+        prefs = frozenset(prefs)
+        return self._memo(("spans", start, hours, prefs), lambda: self._spans(prefs, start, hours))
+
+    def _spans(self, prefs: Iterable[str], start: Optional[pd.Timestamp], hours: Optional[int]) -> pd.DataFrame:
+        order = {k: i for i, k in enumerate(self.rules.keys)}
+        rows = []
+        for mask in (self.hourly, self.air):
+            keys = self._keys(mask, prefs)
+            if mask.empty or not keys:
+                continue
+            held = mask[keys].to_numpy()
+            edges = np.diff(np.pad(held.astype(np.int8), ((1, 1), (0, 0))), axis=0)
+            # nonzero over the transpose walks column by column, so starts and ends pair up
+            start_col, start_row = np.nonzero(edges.T == 1)
+            _, end_row = np.nonzero(edges.T == -1)
+            times = mask.index
+            step = times[1] - times[0] if len(times) > 1 else pd.Timedelta(hours=1)
+            firsts, lasts = times[start_row], times[end_row - 1] + step
+            if start is not None:
+                stop = start + pd.Timedelta(hours=hours) if hours is not None else pd.Timestamp.max
+                keep = (lasts > start) & (firsts < stop)
+                start_col, firsts, lasts = start_col[keep], firsts[keep], lasts[keep]
+            rows += [(first, order[keys[col]], keys[col], last) for col, first, last in zip(start_col, firsts, lasts)]
+        rows.sort(key=lambda row: row[:2])
+        # Rules sharing an advice text (daily and hourly UV) would repeat the same span
+        spans = dict.fromkeys((self.rules.advice[key], first, last) for first, _, key, last in rows)
+        return pd.DataFrame(list(spans), columns=["advice", "start", "end"])
+
+    def by_day(self, prefs: Iterable[str] = ()) -> pd.Series:
+        """Advice per calendar day: daily rules plus any hourly/air rule holding during that day."""
+        prefs = frozenset(prefs)
+        return self._memo(("by_day", prefs), lambda: self._by_day(prefs))
+
+    def _by_day(self, prefs: Iterable[str]) -> pd.Series:
+        active: Dict[pd.Timestamp, List[str]] = {}
+        for mask in (self.hourly, self.air, self.daily):
+            keys = self._keys(mask, prefs)
+            if mask.empty or not keys:
+                continue
+            held = mask[keys].to_numpy()
+            days = mask.index.normalize()
+            # Rows are sorted by time, so each day is one contiguous block
+            first = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+            for day, row in zip(days[first], np.logical_or.reduceat(held, first, axis=0)):
+                active.setdefault(day, []).extend(k for k, on in zip(keys, row) if on)
+        days = sorted(active)
+        return pd.Series([self._in_order(active[day]) for day in days], index=pd.DatetimeIndex(days), dtype=object)
+
+def _now(current: Dict[str, Any], hdf: pd.DataFrame) -> pd.Timestamp:
+    """Local time of the current-conditions report, else the first forecast hour."""
+    stamp = current.get("time")
+    if stamp:
+        return pd.Timestamp(stamp)
+    return hdf.index[0] if not hdf.empty else pd.Timestamp.now().floor("h")
+
+def wardrobe_advice(
+    current: Dict[str, Any],
+    hdf: pd.DataFrame,
+    ddf: pd.DataFrame,
+    aqdf: Optional[pd.DataFrame],
+    prefs: Iterable[str] = (),
+    masks: Optional[AdviceMasks] = None,
+) -> List[str]:
+    """Advice chips for right now, in display order and without duplicates.
+
+    Rules compare the frames' metric values. Pass `masks` to reuse an evaluation of the same frames.
+    """
+    masks = masks if masks is not None else AdviceMasks(hdf, ddf, aqdf)
+    return masks.now(_now(current, hdf), prefs)
+
+def _num(value: Any) -> Optional[float]:
+    """Plain float for JSON/Parquet output; NaN and missing become None."""
+    if value is None:
+        return None
+    value = float(value)
+    # float32 columns would otherwise print as 28.799999237060547
+    return None if np.isnan(value) else round(value, 3)
+
+def forecast_summary(
+    fc: Dict[str, Any],
+    aq: Optional[Dict[str, Any]] = None,
+    prefs: Iterable[str] = (),
+    imperial: bool = False,
+    hours: int = 48,
+    frames: Optional[Tuple[pd.DataFrame, pd.DataFrame, Optional[pd.DataFrame]]] = None,
+    masks: Optional[AdviceMasks] = None,
+) -> Dict[str, Any]:
+    """Flat, JSON-ready summary of one location: current conditions, next `hours`, AQI and advice.
+
+    Temperatures are in °F and wind speeds in mph when `imperial`. The AQI fields describe
+    the hour of the current-conditions report, the same hour the advice is for. Pass `frames`
+    (hourly, daily, air quality) and `masks` to reuse already parsed responses.
+    """
+    current = fc.get("current_weather", {})
+    if frames is not None:
+        hdf, ddf, aqdf = frames
+    else:
+        hdf, ddf = parse_forecast(fc)
+        aqdf = parse_air_quality(aq) if aq else None
+    code = current.get("weathercode")
+    window = hdf.iloc[:hours]
+    rain_at = first_rain(hdf, hours) if not hdf.empty else None
+    aq_now = row_at(aqdf, _now(current, hdf)) if aqdf is not None and not aqdf.empty else None
+
+    def temp(value: Any) -> Optional[float]:
+        return _num(convert_temp(float(value), imperial)) if value is not None else None
+
+    def wind(value: Any) -> Optional[float]:
+        return _num(convert_wind(float(value), imperial)) if value is not None else None
+
+    return {
+        "time": current.get("time"),
+        "temperature": temp(current.get("temperature")),
+        "windspeed": wind(current.get("windspeed")),
+        "winddirection": _num(current.get("winddirection")),
+        "weathercode": int(code) if code is not None else None,
+        "description": get_weather_icon(code)[1] if code is not None else None,
+        "temp_max": temp(window["temp"].max()) if not window.empty else None,
+        "temp_min": temp(window["temp"].min()) if not window.empty else None,
+        "pop_max": _num(window["pop"].max()) if not window.empty else None,
+        "precip_sum": _num(window["precip"].sum()) if not window.empty else None,
+        "rain_start": rain_at.isoformat() if rain_at is not None else None,
+        "aqi": _num(aq_now["aqi"]) if aq_now is not None else None,
+        "aqi_category": aq_now["category"] if aq_now is not None and pd.notna(aq_now["category"]) else None,
+        "aqi_dominant": aq_now["dominant"] if aq_now is not None and pd.notna(aq_now["dominant"]) else None,
+        "advice": wardrobe_advice(current, hdf, ddf, aqdf, prefs, masks=masks),
+        "fetched_at": fc.get("_fetched_at"),
+    }
+
+# -----------------------------
+# Warm-up
+# -----------------------------
+# First calls into pandas (datetime parsing, frame construction) and Plotly (validators for every
+# trace type) cost several times a warm call; a fresh worker pays that once here instead of on
+# its first page view.
+def _sample_responses(hours: int = 48) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Synthetic forecast and air-quality responses covering every variable the parsers read."""
+    start = pd.Timestamp("2025-01-01")
+    times = [t.strftime("%Y-%m-%dT%H:%M") for t in pd.date_range(start, periods=hours, freq="h")]
+    days = [t.strftime("%Y-%m-%d") for t in pd.date_range(start, periods=hours // 24, freq="D")]
+    ramp = [float(i % 24) for i in range(hours)]
+    fc = {
+        "current_weather": {"time": times[0], "temperature": 10.0, "windspeed": 5.0, "winddirection": 0.0, "weathercode": 0},
+        "hourly": {"time": times, **{v: ramp for v in FORECAST_HOURLY}},
+        "daily": {"time": days, **{v: [10.0] * len(days) for v in FORECAST_DAILY}},
+        "minutely_15": {"time": times, **{v: ramp for v in FORECAST_MINUTELY_15}},
+    }
+    aq = {"hourly": {"time": times, **{v: ramp for v in AIR_QUALITY_HOURLY}}}
+    return fc, aq
+
+def _warm_parsers() -> None:
+    fc, aq = _sample_responses()
+    hdf, ddf = parse_forecast(fc)
+    parse_minutely_15(fc)
+    aqdf = parse_air_quality(aq)
+    masks = AdviceMasks(hdf, ddf, aqdf)
+    masks.spans(PREFERENCES)
+    masks.by_day(PREFERENCES)
+    forecast_summary(fc, aq, PREFERENCES, frames=(hdf, ddf, aqdf), masks=masks)
+    HourlyLookup(hdf).at(local_now(fc))
+
+def _warm_charts() -> None:
+    import charts
+    fc, aq = _sample_responses()
+    hdf, ddf = parse_forecast(fc)
+    charts.hourly_figure(hdf, imperial=False, detail=parse_minutely_15(fc))
+    charts.daily_figure(ddf, imperial=False)
+    charts.air_quality_figure(parse_air_quality(aq))
+
+def warm_up(with_charts: bool = True) -> Dict[str, float]:
+    """Prime process-wide state before the first request: returns seconds per step.
+
+    Opens the HTTP session, response cache, gazetteer and rule tables, runs every parser and
+    the advice engine once on a synthetic response, and (with `with_charts`) imports charts.py
+    and builds each figure once. Failures are logged and never raised; each step is recorded
+    as a "warmup.<step>" span.
+    """
+    steps = [
+        ("session", http_session),
+        ("cache", response_cache),
+        ("gazetteer", gazetteer),
+        ("rules", compiled_rules),
+        ("parsers", _warm_parsers),
+    ]
+    if with_charts:
+        steps.append(("charts", _warm_charts))
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as exc:
+            log.warning("Warm-up step %s failed: %s", name, exc)
+        timings[name] = time.perf_counter() - started
+        perf.RECORDER.record(f"warmup.{name}", timings[name])
+    return timings